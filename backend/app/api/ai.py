@@ -1,15 +1,20 @@
-import os
-import requests
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from typing import List, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+import asyncio
 from app.core.config import settings
+from app.api.auth import get_current_user
+from app.db.mongodb import get_database
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.utils.ai_client import TriageRequestError, TriageUnavailable, normalize_text
+from app.utils.encryption import decrypt_many
+from app.utils.keystore import keystore, has_data_key
+from app.utils.triage import triage_backend
 
 router = APIRouter()
 
-# --- CONFIG ---
-HF_API_TOKEN = os.getenv("HF_TOKEN")
-AI_URL = "https://router.huggingface.co/models/facebook/bart-large-mnli"
-
 class DiagnosisRequest(BaseModel):
     diagnosis_text: str
 
@@ -18,24 +23,153 @@ async def predict_department(request: DiagnosisRequest):
     """
     Analyzes diagnosis text and suggests a hospital department.
     """
-    if not HF_API_TOKEN:
-        return {"recommended_department": "Error: HF_TOKEN missing in .env", "confidence": 0}
-
-    headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
-    candidate_labels = ["Cardiology", "Neurology", "Orthopedics", "General Medicine", "Pediatrics", "Dermatology", "Psychiatry"]
-    payload = {"inputs": request.diagnosis_text, "parameters": {"candidate_labels": candidate_labels}}
-
     try:
-        response = requests.post(AI_URL, headers=headers, json=payload)
-        data = response.json()
-        
-        if "error" in data:
-            return {"recommended_department": f"HF Error: {data['error']}", "confidence": 0}
-
+        data = await triage_backend.predict(request.diagnosis_text)
         return {
             "recommended_department": data['labels'][0],
             "confidence": round(data['scores'][0] * 100, 1)
         }
+    except TriageUnavailable as e:
+        print(f"⚠️ AI Triage Unavailable: {e}")
+        return {"recommended_department": str(e), "confidence": 0}
+    except TriageRequestError as e:
+        # The AI service refused this text; tell the caller instead of posing as an outage
+        print(f"⚠️ AI Triage rejected request: {e}")
+        raise HTTPException(status_code=422, detail=f"AI service rejected the request: {e}")
     except Exception as e:
         print(f"❌ CRITICAL AI ERROR: {e}")
-        return {"recommended_department": f"Backend Error: {str(e)}", "confidence": 0}
\ No newline at end of file
+        return {"recommended_department": f"Backend Error: {str(e)}", "confidence": 0}
+
+# --- BATCH TRIAGE (many texts or stored records per call) ---
+class BatchDiagnosisRequest(BaseModel):
+    texts: Optional[List[str]] = None
+    record_ids: Optional[List[str]] = None
+    write_back: bool = False    # Store the department on each record (record_ids only)
+
+async def predict_unique(texts: List[str]) -> dict:
+    """
+    Predicts each distinct text once, in backend-sized chunks. Texts are deduped on
+    their normalized form, but the model sees the first original spelling.
+    Returns {normalized_text: prediction}.
+    """
+    unique = {}
+    for text in texts:
+        unique.setdefault(normalize_text(text), text)
+    keys, originals = list(unique), list(unique.values())
+    chunk = settings.TRIAGE_BATCH_CHUNK_SIZE
+    predictions = []
+    for start in range(0, len(originals), chunk):
+        predictions += await triage_backend.predict_batch(originals[start:start + chunk], return_exceptions=True)
+    return dict(zip(keys, predictions))
+
+def format_prediction(prediction) -> dict:
+    if isinstance(prediction, Exception):
+        return {"recommended_department": None, "confidence": 0, "error": str(prediction)}
+    return {
+        "recommended_department": prediction['labels'][0],
+        "confidence": round(prediction['scores'][0] * 100, 1)
+    }
+
+@router.post("/predict-department/batch")
+async def predict_department_batch(
+    request: BatchDiagnosisRequest,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Suggests departments for a list of texts or for stored records (decrypted server-side).
+    Identical texts are classified once; write_back stores the result on the records.
+    """
+    items = len(request.texts or []) + len(request.record_ids or [])
+    if not items:
+        raise HTTPException(status_code=400, detail="Provide texts or record_ids")
+    if items > settings.TRIAGE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.TRIAGE_BATCH_MAX_ITEMS} items per call")
+
+    # A. RECORDS: Fetch (own hospital only) and decrypt in one pass
+    record_texts, record_errors = {}, {}
+    if request.record_ids:
+        if current_user.get("role") != "doctor":
+            raise HTTPException(status_code=403, detail="Only doctors can triage stored records")
+        object_ids = [ObjectId(rid) for rid in request.record_ids if ObjectId.is_valid(rid)]
+        records = await db["records"].find(
+            {"_id": {"$in": object_ids}, "hospital": current_user.get("hospital")},
+            {"diagnosis": 1, "wrapped_key": 1, "kek_id": 1, "quantum_key": 1}
+        ).to_list(None)
+        await keystore.ensure_loaded(db, [rec.get("kek_id") for rec in records])
+
+        locked = []
+        for rec in records:
+            try:
+                key = keystore.data_key(rec) if has_data_key(rec) else None
+            except Exception as e:
+                record_errors[str(rec["_id"])] = f"Key unavailable: {e!r}"
+                continue
+            if key is None:
+                record_texts[str(rec["_id"])] = rec.get("diagnosis") or ""
+            else:
+                locked.append((rec, key))
+        plaintexts = await asyncio.to_thread(decrypt_many, [(rec.get("diagnosis"), key) for rec, key in locked], True)
+        for (rec, _), plain in zip(locked, plaintexts):
+            if isinstance(plain, Exception):
+                record_errors[str(rec["_id"])] = "Decryption failed"
+            else:
+                record_texts[str(rec["_id"])] = plain
+
+    # B. 🤖 PREDICT (deduped)
+    try:
+        predictions = await predict_unique(list(request.texts or []) + list(record_texts.values()))
+    except TriageUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    text_results = [format_prediction(predictions[normalize_text(t)]) for t in request.texts or []]
+    record_results, updates = [], []
+    for rid in request.record_ids or []:
+        key = str(ObjectId(rid)) if ObjectId.is_valid(rid) else rid    # record_texts is keyed by str(_id)
+        if key in record_texts:
+            prediction = predictions[normalize_text(record_texts[key])]
+            result = format_prediction(prediction)
+            if request.write_back and not isinstance(prediction, Exception):
+                updates.append(UpdateOne({"_id": ObjectId(rid)}, {"$set": {
+                    "department": result["recommended_department"],
+                    "department_confidence": result["confidence"],
+                }}))
+        else:
+            result = {"recommended_department": None, "confidence": 0, "error": record_errors.get(key, "Not Found")}
+        record_results.append({"record_id": rid, **result})
+
+    # C. WRITE BACK in one bulk_write
+    updated = 0
+    if updates:
+        updated = (await db["records"].bulk_write(updates, ordered=False)).modified_count
+
+    return {
+        "texts": text_results,
+        "records": record_results,
+        "unique_texts": len(predictions),
+        "updated": updated,
+    }
+
+# --- OFFLINE STUB (enabled with AI_STUB_ENABLED; point AI_URL at it) ---
+class ZeroShotParameters(BaseModel):
+    candidate_labels: List[str]
+
+class ZeroShotRequest(BaseModel):
+    inputs: str
+    parameters: ZeroShotParameters
+
+def zero_shot_stub(request: ZeroShotRequest):
+    """Deterministic stand-in for the HF zero-shot API: labels named in the text rank first."""
+    text = request.inputs.lower()
+    labels = request.parameters.candidate_labels
+    weights = [2.0 if label.lower() in text else 1.0 for label in labels]
+    ranked = sorted(zip(labels, weights), key=lambda item: -item[1])
+    total = sum(weights)
+    return {
+        "sequence": request.inputs,
+        "labels": [label for label, _ in ranked],
+        "scores": [weight / total for _, weight in ranked],
+    }
+
+if settings.AI_STUB_ENABLED:
+    router.add_api_route("/ai-stub/zero-shot", zero_shot_stub, methods=["POST"])
@@ -8,9 +8,12 @@ import re
 
 # Import your local tools
 from app.db.mongodb import get_database
+from app.core.config import settings
+from app.utils.cache import TTLCache
+from app.utils.hospital_directory import hospital_directory
 from app.core.security import (
-    get_password_hash, 
-    verify_password, 
+    get_password_hash_async, 
+    verify_and_update_password_async, 
     create_access_token, 
     SECRET_KEY, 
     ALGORITHM
@@ -19,6 +22,10 @@ from app.core.security import (
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Authenticated users keyed by email (the token's "sub").
+# Anything that changes a user document must call user_cache.invalidate(email).
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+
 # --- 1. UNIFIED DATA MODEL ---
 # We use one flexible model to handle inputs from the single Registration Form
 class UserRegister(BaseModel):
@@ -87,7 +94,7 @@ async def register(user: UserRegister):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # C. Hash Password
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     
     # D. Prepare User Object
     new_user = {
@@ -105,6 +112,7 @@ async def register(user: UserRegister):
 
     # E. Save to DB
     result = await db["users"].insert_one(new_user)
+    await hospital_directory.record_user(db, new_user)
     
     return {
         "id": str(result.inserted_id),
@@ -131,12 +139,21 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         
     user = await db["users"].find_one(query)
     
-    if not user or not verify_password(form_data.password, user["password"]):
+    password_valid, new_hash = (False, None)
+    if user:
+        password_valid, new_hash = await verify_and_update_password_async(form_data.password, user["password"])
+
+    if not password_valid:
         raise HTTPException(
             status_code=401,
             detail="Incorrect email/ABHA or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # REHASH: Stored hash uses an old work factor, upgrade it transparently
+    if new_hash:
+        await db["users"].update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+        user_cache.invalidate(user["email"])
     
     # TOKEN GENERATION
     access_token_expires = timedelta(minutes=60)
@@ -144,6 +161,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     # We embed Critical Info in the token so the Frontend is smart
     token_payload = {
         "sub": user["email"], 
+        "uid": str(user["_id"]),
         "role": user["role"],
         "hospital": user.get("hospital"),
         "abha": user.get("abha_number") # Embed ABHA if it exists
@@ -163,26 +181,57 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     }
 
 # --- 4. CURRENT USER UTILITY ---
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
 
-    db = await get_database()
-    user = await db["users"].find_one({"email": email})
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    email: str = decode_token(token)["sub"]
 
+    user = user_cache.get(email)
     if user is None:
-        raise credentials_exception
+        db = await get_database()
+        user = await db["users"].find_one({"email": email})
+
+        if user is None:
+            raise credentials_exception
+
+        # Cache the user dict (convert ObjectId to str if needed)
+        user["_id"] = str(user["_id"])
+        user_cache.set(email, user)
 
-    # Return the user dict (convert ObjectId to str if needed)
-    user["_id"] = str(user["_id"])
-    return user
\ No newline at end of file
+    # Hand out a copy so route handlers can't mutate the cached entry
+    return dict(user)
+
+# --- 5. TOKEN-ONLY USER (Read-only routes) ---
+async def get_token_user(token: str = Depends(oauth2_scheme)):
+    """
+    Builds the user from the claims `login` embeds in the JWT, skipping MongoDB.
+    Only used by read-only routes, and only when TRUST_TOKEN_CLAIMS is enabled;
+    older tokens without the claims fall back to get_current_user.
+    """
+    if not settings.TRUST_TOKEN_CLAIMS:
+        return await get_current_user(token)
+
+    payload = decode_token(token)
+    if payload.get("role") is None or payload.get("uid") is None:
+        return await get_current_user(token)
+
+    return {
+        "_id": payload["uid"],
+        "email": payload["sub"],
+        "role": payload["role"],
+        "hospital": payload.get("hospital"),
+        "abha": payload.get("abha"),
+    }
\ No newline at end of file
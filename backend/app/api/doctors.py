@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
+from typing import List, Optional
 from pydantic import BaseModel
+from bson import ObjectId
 import logging
-from app.api.auth import get_current_user # <--- ADD THIS
+from app.api.auth import get_token_user
+from app.utils.hospital_directory import hospital_directory
 
 # ✅ Import get_database to use as a dependency
 from app.db.mongodb import get_database
@@ -21,24 +23,36 @@ class DoctorResponse(BaseModel):
     hospital: str
     status: str = "Available"
 
+class HospitalResponse(BaseModel):
+    name: str
+    doctor_count: int = 0
+
+# --- Pagination ---
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 # ✅ ROUTE DEFINITION
 @router.get("/", response_model=List[DoctorResponse])
 async def get_doctors_by_hospital(
+    response: Response,
     hospital: str = Query(..., description="Hospital Name"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
     # 👇 This "Depends" handles the async connection automatically for you
     db: AsyncIOMotorDatabase = Depends(get_database) 
 ):
+    if cursor is not None and not ObjectId.is_valid(cursor):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
     try:
         print(f"🔍 Searching for doctors in: {hospital}") 
 
-        # 1. Query MongoDB 'users' collection
-        # We filter by role="doctor" AND the hospital name
-        doctors_cursor = db.users.find(
-            {"role": "doctor", "hospital": hospital},
-            {"_id": 0, "full_name": 1, "email": 1, "specialization": 1, "hospital": 1}
+        # 1. One page of the hospital's doctors (indexed on role, hospital, _id)
+        doctors_list, next_after = await hospital_directory.doctors(
+            db, hospital, limit, ObjectId(cursor) if cursor else None
         )
-        
-        doctors_list = await doctors_cursor.to_list(length=100)
+        if next_after is not None:
+            response.headers["X-Next-Cursor"] = str(next_after)
 
         # 2. Format data for the Frontend
         formatted_doctors = []
@@ -57,12 +71,21 @@ async def get_doctors_by_hospital(
         logger.error(f"❌ Error fetching doctors: {str(e)}")
         print(f"❌ CRITICAL ERROR: {str(e)}") 
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+# ======================================================
+# HOSPITAL DIRECTORY (materialized, cached per worker)
+# ======================================================
+@router.get("/hospitals", response_model=List[HospitalResponse])
+async def get_hospitals(db: AsyncIOMotorDatabase = Depends(get_database)):
+    """Every hospital with its registered doctor count."""
+    return await hospital_directory.hospitals(db)
+
 # ======================================================
 # NEW ENDPOINT: GET TARGET HOSPITALS (Dynamic Filter)
 # ======================================================
 @router.get("/target-hospitals")
 async def get_target_hospitals(
-    current_user: dict = Depends(get_current_user),
+    current_user: dict = Depends(get_token_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """
@@ -72,15 +95,11 @@ async def get_target_hospitals(
     # 1. Identify "My" Hospital (e.g., "Hospital A")
     my_hospital = current_user.get("hospital")
 
-    # 2. Find all unique hospital names in the database
-    # This scans the 'users' collection to see which hospitals exist
-    all_hospitals = await db.users.distinct("hospital")
+    # 2. All hospitals from the directory (no scan of `users`)
+    all_hospitals = await hospital_directory.hospitals(db)
 
     # 3. Filter the list: Keep everything that is NOT my_hospital
-    valid_targets = [
-        h for h in all_hospitals 
-        if h and h != my_hospital and h != "Unknown"
-    ]
+    valid_targets = [h["name"] for h in all_hospitals if h["name"] != my_hospital]
 
     print(f"🏥 User is at {my_hospital}. Available Targets: {valid_targets}")
-    return valid_targets
\ No newline at end of file
+    return valid_targets
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, HTTPException, Depends
+from bson import ObjectId
+
+from app.db.mongodb import get_database
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.api.auth import get_current_user, get_token_user
+from app.utils.key_rotation import key_rotations, rotation_progress
+
+router = APIRouter()
+
+# ==========================================
+# 🔄 HOSPITAL KEY ROTATION
+# ==========================================
+@router.post("/rotate", status_code=202)
+async def rotate_hospital_key(
+    current_user: dict = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Starts a new KEK for the caller's hospital and re-wraps its data keys in the background."""
+    hospital = current_user.get("hospital")
+    if current_user.get("role") != "doctor" or not hospital:
+        raise HTTPException(status_code=403, detail="Only hospital doctors can rotate keys")
+
+    if await db["key_rotations"].find_one({"hospital": hospital, "status": "running"}, {"_id": 1}):
+        raise HTTPException(status_code=409, detail="A key rotation is already running for this hospital")
+
+    return await key_rotations.submit(db, hospital, str(current_user["_id"]))
+
+@router.get("/rotate/{job_id}")
+async def get_rotation_job(
+    job_id: str,
+    current_user: dict = Depends(get_token_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Rotation job not found")
+
+    job = await db["key_rotations"].find_one({"_id": ObjectId(job_id)})
+    if not job or job["hospital"] != current_user.get("hospital"):
+        raise HTTPException(status_code=404, detail="Rotation job not found")
+
+    return rotation_progress(job)
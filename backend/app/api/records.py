@@ -1,17 +1,77 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from app.db.mongodb import get_database
 from app.models.record import RecordCreate, RecordResponse
-from app.api.auth import get_current_user
+from app.api.auth import get_current_user, get_token_user
 from datetime import datetime
 from typing import Optional, List
+from pydantic import BaseModel
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import asyncio
+import json
 
 # ⚛️ IMPORT QUANTUM TOOLS
-from app.utils.quantum import simulate_qkd_exchange
-from app.utils.encryption import encrypt_data, decrypt_data
+from app.utils.key_pool import key_pool
+from app.utils.keystore import keystore, has_data_key
+from app.core.config import settings
+from app.utils.encryption import (
+    encrypt_data, encrypt_many, decrypt_data, decrypt_many, is_legacy_ciphertext, ciphertext_preview
+)
+from app.utils.pagination import after_cursor, encode_cursor
+from app.utils.search import abha_match, normalize_abha, prefix_clause, search_fields
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 200
+
 # --- 1. CREATE RECORD ---
+def encrypted_fields(record: RecordCreate) -> List[Optional[str]]:
+    """Plaintexts to encrypt, in the order stored_record() expects them back."""
+    # Binary envelopes are distinguishable from legacy plaintext notes; Fernet text is not
+    notes = record.notes if record.notes and settings.ENCRYPTION_FORMAT != "fernet" else None
+    return [record.diagnosis, record.prescription, notes]
+
+def stored_record(record: RecordCreate, ciphertexts: list, secret_key: str, kek_id: Optional[str],
+                  patient: dict, current_user: dict) -> dict:
+    """The `records` document for a new record, given its encrypted_fields() ciphertexts."""
+    encrypted_diagnosis, encrypted_prescription, encrypted_notes = ciphertexts
+
+    record_dict = record.model_dump()
+    record_dict["diagnosis"] = encrypted_diagnosis
+    record_dict["prescription"] = encrypted_prescription
+    if encrypted_notes is not None:
+        record_dict["notes"] = encrypted_notes
+    # Envelope encryption: store the data key wrapped by the hospital's KEK, never in plain
+    if kek_id:
+        record_dict["wrapped_key"] = keystore.wrap(kek_id, secret_key)
+        record_dict["kek_id"] = kek_id
+    else:
+        record_dict["quantum_key"] = secret_key
+
+    # Metadata
+    record_dict["doctor_id"] = str(current_user["_id"])
+    record_dict["doctor_name"] = current_user["full_name"]
+    record_dict["hospital"] = current_user.get("hospital", "Unknown") 
+    record_dict["patient_id"] = str(patient["_id"])
+    record_dict["patient_abha"] = patient.get("abha_number", "N/A")
+    record_dict["patient_name"] = patient.get("full_name")
+    # Normalized copies for indexed search (see app.utils.search)
+    record_dict.update(search_fields(patient.get("email") or record.patient_email, patient.get("full_name")))
+    record_dict["created_at"] = datetime.utcnow()
+    return record_dict
+
+# users fields a new record copies from its patient
+PATIENT_FIELDS = {"abha_number": 1, "email": 1, "full_name": 1}
+
+async def active_kek(db, current_user: dict) -> Optional[str]:
+    if not settings.ENVELOPE_ENCRYPTION:
+        return None
+    return await keystore.active_kek_id(db, current_user.get("hospital", "Unknown"))
+
 @router.post("/create", response_model=RecordResponse)
 async def create_record(record: RecordCreate, current_user: dict = Depends(get_current_user)):
     
@@ -19,61 +79,215 @@ async def create_record(record: RecordCreate, current_user: dict = Depends(get_c
         raise HTTPException(status_code=403, detail="Only doctors can create records")
     
     db = await get_database()
-    
-    # Clean ABHA (remove dashes) so it stores cleanly
-    if record.patient_abha:
-        record.patient_abha = record.patient_abha.replace("-", "").replace(" ", "")
+    record.patient_abha = normalize_abha(record.patient_abha)
 
     # FIND PATIENT
     patient = None
     if record.patient_abha:
-        patient = await db["users"].find_one({"abha_number": record.patient_abha})
+        patient = await db["users"].find_one({"abha_number": record.patient_abha}, PATIENT_FIELDS)
     elif record.patient_email:
-        patient = await db["users"].find_one({"email": record.patient_email})
+        patient = await db["users"].find_one({"email": record.patient_email}, PATIENT_FIELDS)
 
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found in system. Register them first.")
 
     # ⚛️ QUANTUM ENCRYPTION
-    qkd_result = simulate_qkd_exchange()
-    secret_key = qkd_result['final_key_hash'] 
-
-    # Encrypt
-    encrypted_diagnosis = encrypt_data(record.diagnosis, secret_key)
-    encrypted_prescription = encrypt_data(record.prescription, secret_key)
+    secret_key = await key_pool.acquire_key()
+    ciphertexts = [encrypt_data(field, secret_key) if field is not None else None for field in encrypted_fields(record)]
+    record_dict = stored_record(record, ciphertexts, secret_key, await active_kek(db, current_user), patient, current_user)
 
-    record_dict = record.model_dump()
-    record_dict["diagnosis"] = encrypted_diagnosis
-    record_dict["prescription"] = encrypted_prescription
-    record_dict["quantum_key"] = secret_key
-    
-    # Metadata
-    record_dict["doctor_id"] = str(current_user["_id"])
-    record_dict["doctor_name"] = current_user["full_name"]
-    record_dict["hospital"] = current_user.get("hospital", "Unknown") 
-    record_dict["patient_id"] = str(patient["_id"])
-    record_dict["patient_abha"] = patient.get("abha_number", "N/A")
-    record_dict["created_at"] = datetime.utcnow()
-    
     new_record = await db["records"].insert_one(record_dict)
-    
-    # Decrypt for Response
-    created_record = await db["records"].find_one({"_id": new_record.inserted_id})
-    created_record["diagnosis"] = decrypt_data(created_record["diagnosis"], secret_key)
-    created_record["prescription"] = decrypt_data(created_record["prescription"], secret_key)
-    created_record["_id"] = str(created_record["_id"])
-    
-    return created_record
+
+    # Respond from the plaintext we already have (no re-read, no decrypt)
+    return {
+        **record_dict,
+        "_id": str(new_record.inserted_id),
+        "diagnosis": record.diagnosis,
+        "prescription": record.prescription,
+        "notes": record.notes,
+    }
+
+# --- 1b. BULK CREATE (end-of-day uploads) ---
+class BatchRecordCreate(BaseModel):
+    records: List[RecordCreate]
+
+@router.post("/create-batch")
+async def create_records_batch(batch: BatchRecordCreate, current_user: dict = Depends(get_current_user)):
+    """
+    Creates many records in a fixed number of round-trips: one $in lookup for all
+    patients, one key-pool draw, bulk encryption on a worker thread, one insert_many.
+    Items whose patient isn't registered are reported in `failed` by index.
+    """
+    if current_user.get("role") != "doctor":
+        raise HTTPException(status_code=403, detail="Only doctors can create records")
+    if not batch.records:
+        raise HTTPException(status_code=400, detail="No records provided")
+    if len(batch.records) > settings.RECORD_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.RECORD_BATCH_MAX_ITEMS} records per call")
+
+    db = await get_database()
+    for record in batch.records:
+        record.patient_abha = normalize_abha(record.patient_abha)
+
+    # A. FIND ALL PATIENTS in one query (ABHA wins over email, as in /create)
+    abhas = list({r.patient_abha for r in batch.records if r.patient_abha})
+    emails = list({r.patient_email for r in batch.records if not r.patient_abha and r.patient_email})
+    clauses = ([{"abha_number": {"$in": abhas}}] if abhas else []) + ([{"email": {"$in": emails}}] if emails else [])
+    by_abha, by_email = {}, {}
+    if clauses:
+        async for user in db["users"].find({"$or": clauses}, PATIENT_FIELDS):
+            if user.get("abha_number"):
+                by_abha[user["abha_number"]] = user
+            by_email[user.get("email")] = user
+
+    failed, resolved = [], []
+    for index, record in enumerate(batch.records):
+        patient = by_abha.get(record.patient_abha) if record.patient_abha else by_email.get(record.patient_email)
+        if patient:
+            resolved.append((index, record, patient))
+        else:
+            failed.append({"index": index, "reason": "Patient not found in system. Register them first."})
+
+    if not resolved:
+        return {"created": [], "failed": failed}
+
+    # B. ⚛️ QUANTUM ENCRYPTION: one key per record, all fields in one bulk call
+    secret_keys = await key_pool.acquire_keys(len(resolved))
+    pairs = [(field, key) for (_, record, _), key in zip(resolved, secret_keys)
+             for field in encrypted_fields(record) if field is not None]
+    ciphertexts = iter(await asyncio.to_thread(encrypt_many, pairs))
+    kek_id = await active_kek(db, current_user)
+
+    documents = []
+    for (_, record, patient), key in zip(resolved, secret_keys):
+        fields = [next(ciphertexts) if field is not None else None for field in encrypted_fields(record)]
+        documents.append(stored_record(record, fields, key, kek_id, patient, current_user))
+
+    # C. SAVE in one unordered insert_many
+    try:
+        result = await db["records"].insert_many(documents, ordered=False)
+        inserted_ids = result.inserted_ids
+    except BulkWriteError as e:
+        errors = {err["index"]: err.get("errmsg", "Write Failed") for err in e.details.get("writeErrors", [])}
+        failed += [{"index": resolved[i][0], "reason": reason} for i, reason in errors.items()]
+        inserted_ids = [doc["_id"] if i not in errors else None for i, doc in enumerate(documents)]
+
+    created = [{"index": index, "id": str(oid)} for (index, _, _), oid in zip(resolved, inserted_ids) if oid is not None]
+    print(f"📝 Created {len(created)} record(s) in one batch, {len(failed)} failed")
+    return {"created": created, "failed": sorted(failed, key=lambda item: item["index"])}
 
 
 # --- 2. FETCH RECORDS (FIXED SEARCH) ---
+_background_tasks = set()
+
+async def decrypt_records(records: List[dict], legacy: Optional[list] = None) -> List[dict]:
+    """
+    Decrypts stored records in place for the response, with one bulk decrypt call
+    run off the event loop.
+    Records still in the Fernet format are appended to `legacy` for re-encryption.
+    """
+    encrypted, pairs = [], []
+    for rec in records:
+        if not has_data_key(rec):
+            continue
+        try:
+            key = keystore.data_key(rec)
+        except Exception as e:
+            print(f"Key Unwrap Error for Record {rec.get('_id')}: {e!r}")
+            rec["diagnosis"] = ciphertext_preview(rec.get("diagnosis"))
+            rec["prescription"] = ciphertext_preview(rec.get("prescription"))
+            rec["notes"] = ciphertext_preview(rec.get("notes"))
+            continue
+        encrypted.append((rec, key))
+        pairs.append((rec.get("diagnosis"), key))
+        pairs.append((rec.get("prescription"), key))
+    plaintexts = await asyncio.to_thread(decrypt_many, pairs, True) if pairs else []
+
+    for i, (rec, key) in enumerate(encrypted):
+        # Each field stands alone: transfers accepted before envelopes kept the sender's
+        # prescription ciphertext, which this record's key cannot open
+        fields = {}
+        for field, plain in (("diagnosis", plaintexts[2 * i]), ("prescription", plaintexts[2 * i + 1])):
+            if rec.get(field) is None:
+                continue    # Some accepted transfers arrived without a prescription
+            if isinstance(plain, Exception):
+                # Return it anyway so the doctor sees "Something is there"
+                print(f"Decryption Error for Record {rec.get('_id')} {field}: {plain!r}")
+                rec[field] = ciphertext_preview(rec[field])
+                continue
+            if is_legacy_ciphertext(rec[field]):
+                fields[field] = (rec[field], plain)
+            rec[field] = plain
+
+        if legacy is not None and fields:
+            legacy.append((rec["_id"], key, fields))
+
+        # Notes are only encrypted in the binary format (older records hold plain text)
+        if rec.get("notes") is not None and not is_legacy_ciphertext(rec["notes"]):
+            try:
+                rec["notes"] = decrypt_data(rec["notes"], key)
+            except Exception as e:
+                print(f"Decryption Error for Record {rec.get('_id')} notes: {e!r}")
+                rec["notes"] = ciphertext_preview(rec["notes"])
+
+    for rec in records:
+        # Key material never leaves the server
+        for field in ("quantum_key", "wrapped_key", "kek_id"):
+            rec.pop(field, None)
+        rec["_id"] = str(rec["_id"])
+        if "doctor_id" in rec: rec["doctor_id"] = str(rec["doctor_id"])
+    return records
+
+async def reencrypt_legacy_records(db, legacy: list):
+    """
+    Upgrades Fernet-encrypted records to the AES-GCM envelope with one bulk_write.
+    Each update is guarded by the old ciphertext, so a concurrent edit is never overwritten.
+    """
+    def build_updates():
+        updates = []
+        for record_id, key, fields in legacy:
+            guard = {"_id": record_id, **{field: old for field, (old, _) in fields.items()}}
+            new_values = {field: encrypt_data(plain, key) for field, (_, plain) in fields.items()}
+            updates.append(UpdateOne(guard, {"$set": new_values}))
+        return updates
+
+    try:
+        updates = await asyncio.to_thread(build_updates)
+        result = await db["records"].bulk_write(updates, ordered=False)
+        print(f"🔐 Re-encrypted {result.modified_count} legacy record(s) to AES-GCM")
+    except Exception as e:
+        # Best effort: the record stays readable in the legacy format and is retried on the next read
+        print(f"⚠️ Lazy re-encryption failed: {e}")
+
+def schedule_reencryption(db, legacy: list):
+    """Runs the upgrade after the response; reads never wait on it."""
+    if not legacy or not settings.ENCRYPTION_LAZY_REENCRYPT or settings.ENCRYPTION_FORMAT == "fernet":
+        return
+    task = asyncio.create_task(reencrypt_legacy_records(db, legacy))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def stream_records(db, cursor):
+    """Yields records as NDJSON, decrypting one at a time as Mongo returns them."""
+    legacy = []
+    async for rec in cursor:
+        await keystore.ensure_loaded(db, [rec.get("kek_id")])
+        yield json.dumps(jsonable_encoder((await decrypt_records([rec], legacy))[0])) + "\n"
+    schedule_reencryption(db, legacy)
+
 @router.get("/my-records")
 async def get_my_records(
-    current_user: dict = Depends(get_current_user),
+    response: Response,
+    current_user: dict = Depends(get_token_user),
     search_abha: Optional[str] = Query(None, description="Search by ABHA"),
     # ✅ ADDED THIS PARAMETER:
-    search_email: Optional[str] = Query(None, description="Search by Email"), 
-    hospital_filter: Optional[str] = Query(None, description="Filter by Hospital")
+    search_email: Optional[str] = Query(None, description="Search by Email (prefix, case-insensitive)"), 
+    search_name: Optional[str] = Query(None, description="Search by patient name (prefix, case-insensitive)"),
+    hospital_filter: Optional[str] = Query(None, description="Filter by Hospital"),
+    department: Optional[str] = Query(None, description="Filter by triaged department"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    stream: bool = Query(False, description="Stream all matching records as NDJSON")
 ):
     db = await get_database()
     query = {}
@@ -84,17 +298,20 @@ async def get_my_records(
     if user_role == "doctor":
         query["hospital"] = current_user.get("hospital")
         
-        # ✅ ABHA SEARCH LOGIC
+        # ✅ ABHA SEARCH LOGIC (stored normalized, so one equality match)
         if search_abha:
-            clean_abha = search_abha.replace("-", "").replace(" ", "")
-            query["$or"] = [
-                {"patient_abha": search_abha}, 
-                {"patient_abha": clean_abha}
-            ]
+            query["patient_abha"] = abha_match(search_abha)
 
-        # ✅ EMAIL SEARCH LOGIC (New)
-        if search_email:
-            query["patient_email"] = {"$regex": search_email, "$options": "i"}
+        # ✅ EMAIL / NAME SEARCH: prefix match on the indexed lowercase copies
+        clauses = [clause for clause in (
+            prefix_clause("patient_email_lc", search_email, legacy_field="patient_email"),
+            prefix_clause("patient_name_terms", search_name),   # Older records have no name to fall back on
+        ) if clause]
+        if clauses:
+            query["$and"] = clauses
+
+        if department:
+            query["department"] = department
 
     # B. PATIENT VIEW
     elif user_role == "patient":
@@ -111,28 +328,37 @@ async def get_my_records(
     elif user_role == "government":
         if not search_abha:
             return [] 
-        query["patient_abha"] = search_abha.replace("-", "").replace(" ", "")
+        query["patient_abha"] = abha_match(search_abha)
 
-    # EXECUTE QUERY
-    records = await db["records"].find(query).sort("created_at", -1).to_list(100)
-    
-    # ⚛️ DECRYPT RECORDS
-    decrypted_records = []
-    for rec in records:
+    # PAGINATION: Resume after the last record of the previous page
+    if cursor:
         try:
-            if "quantum_key" in rec:
-                key = rec["quantum_key"]
-                rec["diagnosis"] = decrypt_data(rec["diagnosis"], key)
-                rec["prescription"] = decrypt_data(rec["prescription"], key)
-            
-            rec["_id"] = str(rec["_id"])
-            if "doctor_id" in rec: rec["doctor_id"] = str(rec["doctor_id"])
-                
-            decrypted_records.append(rec)
-        except Exception as e:
-            print(f"Decryption Error for Record {rec.get('_id')}: {e}")
-            rec["_id"] = str(rec["_id"])
-            # Return it anyway so the doctor sees "Something is there"
-            decrypted_records.append(rec)
-            
-    return decrypted_records
\ No newline at end of file
+            query = {"$and": [query, after_cursor("created_at", cursor)]}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # EXECUTE QUERY (newest first, _id breaks ties so pages never overlap)
+    records_cursor = db["records"].find(query).sort([("created_at", -1), ("_id", -1)])
+
+    # ⚛️ STREAMING MODE: Decrypt and send one record at a time
+    if stream:
+        if limit:
+            records_cursor = records_cursor.limit(limit)
+        return StreamingResponse(
+            stream_records(db, records_cursor.batch_size(STREAM_BATCH_SIZE)),
+            media_type="application/x-ndjson"
+        )
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    records = await records_cursor.limit(page_size).to_list(page_size)
+
+    # A full page means there may be more: hand out the cursor for the next one
+    if len(records) == page_size and records[-1].get("created_at"):
+        response.headers["X-Next-Cursor"] = encode_cursor(records[-1]["created_at"], records[-1]["_id"])
+    
+    # ⚛️ DECRYPT RECORDS (legacy Fernet records get upgraded in the background)
+    legacy = []
+    await keystore.ensure_loaded(db, [rec.get("kek_id") for rec in records])
+    records = await decrypt_records(records, legacy)
+    schedule_reencryption(db, legacy)
+    return records
@@ -1,19 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect, Query, Response, status
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+import asyncio
 import logging
-import hashlib
 
 # Database & Auth
 from app.db.mongodb import get_database
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.api.auth import get_current_user
+from app.api.auth import get_current_user, get_token_user
 
 # Encryption & QKD Tools
-from app.utils.encryption import encrypt_data, decrypt_data 
-from app.utils.quantum import simulate_qkd_exchange 
+from app.utils.encryption import encrypt_data, decrypt_data
+from app.utils.inbox_hub import inbox_hub, format_inbox_item
+from app.utils.audit import AUDIT_COLLECTION, ROLLUP_COLLECTION, bucket_start, format_audit_log
+from app.utils.pagination import after_cursor, encode_cursor
+from app.utils.key_pool import key_pool
+from app.utils.keystore import keystore
+from app.core.config import settings
+from app.utils.transfer_engine import (
+    transfer_records, accept_packets, accepted_record, packet_patients, INBOX_COLLECTION, inbox_key
+)
+from app.utils.transfer_jobs import transfer_jobs, job_progress
+from app.utils.hospital_directory import hospital_directory
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -26,9 +37,18 @@ class BatchTransferRequest(BaseModel):
 class AcceptRequest(BaseModel):
     inbox_id: str
 
+class AcceptBatchRequest(BaseModel):
+    inbox_ids: Optional[List[str]] = None
+    all: bool = False                       # Accept everything in the inbox (up to the batch limit)
+    sender_hospital: Optional[str] = None   # Narrows `all` to one sender
+
 def get_hospital_name(user: dict) -> str:
     return user.get("hospital_name", user.get("hospital", "Unknown"))
 
+async def require_hospital(db, name: str):
+    if not await hospital_directory.has_hospital(db, name):
+        raise HTTPException(status_code=404, detail="Target hospital not found")
+
 # ==========================================
 # 1. SEND TRANSFER (Doctor A -> Doctor B)
 # ==========================================
@@ -38,98 +58,113 @@ async def execute_batch_transfer(
     current_user: dict = Depends(get_current_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    summary = { "success": [], "skipped": [], "failed": [] }
     sender_name = get_hospital_name(current_user)
-    safe_target_name = req.target_hospital_name.lower().strip().replace(" ", "_")
-    target_collection_name = f"inbox_{safe_target_name}"
+    await require_hospital(db, req.target_hospital_name)
+    return await transfer_records(db, req.record_ids, sender_name, req.target_hospital_name)
 
-    for rid in req.record_ids:
-        try:
-            # A. Fetch Source Record
-            record = await db["records"].find_one({"_id": ObjectId(rid)})
-            if not record:
-                summary["failed"].append({"id": rid, "reason": "Not Found"})
-                continue
-
-            # B. 🔓 CRITICAL: DECRYPT BEFORE SENDING
-            # We must unlock the data locally so we don't send "Double Encrypted" garbage
-            plain_diagnosis = record["diagnosis"]
-            
-            if "quantum_key" in record:
-                try:
-                    storage_key = record["quantum_key"]
-                    plain_diagnosis = decrypt_data(record["diagnosis"], storage_key)
-                except Exception as e:
-                    print(f"❌ Source Decryption Failed for {rid}: {e}")
-                    summary["failed"].append({"id": rid, "reason": "Source Data Corrupt"})
-                    continue
-
-            # C. Check Duplicates
-            raw_data_string = f"{record.get('patient_id')}-{plain_diagnosis}"
-            data_signature = hashlib.sha256(raw_data_string.encode()).hexdigest()
-
-            existing = await db[target_collection_name].find_one({
-                "original_record_id": rid, "data_signature": data_signature
-            })
-            if existing:
-                summary["skipped"].append(rid)
-                continue 
-
-            # D. ⚛️ RE-ENCRYPT FOR TRANSFER (QKD)
-            qkd_session = simulate_qkd_exchange()
-            transmission_key = qkd_session["final_key_hash"] 
-            
-            secure_diagnosis = encrypt_data(plain_diagnosis, transmission_key)
-
-            # E. Send to Inbox
-            transfer_packet = {
-                "original_record_id": rid,
-                "sender_hospital": sender_name,
-                "target_hospital": req.target_hospital_name, 
-                "patient_id": record.get("patient_id"),
-                "patient_email": record.get("patient_email"),
-                "patient_abha": record.get("patient_abha"),
-                "encrypted_diagnosis": secure_diagnosis, # ✅ Sending Freshly Encrypted Data
-                "prescription": record.get("prescription"),
-                "decryption_key": transmission_key,     
-                "data_signature": data_signature,
-                "received_at": datetime.now(),
-                "status": "LOCKED"
-            }
-            await db[target_collection_name].insert_one(transfer_packet)
-            
-            # F. Audit Log
-            await db["audit_logs"].insert_one({
-                "sender_hospital": sender_name,
-                "receiver_hospital": req.target_hospital_name,
-                "record_id": rid,
-                "status": "SECURE TRANSFER",
-                "timestamp": datetime.now()
-            })
-            summary["success"].append(rid)
+# ==========================================
+# 1b. BACKGROUND TRANSFER JOBS (Large batches)
+# ==========================================
+@router.post("/jobs", status_code=202)
+async def submit_transfer_job(
+    req: BatchTransferRequest,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Queues the batch and returns immediately; poll GET /jobs/{job_id} for progress."""
+    if len(req.record_ids) > settings.TRANSFER_JOB_MAX_RECORDS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.TRANSFER_JOB_MAX_RECORDS} records per job")
+    sender_name = get_hospital_name(current_user)
+    await require_hospital(db, req.target_hospital_name)
+    return await transfer_jobs.submit(
+        db, req.record_ids, sender_name, req.target_hospital_name, str(current_user["_id"])
+    )
 
-        except Exception as e:
-            logger.error(f"Error processing {rid}: {e}")
-            summary["failed"].append({"id": rid, "reason": str(e)})
+async def find_job(db, job_id: str, current_user: dict) -> dict:
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
 
-    return summary
+    job = await db["transfer_jobs"].find_one({"_id": ObjectId(job_id)}, {"record_ids": 0})
+    # Jobs are only visible to the sending hospital
+    if not job or job["sender_hospital"] != get_hospital_name(current_user):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_transfer_job(
+    job_id: str,
+    current_user: dict = Depends(get_token_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Progress, per-outcome counts and a sample of failures."""
+    return job_progress(await find_job(db, job_id, current_user))
+
+@router.get("/jobs/{job_id}/results")
+async def get_transfer_job_results(
+    job_id: str,
+    after: int = Query(-1, description="next_after from the previous page"),
+    limit: int = Query(10, ge=1, le=100, description="Chunks per page"),
+    current_user: dict = Depends(get_token_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Per-record success/skipped/failed lists, a few chunks at a time."""
+    job = await find_job(db, job_id, current_user)
+    return await transfer_jobs.results(db, job["_id"], after, limit)
 
 # ==========================================
 # 2. FETCH INBOX (For Doctor B)
 # ==========================================
 @router.get("/my-inbox")
 async def get_my_inbox(
-    current_user: dict = Depends(get_current_user),
+    current_user: dict = Depends(get_token_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    my_hospital = get_hospital_name(current_user)
-    safe_name = my_hospital.lower().strip().replace(" ", "_")
-    collection_name = f"inbox_{safe_name}"
-    
-    inbox_items = await db[collection_name].find().sort("received_at", -1).to_list(50)
-    
-    # Return formatted list
-    return [{**item, "_id": str(item["_id"])} for item in inbox_items]
+    return await latest_inbox(db, inbox_key(get_hospital_name(current_user)))
+
+async def latest_inbox(db, target_key: str) -> List[dict]:
+    inbox_items = await db[INBOX_COLLECTION].find(
+        {"target_key": target_key}
+    ).sort([("received_at", -1), ("_id", -1)]).to_list(50)
+
+    # Return formatted list (binary ciphertexts are sent as base64)
+    return [format_inbox_item(item) for item in inbox_items]
+
+@router.websocket("/inbox/ws")
+async def inbox_socket(websocket: WebSocket, token: str = Query(...)):
+    """
+    Live inbox: sends {"type": "snapshot", "items": [...]} (same as /my-inbox) once,
+    then only deltas: "added" packets, "removed" ids, or "resync" if the client fell behind.
+    Browsers can't set headers on a WebSocket, so the JWT comes as ?token=.
+    """
+    try:
+        current_user = await get_token_user(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    target_key = inbox_key(get_hospital_name(current_user))
+    await websocket.accept()
+    # Subscribe before the snapshot so nothing published in between is lost
+    queue = inbox_hub.subscribe(target_key)
+
+    async def pump():
+        while True:
+            event = await queue.get()
+            await websocket.send_json(jsonable_encoder(event))
+
+    sender = None
+    try:
+        db = await get_database()
+        await websocket.send_json(jsonable_encoder({"type": "snapshot", "items": await latest_inbox(db, target_key)}))
+        sender = asyncio.create_task(pump())
+        while True:
+            await websocket.receive_text()  # Client messages are ignored; this waits for the disconnect
+    except WebSocketDisconnect:
+        pass
+    finally:
+        inbox_hub.unsubscribe(target_key, queue)
+        if sender:
+            sender.cancel()
 
 # ==========================================
 # 3. ACCEPT TRANSFER (The Decryption Step)
@@ -141,51 +176,185 @@ async def accept_transfer(
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     my_hospital = get_hospital_name(current_user)
-    safe_name = my_hospital.lower().strip().replace(" ", "_")
-    inbox_collection = f"inbox_{safe_name}"
+    inbox_filter = {"_id": ObjectId(req.inbox_id), "target_key": inbox_key(my_hospital)}
 
     # A. Find in Inbox
-    inbox_item = await db[inbox_collection].find_one({"_id": ObjectId(req.inbox_id)})
+    inbox_item = await db[INBOX_COLLECTION].find_one(inbox_filter)
     if not inbox_item:
         raise HTTPException(status_code=404, detail="Message not found")
 
-    # B. 🔓 DECRYPT THE TRANSFER
-    try:
-        key = inbox_item["decryption_key"]
-        cipher_text = inbox_item["encrypted_diagnosis"]
-        
-        # Unlocks the data using the transmission key
-        decrypted_diagnosis = decrypt_data(cipher_text, key)
-        print(f"✅ Successfully decrypted transfer {req.inbox_id}")
+    patients = await packet_patients(db, [inbox_item])
+    new_record = accepted_record(inbox_item, current_user, my_hospital, patients.get(str(inbox_item.get("patient_id"))))
+
+    if inbox_item.get("wrapped_key") is not None:
+        # B. 🗝️ ENVELOPE PACKET: the data key is already wrapped for our hospital,
+        # so the ciphertexts are stored as they arrived
+        await keystore.ensure_loaded(db, [inbox_item["kek_id"]])
+        try:
+            data_key = keystore.data_key(inbox_item)
+        except Exception as e:
+            print(f"❌ Key Unwrap Failed: {e!r}")
+            raise HTTPException(status_code=422, detail="Transfer key could not be unwrapped")
+
+        new_record["diagnosis"] = inbox_item["encrypted_diagnosis"]
+        new_record["prescription"] = inbox_item.get("prescription")
+        if settings.ENVELOPE_ENCRYPTION:
+            new_record["wrapped_key"] = inbox_item["wrapped_key"]
+            new_record["kek_id"] = inbox_item["kek_id"]
+        else:
+            new_record["quantum_key"] = data_key
+        print(f"✅ Accepted transfer {req.inbox_id} (no re-encryption needed)")
+    else:
+        # B. 🔓 LEGACY PACKET: decrypt with the plain transmission key
+        try:
+            key = inbox_item["decryption_key"]
+            cipher_text = inbox_item["encrypted_diagnosis"]
+            
+            # Unlocks the data using the transmission key
+            decrypted_diagnosis = decrypt_data(cipher_text, key)
+            print(f"✅ Successfully decrypted transfer {req.inbox_id}")
+            
+        except Exception as e:
+            print(f"❌ Decryption Failed: {e}")
+            decrypted_diagnosis = "Error: Decryption Failed"
+
+        # C. Create Permanent Record
+        # We encrypt it again with a NEW local key for storage
+        local_key = await key_pool.acquire_key()
         
-    except Exception as e:
-        print(f"❌ Decryption Failed: {e}")
-        decrypted_diagnosis = "Error: Decryption Failed"
-
-    # C. Create Permanent Record
-    # We encrypt it again with a NEW local key for storage
-    local_qkd = simulate_qkd_exchange()
-    local_key = local_qkd["final_key_hash"]
-    
-    storage_diagnosis = encrypt_data(decrypted_diagnosis, local_key)
-
-    new_record = {
-        "doctor_id": str(current_user["_id"]),
-        "doctor_name": current_user["full_name"],
-        "hospital": my_hospital,
-        "patient_id": inbox_item.get("patient_id"),
-        "patient_email": inbox_item.get("patient_email"),
-        "patient_abha": inbox_item.get("patient_abha"),
-        "diagnosis": storage_diagnosis, # Stored securely
-        "prescription": inbox_item.get("prescription"),
-        "quantum_key": local_key,       # Store the key to read it later
-        "created_at": datetime.now(),
-        "transfer_origin": inbox_item.get("sender_hospital")
-    }
+        new_record["diagnosis"] = encrypt_data(decrypted_diagnosis, local_key) # Stored securely
+        new_record["prescription"] = inbox_item.get("prescription")
+        if settings.ENVELOPE_ENCRYPTION:
+            kek_id = await keystore.active_kek_id(db, my_hospital)
+            new_record["wrapped_key"] = keystore.wrap(kek_id, local_key)
+            new_record["kek_id"] = kek_id
+        else:
+            new_record["quantum_key"] = local_key       # Store the key to read it later
 
     await db["records"].insert_one(new_record)
 
     # D. Remove from Inbox
-    await db[inbox_collection].delete_one({"_id": ObjectId(req.inbox_id)})
+    await db[INBOX_COLLECTION].delete_one(inbox_filter)
+    inbox_hub.publish_removed(inbox_filter["target_key"], [inbox_item["_id"]])
+
+    return {"status": "Accepted", "message": "Record decrypted and added to your history."}
+
+@router.post("/accept-batch")
+async def accept_transfer_batch(
+    req: AcceptBatchRequest,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Accepts many inbox packets at once: one fetch, bulk crypto for legacy packets,
+    then insert_many + delete_many (inside a transaction on replica sets).
+    """
+    my_hospital = get_hospital_name(current_user)
+    query = {"target_key": inbox_key(my_hospital)}
+    limit = settings.ACCEPT_BATCH_MAX_ITEMS
+
+    if req.inbox_ids:
+        if len(req.inbox_ids) > limit:
+            raise HTTPException(status_code=413, detail=f"At most {limit} packets per call")
+        valid = [iid for iid in req.inbox_ids if ObjectId.is_valid(iid)]
+        query["_id"] = {"$in": [ObjectId(iid) for iid in valid]}
+    elif req.all:
+        if req.sender_hospital:
+            query["sender_hospital"] = req.sender_hospital
+    else:
+        raise HTTPException(status_code=400, detail="Provide inbox_ids or set all=true")
+
+    packets = await db[INBOX_COLLECTION].find(query).sort("received_at", 1).limit(limit).to_list(limit)
+    summary = await accept_packets(db, packets, current_user, my_hospital)
 
-    return {"status": "Accepted", "message": "Record decrypted and added to your history."}
\ No newline at end of file
+    if req.inbox_ids:
+        found = {str(p["_id"]) for p in packets}
+        summary["failed"] += [{"id": iid, "reason": "Message not found"} for iid in req.inbox_ids if iid not in found]
+
+    print(f"✅ Batch accept for {my_hospital}: {len(summary['success'])} accepted, {len(summary['failed'])} failed")
+    return {
+        "status": "Completed",
+        "success_count": len(summary["success"]),
+        "failed_count": len(summary["failed"]),
+        "details": summary
+    }
+
+# ==========================================
+# 4. AUDIT LOGS (Government oversight)
+# ==========================================
+AUDIT_PAGE_SIZE = 100
+AUDIT_MAX_PAGE_SIZE = 500
+SUMMARY_DEFAULT_WINDOW = {"hour": timedelta(hours=48), "day": timedelta(days=30)}
+
+def require_government(user: dict):
+    if user.get("role") != "government":
+        raise HTTPException(status_code=403, detail="Only government users can view audit logs")
+
+@router.get("/audit-logs")
+async def get_audit_logs(
+    response: Response,
+    sender_hospital: Optional[str] = Query(None),
+    receiver_hospital: Optional[str] = Query(None),
+    limit: int = Query(AUDIT_PAGE_SIZE, ge=1, le=AUDIT_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    current_user: dict = Depends(get_token_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Raw transfer audit trail, newest first, keyset-paginated."""
+    require_government(current_user)
+
+    query = {}
+    if sender_hospital:
+        query["sender_hospital"] = sender_hospital
+    if receiver_hospital:
+        query["receiver_hospital"] = receiver_hospital
+    if cursor:
+        try:
+            query = {"$and": [query, after_cursor("timestamp", cursor)]}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    logs = await db[AUDIT_COLLECTION].find(query).sort([("timestamp", -1), ("_id", -1)]).limit(limit).to_list(limit)
+
+    # A full page means there may be more: hand out the cursor for the next one
+    if len(logs) == limit and logs[-1].get("timestamp"):
+        response.headers["X-Next-Cursor"] = encode_cursor(logs[-1]["timestamp"], logs[-1]["_id"])
+    return [format_audit_log(entry) for entry in logs]
+
+@router.get("/audit-logs/summary")
+async def get_audit_summary(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    since: Optional[datetime] = Query(None, description="Defaults to 48 hours (hour) or 30 days (day) ago"),
+    until: Optional[datetime] = Query(None),
+    sender_hospital: Optional[str] = Query(None),
+    receiver_hospital: Optional[str] = Query(None),
+    current_user: dict = Depends(get_token_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Transfer counts per sender/receiver pair per bucket, read from the pre-aggregated rollups."""
+    require_government(current_user)
+
+    since = since or datetime.now() - SUMMARY_DEFAULT_WINDOW[granularity]
+    bucket_range = {"$gte": bucket_start(since, granularity)}
+    if until:
+        bucket_range["$lte"] = until
+    query = {"granularity": granularity, "bucket": bucket_range}
+    if sender_hospital:
+        query["sender_hospital"] = sender_hospital
+    if receiver_hospital:
+        query["receiver_hospital"] = receiver_hospital
+
+    buckets = await db[ROLLUP_COLLECTION].find(query, {"_id": 0, "granularity": 0}).sort("bucket", 1).to_list(None)
+
+    totals = {}
+    for row in buckets:
+        pair = (row["sender_hospital"], row["receiver_hospital"])
+        totals[pair] = totals.get(pair, 0) + row["count"]
+
+    return {
+        "granularity": granularity,
+        "since": since,
+        "buckets": buckets,
+        "totals": [{"sender_hospital": sender, "receiver_hospital": receiver, "count": count}
+                   for (sender, receiver), count in sorted(totals.items(), key=lambda item: -item[1])],
+    }
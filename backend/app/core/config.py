@@ -1,11 +1,95 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Hospital QKD" # Default value prevents crash
     MONGODB_URL: str
     DB_NAME: str = "hospital_db"
+    DB_ENSURE_INDEXES: bool = True      # Apply app/db/indexes.py registry at startup
+    DB_VERIFY_QUERY_PLANS: bool = True  # explain() hot queries at startup, warn on COLLSCAN
+    DB_RUN_MIGRATIONS: bool = True      # Apply app/db/migrations.py at startup (idempotent)
     SECRET_KEY: str = "secret"
 
+    # ⚛️ QKD Engine: "aer" (Qiskit circuit) or "numpy" (vectorized fast path)
+    QKD_ENGINE: str = "aer"
+    QKD_NUM_BITS: int = 128             # Raw qubits per key (use the numpy engine for 10^5+)
+
+    # ⚛️ QKD Channel & Post-Processing
+    QKD_DEPOLARIZING_PROB: float = 0.0  # Depolarizing noise before Bob's measurement
+    QKD_EVE_INTERCEPT_RATE: float = 0.0 # Fraction of qubits Eve intercepts and resends
+    QKD_POSTPROCESS: bool = False       # QBER check + error correction + privacy amplification
+    QKD_QBER_SAMPLE_FRACTION: float = 0.1
+    QKD_QBER_THRESHOLD: float = 0.11    # Abort above this error rate
+    QKD_PA_SECURITY_BITS: int = 32      # Extra bits removed during privacy amplification
+
+    # ⚛️ QKD Key Pool (pre-generated keys, refilled in the background)
+    QKD_POOL_LOW_WATERMARK: int = 32    # Refill kicks in below this many keys
+    QKD_POOL_HIGH_WATERMARK: int = 256  # Refill stops (and the buffer is capped) here
+
+    # ⚛️ QKD Executor (keeps the simulator off the event loop)
+    QKD_EXECUTOR: str = "process"       # "process" or "thread"
+    QKD_EXECUTOR_WORKERS: int = 2
+    QKD_EXECUTOR_MAX_PENDING: int = 32  # Beyond this, QKD requests get HTTP 503
+
+    # 🔑 Auth: per-token user cache
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: int = 60            # Seconds before a cached user is re-read from Mongo
+    TRUST_TOKEN_CLAIMS: bool = False    # Read-only routes use role/hospital from the JWT directly
+
+    # 🏥 Hospital directory
+    HOSPITAL_DIRECTORY_TTL: int = 300   # Seconds a worker serves its cached hospital list
+
+    # 🔑 Password hashing
+    BCRYPT_ROUNDS: int = 12             # Work factor; existing hashes are upgraded on login
+    BCRYPT_WORKERS: int = 4             # Max concurrent bcrypt operations
+
+    # 🔒 Field encryption
+    ENCRYPTION_FORMAT: str = "aesgcm"   # "aesgcm" (binary envelope) or "fernet" (legacy text)
+    ENCRYPTION_COMPRESS_THRESHOLD: int = 512  # Compress plaintexts at least this many bytes
+    ENCRYPTION_LAZY_REENCRYPT: bool = True    # Upgrade Fernet records to AES-GCM when read
+    ENVELOPE_ENCRYPTION: bool = True    # Per-record data keys wrapped by a per-hospital KEK
+    KEY_ROTATION_BATCH_SIZE: int = 500  # Records re-wrapped per bulk_write during KEK rotation
+    KEK_ACTIVE_TTL: float = 30.0        # Seconds before a worker re-reads the active KEK (picks up rotations)
+    CIPHER_CACHE_SIZE: int = 4096       # Cipher objects kept per process (LRU)
+    ENCRYPTION_WORKERS: int = 4         # Threads used by encrypt_many / decrypt_many
+    ENCRYPTION_PARALLEL_THRESHOLD: int = 256  # Bulk calls smaller than this stay single-threaded
+
+    # 🤖 AI triage
+    TRIAGE_BACKEND: str = "hf"          # "hf" (remote zero-shot) or "local" (in-process TF-IDF)
+    TRIAGE_HF_CONCURRENCY: int = 4      # Parallel HF calls during batch prediction
+    TRIAGE_BATCH_CHUNK_SIZE: int = 64   # Texts per backend call in /predict-department/batch
+    TRIAGE_BATCH_MAX_ITEMS: int = 5000  # Texts + record IDs accepted per batch request
+
+    # 🤖 AI triage: zero-shot classification over HTTP
+    HF_DEFAULT_URL: str = "https://router.huggingface.co/models/facebook/bart-large-mnli"
+    HF_TOKEN: Optional[str] = None
+    AI_URL: str = HF_DEFAULT_URL        # e.g. http://localhost:8000/api/ai-stub/zero-shot offline
+    AI_STUB_ENABLED: bool = False       # Serve the offline stub at /api/ai-stub/zero-shot
+    AI_TIMEOUT: float = 10.0            # Seconds per attempt
+    AI_RETRIES: int = 2                 # Extra attempts on timeouts, 429 and 5xx
+    AI_BREAKER_THRESHOLD: int = 5       # Consecutive failures before the circuit opens
+    AI_BREAKER_RESET: float = 30.0      # Seconds before a trial call is let through
+    AI_CACHE_SIZE: int = 4096           # Cached predictions (keyed by normalized text)
+    AI_CACHE_TTL: int = 3600
+
+    # 🚚 Batch transfer engine
+    TRANSFER_JOB_CHUNK_SIZE: int = 200  # Records per background job step
+    TRANSFER_JOB_WORKERS: int = 2       # Background jobs running at once
+    TRANSFER_JOB_MAX_RECORDS: int = 50000   # Larger submissions get HTTP 413
+    TRANSFER_JOB_FAILURE_SAMPLE: int = 50   # Failures kept on the job document (all are in transfer_job_results)
+    ACCEPT_BATCH_MAX_ITEMS: int = 1000  # Inbox packets accepted per batch call
+    RECORD_BATCH_MAX_ITEMS: int = 1000  # Records per /records/create-batch call
+
+    # 📝 Audit log writer
+    AUDIT_QUEUE_SIZE: int = 10000       # Buffered entries before emitters wait
+    AUDIT_BATCH_SIZE: int = 500         # Entries per insert_many
+    AUDIT_FLUSH_INTERVAL: float = 1.0   # Max seconds an entry waits in the buffer
+    AUDIT_SYNC_WRITES: bool = False     # Write every entry before the request returns (compliance mode)
+
+    # 📡 Inbox push (WebSocket)
+    INBOX_CHANGE_STREAMS: bool = True   # Tail transfer_inbox when Mongo is a replica set
+    INBOX_HUB_QUEUE_SIZE: int = 100     # Pending events per client before it is told to resync
+
     class Config:
         # This tells it to look for .env in the backend root
         env_file = ".env"
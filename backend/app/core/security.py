@@ -1,14 +1,26 @@
 # backend/app/core/security.py
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from jose import jwt
+import asyncio
 import secrets
 import hashlib
 
+from app.core.config import settings
+
 # --- 1. CONFIGURATION ---
 # Setup Password Hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max rounds to the default makes passlib flag any hash with a
+# different work factor, so logins transparently rehash after BCRYPT_ROUNDS changes.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 # Setup Token Configuration
 SECRET_KEY = "super_secret_key_change_this_in_production"
@@ -22,6 +34,62 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# --- 3. NON-BLOCKING PASSWORD HASHING ---
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated, size-limited thread pool (bcrypt releases the GIL),
+    so a login storm queues here instead of freezing the event loop.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(max_workers)
+
+        # Metrics
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+
+    async def run(self, fn, *args):
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "rounds": settings.BCRYPT_ROUNDS,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "peak_queue_depth": self.peak_waiting,
+            "completed": self.completed,
+        }
+
+password_hasher = PasswordHasher(max_workers=settings.BCRYPT_WORKERS)
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await password_hasher.run(pwd_context.verify, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await password_hasher.run(pwd_context.hash, password)
+
+async def verify_and_update_password_async(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """Returns (is_valid, new_hash); new_hash is set when the stored hash uses an outdated work factor."""
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -0,0 +1,152 @@
+from datetime import datetime
+from typing import Any, Dict, List
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure, PyMongoError
+
+# ---------------------------------------------------------
+# 📇 INDEX REGISTRY
+# ---------------------------------------------------------
+# collection -> [(keys, options)]. Every index has an explicit name so
+# create_index stays idempotent across restarts.
+INDEXES = {
+    "users": [
+        ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+        # Only patients carry an ABHA number, so uniqueness applies to those documents only
+        ([("abha_number", ASCENDING)], {
+            "name": "abha_number_unique",
+            "unique": True,
+            "partialFilterExpression": {"abha_number": {"$type": "string"}},
+        }),
+        ([("hospital", ASCENDING)], {"name": "hospital"}),
+        # Doctor listing pages through a hospital in _id order
+        ([("role", ASCENDING), ("hospital", ASCENDING), ("_id", ASCENDING)], {"name": "role_hospital_id"}),
+    ],
+    "hospitals": [
+        ([("name", ASCENDING)], {"name": "name_unique", "unique": True}),
+    ],
+    # _id is the keyset-pagination tie-breaker, so it is part of every sort index
+    "records": [
+        ([("hospital", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "hospital_created_at"}),
+        ([("patient_abha", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "patient_abha_created_at"}),
+        ([("patient_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "patient_id_created_at"}),
+        # Department filter on my-records (set by /predict-department/batch write-back)
+        ([("hospital", ASCENDING), ("department", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "hospital_department_created_at"}),
+        # Doctor patient search: ABHA equality, email/name prefix on the normalized copies
+        ([("hospital", ASCENDING), ("patient_abha", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "hospital_patient_abha_created_at"}),
+        ([("hospital", ASCENDING), ("patient_email_lc", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "hospital_patient_email_created_at"}),
+        ([("hospital", ASCENDING), ("patient_name_terms", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "hospital_patient_name_created_at"}),
+        # KEK rotation scans a hospital's records by wrapping key
+        ([("hospital", ASCENDING), ("kek_id", ASCENDING)], {"name": "hospital_kek"}),
+    ],
+    # At most one active KEK per hospital; retired ones are kept for old wrappings
+    "hospital_keys": [
+        ([("hospital", ASCENDING)], {
+            "name": "hospital_active_unique",
+            "unique": True,
+            "partialFilterExpression": {"status": "active"},
+        }),
+    ],
+    "key_rotations": [
+        ([("hospital", ASCENDING), ("status", ASCENDING)], {"name": "hospital_status"}),
+    ],
+    # Government audit browsing (newest first, optionally per hospital) and its rollups
+    "audit_logs": [
+        ([("timestamp", DESCENDING), ("_id", DESCENDING)], {"name": "timestamp"}),
+        ([("sender_hospital", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {"name": "sender_timestamp"}),
+        ([("receiver_hospital", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {"name": "receiver_timestamp"}),
+    ],
+    "audit_rollups": [
+        ([("granularity", ASCENDING), ("bucket", ASCENDING), ("sender_hospital", ASCENDING), ("receiver_hospital", ASCENDING)], {
+            "name": "granularity_bucket_pair_unique",
+            "unique": True,
+        }),
+    ],
+    "transfer_jobs": [
+        ([("status", ASCENDING)], {"name": "status"}),
+    ],
+    # One document per finished job chunk, paged by offset
+    "transfer_job_results": [
+        ([("job_id", ASCENDING), ("offset", ASCENDING)], {"name": "job_offset_unique", "unique": True}),
+    ],
+    # One inbox for all hospitals; the unique index serves the transfer duplicate check and guards its races
+    "transfer_inbox": [
+        ([("target_key", ASCENDING), ("original_record_id", ASCENDING), ("data_signature", ASCENDING)], {
+            "name": "target_record_signature_unique",
+            "unique": True,
+        }),
+        ([("target_key", ASCENDING), ("received_at", DESCENDING), ("_id", DESCENDING)], {"name": "target_received_at"}),
+    ],
+}
+
+async def _create_indexes(collection, specs) -> None:
+    for keys, options in specs:
+        try:
+            await collection.create_index(keys, **options)
+        except OperationFailure as e:
+            # e.g. duplicate emails blocking a unique index, or an index with the same name but other options
+            print(f"⚠️ Could not create index {collection.name}.{options['name']}: {e}")
+
+async def ensure_indexes(db) -> None:
+    """Applies the registry at startup. Safe to run repeatedly."""
+    try:
+        for collection_name, specs in INDEXES.items():
+            await _create_indexes(db[collection_name], specs)
+    except PyMongoError as e:
+        print(f"❌ Index bootstrap skipped: {e}")
+        return
+    print("✅ Database Indexes Ensured")
+
+# ---------------------------------------------------------
+# 🔍 QUERY-PLAN SELF-CHECK
+# ---------------------------------------------------------
+# (label, collection, filter, sort) for the hot request-path lookups
+HOT_QUERIES = [
+    ("login by email", "users", {"email": "probe@example.com"}, None),
+    ("login by ABHA", "users", {"abha_number": "00000000000000"}, None),
+    ("doctor records", "records", {"hospital": "probe"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("patient records by ABHA", "records", {"patient_abha": "00000000000000"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("doctor records by department", "records", {"hospital": "probe", "department": "probe"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("doctor search by ABHA", "records", {"hospital": "probe", "patient_abha": "00000000000000"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("doctor search by email prefix", "records", {"hospital": "probe", "patient_email_lc": {"$regex": "^probe"}}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("doctor search by name prefix", "records", {"hospital": "probe", "patient_name_terms": {"$regex": "^probe"}}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("patient records by id", "records", {"patient_id": "probe"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("doctors by hospital", "users", {"role": "doctor", "hospital": "probe"}, [("_id", ASCENDING)]),
+    ("audit log browsing", "audit_logs", {}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("audit log by sender", "audit_logs", {"sender_hospital": "probe"}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("audit rollups", "audit_rollups", {"granularity": "day", "bucket": {"$gte": datetime(2000, 1, 1)}}, None),
+    ("inbox listing", "transfer_inbox", {"target_key": "probe"}, [("received_at", DESCENDING), ("_id", DESCENDING)]),
+    ("inbox duplicate check", "transfer_inbox",
+     {"target_key": "probe", "original_record_id": {"$in": ["probe"]}}, None),
+]
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for child_key in ("inputStage", "inputStages", "queryPlan"):
+        child = plan.get(child_key)
+        if isinstance(child, dict):
+            stages += _plan_stages(child)
+        elif isinstance(child, list):
+            for item in child:
+                stages += _plan_stages(item)
+    return stages
+
+async def verify_query_plans(db) -> List[str]:
+    """Runs explain() on each hot query and warns about collection scans."""
+    warnings = []
+    try:
+        for label, collection_name, query, sort in HOT_QUERIES:
+            cursor = db[collection_name].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            explain = await cursor.explain()
+            if "COLLSCAN" in _plan_stages(explain["queryPlanner"]["winningPlan"]):
+                warnings.append(f"{label} ({collection_name} {query})")
+    except PyMongoError as e:
+        print(f"❌ Query-plan self-check skipped: {e}")
+        return warnings
+
+    for warning in warnings:
+        print(f"⚠️ COLLSCAN on hot query: {warning}")
+    if not warnings:
+        print("✅ Hot Queries Use Indexes")
+    return warnings
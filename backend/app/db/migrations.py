@@ -0,0 +1,182 @@
+# backend/app/db/migrations.py
+"""
+Data migrations. Each one is idempotent: it runs at startup (see main.lifespan;
+the record backfill runs in the background there) and can also be run by hand:
+
+    python -m app.db.migrations
+"""
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.utils.audit import AUDIT_COLLECTION, ROLLUP_COLLECTION, rebuild_rollups
+from app.utils.search import mark_backfilled, normalize_abha, search_fields
+from app.utils.hospital_directory import hospital_directory, DIRECTORY_COLLECTION
+from app.utils.transfer_engine import INBOX_COLLECTION, DUPLICATE_KEY
+
+LEGACY_INBOX_PREFIX = "inbox_"
+MIGRATION_BATCH_SIZE = 1000
+
+# ---------------------------------------------------------
+# 📬 inbox_<hospital> collections -> transfer_inbox
+# ---------------------------------------------------------
+async def migrate_inbox_collections(db) -> int:
+    """
+    Copies every legacy per-hospital inbox into transfer_inbox (keeping _id) and
+    drops the old collection once all of its packets are present. Packets that
+    already exist in transfer_inbox are left alone, so re-running is safe.
+    """
+    moved = 0
+    try:
+        names = await db.list_collection_names(filter={"name": {"$regex": f"^{LEGACY_INBOX_PREFIX}"}})
+    except PyMongoError as e:
+        print(f"❌ Inbox migration skipped: {e}")
+        return 0
+
+    for name in names:
+        target_key = name[len(LEGACY_INBOX_PREFIX):]
+        source = db[name]
+        total = await source.count_documents({})
+
+        cursor = source.find().batch_size(MIGRATION_BATCH_SIZE)
+        batch, failed = [], 0
+        async for packet in cursor:
+            packet["target_key"] = target_key
+            packet.setdefault("target_hospital", target_key)
+            batch.append(UpdateOne(
+                {"target_key": target_key,
+                 "original_record_id": packet.get("original_record_id"),
+                 "data_signature": packet.get("data_signature")},
+                {"$setOnInsert": packet},
+                upsert=True
+            ))
+            if len(batch) == MIGRATION_BATCH_SIZE:
+                upserted, errors = await _apply(db, batch)
+                moved, failed, batch = moved + upserted, failed + errors, []
+        if batch:
+            upserted, errors = await _apply(db, batch)
+            moved, failed = moved + upserted, failed + errors
+
+        # Only drop the source when every packet was copied or already present
+        if failed:
+            print(f"⚠️ Kept {name}: {failed}/{total} packet(s) could not be copied to {INBOX_COLLECTION}")
+        else:
+            await source.drop()
+            print(f"📬 Migrated {name} -> {INBOX_COLLECTION} ({total} packet(s))")
+    return moved
+
+async def _apply(db, upserts):
+    """Returns (inserted, failed). Matches and duplicate-key races count as already present."""
+    try:
+        result = await db[INBOX_COLLECTION].bulk_write(upserts, ordered=False)
+        return result.upserted_count, 0
+    except BulkWriteError as e:
+        errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY]
+        for err in errors:
+            print(f"❌ Inbox migration write failed: {err.get('errmsg')}")
+        return e.details.get("nUpserted", 0), len(errors)
+
+# ---------------------------------------------------------
+# 🏥 users -> hospitals directory (first start only)
+# ---------------------------------------------------------
+async def build_hospital_directory(db) -> int:
+    """Seeds the directory from existing users; afterwards register() keeps it current."""
+    try:
+        if await db[DIRECTORY_COLLECTION].find_one({}, {"_id": 1}):
+            return 0
+        built = await hospital_directory.rebuild(db)
+    except PyMongoError as e:
+        print(f"❌ Hospital directory build skipped: {e}")
+        return 0
+    if built:
+        print(f"🏥 Built hospital directory ({built} hospital(s))")
+    return built
+
+# ---------------------------------------------------------
+# 📊 audit_logs -> audit_rollups (first start only)
+# ---------------------------------------------------------
+async def build_audit_rollups(db) -> bool:
+    """Seeds the rollups from existing audit logs; afterwards transfers keep them current."""
+    try:
+        if await db[ROLLUP_COLLECTION].find_one({}, {"_id": 1}) or not await db[AUDIT_COLLECTION].find_one({}, {"_id": 1}):
+            return False
+        await rebuild_rollups(db)
+    except PyMongoError as e:
+        print(f"❌ Audit rollup build skipped: {e}")
+        return False
+    print("📊 Built audit rollups from audit_logs")
+    return True
+
+# ---------------------------------------------------------
+# 🔎 records: normalized patient search fields
+# ---------------------------------------------------------
+SEARCH_FIELDS_MIGRATION = "records_search_fields_v1"
+
+async def backfill_search_fields(db) -> int:
+    """
+    Adds patient_name, patient_email_lc and patient_name_terms to records written
+    before they existed, and strips dashes/spaces from stored ABHAs. Resumable:
+    it only picks up records still missing patient_email_lc, and is marked done
+    in the `migrations` collection so later starts skip the scan entirely.
+    Searches fall back to the old fields until it has finished.
+    """
+    try:
+        if await db["migrations"].find_one({"_id": SEARCH_FIELDS_MIGRATION}):
+            mark_backfilled()
+            return 0
+        updated, last_id = 0, None
+        while True:
+            query = {"patient_email_lc": {"$exists": False}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            batch = await db["records"].find(
+                query, {"patient_id": 1, "patient_email": 1, "patient_abha": 1}
+            ).sort("_id", 1).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+            if not batch:
+                break
+            last_id = batch[-1]["_id"]
+
+            patient_ids = [ObjectId(rec["patient_id"]) for rec in batch if ObjectId.is_valid(rec.get("patient_id") or "")]
+            patients = {str(user["_id"]): user async for user in db["users"].find(
+                {"_id": {"$in": patient_ids}}, {"email": 1, "full_name": 1}
+            )}
+            updates = []
+            for rec in batch:
+                patient = patients.get(rec.get("patient_id"), {})
+                fields = {"patient_name": patient.get("full_name"),
+                          **search_fields(patient.get("email") or rec.get("patient_email"), patient.get("full_name"))}
+                if isinstance(rec.get("patient_abha"), str):
+                    fields["patient_abha"] = normalize_abha(rec["patient_abha"])
+                updates.append(UpdateOne({"_id": rec["_id"]}, {"$set": fields}))
+            updated += (await db["records"].bulk_write(updates, ordered=False)).modified_count
+
+        await db["migrations"].update_one({"_id": SEARCH_FIELDS_MIGRATION}, {"$set": {"completed_at": datetime.utcnow()}}, upsert=True)
+        mark_backfilled()
+    except PyMongoError as e:
+        print(f"❌ Search field backfill stopped (resumes next start): {e}")
+        return 0
+    if updated:
+        print(f"🔎 Backfilled search fields on {updated} record(s)")
+    return updated
+
+async def run_migrations(db):
+    """The quick migrations; startup waits for these."""
+    await migrate_inbox_collections(db)
+    await build_hospital_directory(db)
+    await build_audit_rollups(db)
+
+
+if __name__ == "__main__":
+    from app.db.mongodb import connect_to_mongo, close_mongo_connection, get_database
+
+    async def main():
+        await connect_to_mongo()
+        database = await get_database()
+        await run_migrations(database)
+        await backfill_search_fields(database)
+        await close_mongo_connection()
+
+    asyncio.run(main())
@@ -18,4 +18,18 @@ async def connect_to_mongo():
 
 async def close_mongo_connection():
     db.client.close()
-    print("🛑 Disconnected from MongoDB")
\ No newline at end of file
+    print("🛑 Disconnected from MongoDB")
+
+_transactions_supported = None
+
+async def supports_transactions(db) -> bool:
+    """Multi-document transactions need a replica set or mongos; checked once per process."""
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await db.command("hello")
+            _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception as e:
+            print(f"⚠️ Could not detect transaction support, using non-transactional writes: {e}")
+            _transactions_supported = False
+    return _transactions_supported
@@ -1,8 +1,25 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.core.config import settings
-from app.db.mongodb import connect_to_mongo, close_mongo_connection
+from app.db.mongodb import connect_to_mongo, close_mongo_connection, get_database
+from app.db.indexes import ensure_indexes, verify_query_plans
+from app.db.migrations import run_migrations, backfill_search_fields
+from app.utils.key_pool import key_pool
+from app.utils.qkd_executor import qkd_executor, QKDExecutorSaturated
+from app.api.auth import user_cache
+from app.core.security import password_hasher
+from app.utils.transfer_jobs import transfer_jobs
+from app.utils.keystore import keystore
+from app.utils.key_rotation import key_rotations
+from app.utils.ai_client import triage_client
+from app.utils.triage import triage_backend
+from app.utils.inbox_hub import inbox_hub
+from app.utils.hospital_directory import hospital_directory
+from app.utils.audit import audit_sink
+from app.utils.transfer_engine import INBOX_COLLECTION
 
 # --- Import All Routers ---
 from app.api.auth import router as auth_router
@@ -11,6 +28,7 @@ from app.api.transfer import router as transfer_router
 from app.api.abha import router as abha_router
 from app.api.ai import router as ai_router 
 from app.api.doctors import router as doctors_router # 👈 NEW IMPORT
+from app.api.keys import router as keys_router
 
 # --- Lifespan: Handles startup and shutdown ---
 @asynccontextmanager
@@ -18,8 +36,45 @@ async def lifespan(app: FastAPI):
     # Startup: Connect to DB
     await connect_to_mongo()
     print("✅ Database Connected")
+    # Startup: Indexes + query-plan self-check
+    database = await get_database()
+    if settings.DB_ENSURE_INDEXES:
+        await ensure_indexes(database)
+    backfill = None
+    if settings.DB_RUN_MIGRATIONS:
+        await run_migrations(database)
+        # Touches every older record: runs in the background, searches cope until it is done
+        backfill = asyncio.create_task(backfill_search_fields(database))
+    if settings.DB_VERIFY_QUERY_PLANS:
+        await verify_query_plans(database)
+    # Startup: Spin up the QKD workers, then begin pre-generating keys
+    qkd_executor.start()
+    await key_pool.start()
+    print("⚛️ QKD Key Pool Started")
+    # Startup: Hospital KEKs (wrapped under SECRET_KEY in Mongo)
+    await keystore.load(database)
+    # Startup: Pooled HTTP client for AI triage
+    await triage_client.start()
+    await triage_backend.load()
+    # Startup: Inbox push (tails transfer_inbox on replica sets)
+    await inbox_hub.start(database[INBOX_COLLECTION])
+    # Startup: Buffered audit writer (before anything that transfers)
+    audit_sink.start(database)
+    # Startup: Pick up transfer jobs interrupted by the last shutdown
+    await transfer_jobs.resume_incomplete(database)
+    await key_rotations.resume_incomplete(database)
     yield
-    # Shutdown: Close DB
+    # Shutdown: Pause background jobs, stop key refill, then close DB
+    if backfill is not None:
+        backfill.cancel()   # Resumable: picks up where it stopped on the next start
+        await asyncio.gather(backfill, return_exceptions=True)
+    await transfer_jobs.shutdown()
+    await key_rotations.shutdown()
+    await inbox_hub.stop()
+    await audit_sink.stop()
+    await triage_client.close()
+    await key_pool.stop()
+    qkd_executor.shutdown()
     await close_mongo_connection()
     print("❌ Database Disconnected")
 
@@ -29,6 +84,15 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# --- QKD Backpressure: Saturated simulator -> 503 ---
+@app.exception_handler(QKDExecutorSaturated)
+async def qkd_saturated_handler(request, exc: QKDExecutorSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Quantum key service is busy. Please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
 # --- CORS Middleware ---
 origins = [
     "http://localhost:5173",
@@ -44,6 +108,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # --- Register Routers ---
@@ -53,6 +118,7 @@ app.include_router(transfer_router, prefix="/api/transfer", tags=["QKD Transfer"
 app.include_router(abha_router, prefix="/api/abha", tags=["ABHA Integration"])
 app.include_router(ai_router, prefix="/api", tags=["AI Triage"]) 
 app.include_router(doctors_router, prefix="/api/doctors", tags=["Doctor Directory"]) # 👈 NEW ROUTE
+app.include_router(keys_router, prefix="/api/keys", tags=["Key Management"])
 
 # --- Root Endpoint ---
 @app.get("/")
@@ -60,7 +126,24 @@ def read_root():
     return {
         "status": "System Online", 
         "database": settings.DB_NAME, 
-        "modules": ["Auth", "Records", "QKD Transfer", "ABHA", "AI", "Doctors"]
+        "modules": ["Auth", "Records", "QKD Transfer", "ABHA", "AI", "Doctors", "Keys"]
+    }
+
+# --- Metrics Endpoint ---
+@app.get("/api/metrics", tags=["Monitoring"])
+def read_metrics():
+    return {
+        "qkd_key_pool": key_pool.stats(),
+        "qkd_executor": qkd_executor.stats(),
+        "user_cache": user_cache.stats(),
+        "hospital_directory": hospital_directory.stats(),
+        "password_hasher": password_hasher.stats(),
+        "transfer_jobs": transfer_jobs.stats(),
+        "keystore": keystore.stats(),
+        "key_rotations": key_rotations.stats(),
+        "ai_triage": triage_backend.stats(),
+        "inbox_hub": inbox_hub.stats(),
+        "audit_sink": audit_sink.stats()
     }
 
 if __name__ == "__main__":
@@ -31,16 +31,17 @@ class RecordResponse(BaseModel):
         json_encoders = {datetime: lambda v: v.isoformat()}
 
 # --- 2. AUDIT LOG MODEL ---
+# Schema of an `audit_logs` document; written through app.utils.audit.audit_sink
 class AuditLog(BaseModel):
     id: Optional[str] = Field(alias="_id", default=None)
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.now)
     sender_hospital: str
-    sender_doctor: str
+    sender_doctor: Optional[str] = None
     receiver_hospital: str
-    record_id: str
-    qkd_key_id: str
-    status: str = "SECURE"
+    record_id: Optional[str] = None
+    qkd_key_id: Optional[str] = None
+    status: str = "SECURE TRANSFER"
 
     class Config:
         populate_by_name = True
-        json_encoders = {datetime: lambda v: v.isoformat()}
\ No newline at end of file
+        json_encoders = {datetime: lambda v: v.isoformat()}
@@ -0,0 +1,210 @@
+# backend/app/utils/ai_client.py
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+from app.core.config import settings
+from app.utils.cache import TTLCache
+
+
+class TriageUnavailable(Exception):
+    """The AI service failed, timed out, or the circuit breaker is open."""
+
+
+class TriageRequestError(Exception):
+    """The AI service rejected the request itself (4xx other than 429); not an outage."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"HTTP {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive cache key for diagnosis text."""
+    return " ".join(text.lower().split())
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `reset_after` seconds, then lets a single trial call through (half-open);
+    other calls are rejected until that trial reports success or failure.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open" or self.trial_in_flight:
+            return False
+        self.trial_in_flight = True
+        return True
+
+    def release(self):
+        """Ends a trial that neither succeeded nor failed (e.g. the request was cancelled)."""
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.trial_in_flight = False
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.trial_in_flight = False
+        self.failures += 1
+        if self.failures >= self.threshold or self.state == "half-open":
+            self.opened_at = time.monotonic()
+
+
+class TriageClient:
+    """
+    Pooled async client for the zero-shot classification endpoint.
+
+    One httpx.AsyncClient is created in main.lifespan and reused, so requests
+    share keep-alive connections. Results are cached per normalized text and
+    label set. Timeouts, 429 and 5xx responses are retried with backoff and tracked
+    by a circuit breaker; other 4xx responses raise TriageRequestError straight away.
+    """
+
+    def __init__(self, url: str, token: Optional[str] = None, timeout: float = 10.0,
+                 retries: int = 2, cache: Optional[TTLCache] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        self.cache = cache if cache is not None else TTLCache()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Counters
+        self.requests = 0
+        self.failures = 0
+        self.rejected = 0
+
+    # --- 1. LIFECYCLE (called from main.lifespan) ---
+    async def start(self):
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+            self._client = httpx.AsyncClient(
+                headers=headers,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # --- 2. REQUEST PATH ---
+    async def _post(self, text: str, labels: Sequence[str]) -> Dict[str, Any]:
+        payload = {"inputs": text, "parameters": {"candidate_labels": list(labels)}}
+        last_error: Exception = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(0.25 * 2 ** (attempt - 1))
+            self.requests += 1
+            try:
+                response = await self._client.post(self.url, json=payload)
+            except httpx.HTTPError as e:
+                last_error = e
+                continue
+            # 429 / 5xx (including HF "model is loading") are worth retrying
+            if response.status_code == 429 or response.status_code >= 500:
+                last_error = TriageUnavailable(f"HTTP {response.status_code}")
+                continue
+            # Other 4xx are our request's fault: retrying or tripping the breaker won't help
+            if response.status_code >= 400:
+                raise TriageRequestError(response.status_code, self._error_detail(response))
+            try:
+                data = response.json()
+            except ValueError:
+                raise TriageUnavailable(f"HTTP {response.status_code}: invalid JSON")
+            if isinstance(data, dict) and "error" in data:
+                raise TriageUnavailable(f"HF Error: {data['error']}")
+            if not isinstance(data, dict) or "labels" not in data:
+                raise TriageUnavailable(f"HTTP {response.status_code}: unexpected response")
+            return data
+        raise TriageUnavailable(str(last_error) or type(last_error).__name__)
+
+    @staticmethod
+    def _error_detail(response: httpx.Response) -> str:
+        try:
+            data = response.json()
+        except ValueError:
+            return response.text[:200] or response.reason_phrase
+        if isinstance(data, dict) and "error" in data:
+            return str(data["error"])
+        return response.reason_phrase
+
+    async def classify(self, text: str, labels: Sequence[str]) -> Dict[str, List]:
+        """Returns {"labels": [...], "scores": [...]} sorted by score, best first."""
+        key = (normalize_text(text), tuple(labels))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        if self._client is None:
+            raise TriageUnavailable("AI client not started")
+        if not self.breaker.allow():
+            raise TriageUnavailable("AI service temporarily unavailable (circuit open)")
+
+        try:
+            data = await self._post(text, labels)
+        except TriageUnavailable:
+            self.failures += 1
+            self.breaker.record_failure()
+            raise
+        except TriageRequestError:
+            # The service answered, so this says nothing about its health
+            self.rejected += 1
+            self.breaker.release()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+
+        result = {"labels": data["labels"], "scores": data["scores"]}
+        self.cache.set(key, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "requests": self.requests,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "circuit": self.breaker.state,
+            "cache": self.cache.stats(),
+        }
+
+
+# Shared client used by the AI router
+triage_client = TriageClient(
+    url=settings.AI_URL,
+    token=settings.HF_TOKEN,
+    timeout=settings.AI_TIMEOUT,
+    retries=settings.AI_RETRIES,
+    cache=TTLCache(maxsize=settings.AI_CACHE_SIZE, ttl=settings.AI_CACHE_TTL),
+    breaker=CircuitBreaker(threshold=settings.AI_BREAKER_THRESHOLD, reset_after=settings.AI_BREAKER_RESET),
+)
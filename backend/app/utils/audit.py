@@ -0,0 +1,249 @@
+# backend/app/utils/audit.py
+import asyncio
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from pymongo import UpdateOne, WriteConcern
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.core.config import settings
+from app.models.record import AuditLog
+
+AUDIT_COLLECTION = "audit_logs"
+ROLLUP_COLLECTION = "audit_rollups"
+GRANULARITIES = ("hour", "day")
+
+# ---------------------------------------------------------
+# 📊 ROLLUPS: transfers per (sender, receiver) per hour/day
+# ---------------------------------------------------------
+# {granularity, bucket, sender_hospital, receiver_hospital, count}, unique on the
+# first four. Kept current at write time; the dashboard reads O(buckets) rows.
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def rollup_updates(entries: Iterable[dict]) -> List[UpdateOne]:
+    """One $inc upsert per (granularity, bucket, sender, receiver) touched by `entries`."""
+    counts = Counter(
+        (granularity, bucket_start(entry["timestamp"], granularity),
+         entry["sender_hospital"], entry["receiver_hospital"])
+        for entry in entries for granularity in GRANULARITIES
+    )
+    return [UpdateOne(
+        {"granularity": granularity, "bucket": bucket,
+         "sender_hospital": sender, "receiver_hospital": receiver},
+        {"$inc": {"count": count}},
+        upsert=True
+    ) for (granularity, bucket, sender, receiver), count in counts.items()]
+
+async def record_rollups(db, entries: List[dict]):
+    updates = rollup_updates(entries)
+    if updates:
+        await db[ROLLUP_COLLECTION].bulk_write(updates, ordered=False)
+
+def rebuild_pipeline(granularity: str) -> List[Dict]:
+    """Recomputes one granularity from audit_logs and $merges it into audit_rollups (MongoDB 5.0+)."""
+    return [
+        {"$match": {"timestamp": {"$type": "date"}}},
+        {"$group": {
+            "_id": {
+                "bucket": {"$dateTrunc": {"date": "$timestamp", "unit": granularity}},
+                "sender_hospital": "$sender_hospital",
+                "receiver_hospital": "$receiver_hospital",
+            },
+            "count": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": 0,
+            "granularity": {"$literal": granularity},
+            "bucket": "$_id.bucket",
+            "sender_hospital": "$_id.sender_hospital",
+            "receiver_hospital": "$_id.receiver_hospital",
+            "count": 1,
+        }},
+        {"$merge": {
+            "into": ROLLUP_COLLECTION,
+            "on": ["granularity", "bucket", "sender_hospital", "receiver_hospital"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+async def rebuild_rollups(db):
+    for granularity in GRANULARITIES:
+        await db[AUDIT_COLLECTION].aggregate(rebuild_pipeline(granularity)).to_list(None)
+
+# ---------------------------------------------------------
+# 📝 AUDIT SINK: buffered, batched audit writes
+# ---------------------------------------------------------
+AuditEntry = Union[AuditLog, dict]
+
+def audit_document(entry: AuditEntry) -> dict:
+    """Validates an entry against the AuditLog schema and returns the document to store."""
+    if not isinstance(entry, AuditLog):
+        entry = AuditLog(**entry)
+    return entry.model_dump(by_alias=True, exclude_none=True)
+
+
+class AuditSink:
+    """
+    Takes audit entries off the request path.
+
+    emit() validates entries and puts them on a bounded queue (callers wait only
+    when it is full). A background task drains the queue and writes a batch with
+    one unordered insert_many once it holds `batch_size` entries or `flush_interval`
+    seconds have passed, then bumps the rollups for the whole batch. Buffered
+    writes use w=1 without journaling. Entries still queued at shutdown are flushed.
+
+    critical=True (or AUDIT_SYNC_WRITES) writes before returning, with majority
+    write concern, for events that must be durable before the caller proceeds;
+    a failed write then raises instead of being logged and dropped.
+    """
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, retries: int = 3):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self._db = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    # --- 1. WRITES ---
+    async def emit(self, db, entries: Iterable[AuditEntry], critical: bool = False):
+        documents = [audit_document(entry) for entry in entries]
+        if not documents:
+            return
+        if critical or settings.AUDIT_SYNC_WRITES or self._task is None:
+            # Not started (scripts, tests) or compliance-critical: write now
+            await self._write(db, documents, WriteConcern(w="majority"))
+            return
+        for document in documents:
+            await self._queue.put(document)
+
+    async def _write(self, db, documents: List[dict], write_concern: WriteConcern):
+        """
+        insert_many + rollups. Retried inserts reuse each document's _id, so nothing is
+        written twice. Raises if any entry could not be stored (after counting it as dropped).
+        """
+        collection = db[AUDIT_COLLECTION].with_options(write_concern=write_concern)
+        failed, error = set(), None
+        for attempt in range(1, self.retries + 1):
+            try:
+                await collection.insert_many(documents, ordered=False)
+                break
+            except BulkWriteError as e:
+                # Duplicates were written by an earlier attempt; anything else is lost
+                failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != 11000}
+                error = e if failed else None
+                break
+            except PyMongoError as e:
+                if attempt == self.retries:
+                    self.dropped += len(documents)
+                    raise
+                print(f"⚠️ Audit write failed (attempt {attempt}/{self.retries}): {e}")
+                await asyncio.sleep(0.5 * attempt)
+
+        written = [doc for index, doc in enumerate(documents) if index not in failed]
+        if written:
+            try:
+                await record_rollups(db, written)
+            except PyMongoError as e:
+                # The entries themselves are stored; only the dashboard counts lag (rebuild_rollups repairs them)
+                print(f"⚠️ Audit rollups not updated for {len(written)} entries: {e}")
+        self.written += len(written)
+        self.batches += 1
+
+        if error is not None:
+            self.dropped += len(failed)
+            raise error
+
+    # --- 2. WORKER ---
+    async def _drain(self):
+        write_concern = WriteConcern(w=1, j=False)
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            item = await self._queue.get()
+            deadline = loop.time() + self.flush_interval
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            stopping = item is None  # None is the shutdown sentinel, queued after everything else
+            if batch:
+                # Buffered writes have no caller left to fail: log and keep draining
+                try:
+                    await self._write(self._db, batch, write_concern)
+                except PyMongoError as e:
+                    print(f"❌ Audit flush failed, entries lost: {e}")    # _write counted them
+                except Exception as e:
+                    print(f"❌ Audit flush failed, {len(batch)} entries lost: {e}")
+                    self.dropped += len(batch)
+
+    # --- 3. LIFECYCLE (called from main.lifespan) ---
+    def start(self, db):
+        self._db = db
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._drain())
+        print(f"📝 Audit sink started (batch {self.batch_size}, every {self.flush_interval}s)")
+
+    async def stop(self):
+        """Flushes everything queued so far, then stops the worker."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        print(f"📝 Audit sink flushed ({self.written} written, {self.dropped} dropped)")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+        }
+
+
+# ---------------------------------------------------------
+# 🏛️ API VIEW
+# ---------------------------------------------------------
+def format_audit_log(entry: dict) -> dict:
+    return {
+        "id": str(entry["_id"]),
+        "timestamp": entry.get("timestamp"),
+        "sender_hospital": entry.get("sender_hospital"),
+        "receiver_hospital": entry.get("receiver_hospital"),
+        "record_id": entry.get("record_id"),
+        "qkd_key_id": entry.get("qkd_key_id"),
+        "status": entry.get("status"),
+    }
+
+
+# Shared sink used by the transfer engine
+audit_sink = AuditSink(
+    max_queue=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+)
@@ -1,21 +1,138 @@
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Sequence, Tuple, Union
+from bson import Binary
 import base64
+import os
+import zlib
+
+from app.core.config import settings
+
+# Optional: zstd compresses medical free text better than zlib, but isn't required
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# --- ENVELOPE FORMAT (v1) ---
+# [version: 1 byte][flags: 1 byte][nonce: 12 bytes][AES-256-GCM ciphertext + 16-byte tag]
+# Stored as BSON Binary. The 2-byte header is authenticated as associated data.
+# Legacy records hold Fernet tokens as str and are told apart by type.
+ENVELOPE_VERSION = 1
+FLAG_ZLIB = 0x01
+FLAG_ZSTD = 0x02
+NONCE_SIZE = 12
+
+Ciphertext = Union[str, bytes]
+
+@lru_cache(maxsize=settings.CIPHER_CACHE_SIZE)
+def _cached_fernet(key_hex: str) -> Fernet:
+    key_bytes = bytes.fromhex(key_hex)
+    return Fernet(base64.urlsafe_b64encode(key_bytes))
+
+@lru_cache(maxsize=settings.CIPHER_CACHE_SIZE)
+def _cached_aesgcm(key_hex: str) -> AESGCM:
+    return AESGCM(bytes.fromhex(key_hex))
 
 def get_fernet(key_hex):
     """
     Convert our Quantum Hex Key into a format Fernet (AES) accepts.
     Fernet needs a 32-byte base64 encoded key.
+    Cipher objects are kept in a bounded LRU keyed by the key hash.
     """
     # Take first 32 bytes of the hex key
-    key_bytes = bytes.fromhex(key_hex[:64]) 
-    return Fernet(base64.urlsafe_b64encode(key_bytes))
+    return _cached_fernet(key_hex[:64])
+
+def get_aesgcm(key_hex):
+    """AES-256-GCM cipher for the first 32 bytes of the hex key (same LRU policy as Fernet)."""
+    return _cached_aesgcm(key_hex[:64])
+
+def _compress(payload: bytes) -> Tuple[int, bytes]:
+    if len(payload) < settings.ENCRYPTION_COMPRESS_THRESHOLD:
+        return 0, payload
+    if zstandard is not None:
+        flag, compressed = FLAG_ZSTD, zstandard.ZstdCompressor().compress(payload)
+    else:
+        flag, compressed = FLAG_ZLIB, zlib.compress(payload)
+    # Keep the original if compression didn't help (e.g. already random-looking text)
+    return (flag, compressed) if len(compressed) < len(payload) else (0, payload)
+
+def _decompress(flags: int, payload: bytes) -> bytes:
+    if flags & FLAG_ZSTD:
+        if zstandard is None:
+            raise ValueError("Record is zstd-compressed but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if flags & FLAG_ZLIB:
+        return zlib.decompress(payload)
+    return payload
+
+def is_legacy_ciphertext(encrypted_data: Ciphertext) -> bool:
+    """True for Fernet tokens written before the AES-GCM envelope format."""
+    return isinstance(encrypted_data, str)
 
-def encrypt_data(data: str, key_hex: str) -> str:
+def encrypt_data(data: str, key_hex: str) -> Ciphertext:
     """Locks the data using the Quantum Key"""
-    f = get_fernet(key_hex)
-    return f.encrypt(data.encode()).decode()
+    if settings.ENCRYPTION_FORMAT == "fernet":
+        f = get_fernet(key_hex)
+        return f.encrypt(data.encode()).decode()
 
-def decrypt_data(encrypted_data: str, key_hex: str) -> str:
+    flags, payload = _compress(data.encode())
+    header = bytes([ENVELOPE_VERSION, flags])
+    nonce = os.urandom(NONCE_SIZE)
+    return Binary(header + nonce + get_aesgcm(key_hex).encrypt(nonce, payload, header))
+
+def decrypt_data(encrypted_data: Ciphertext, key_hex: str) -> str:
     """Unlocks the data using the Quantum Key"""
-    f = get_fernet(key_hex)
-    return f.decrypt(encrypted_data.encode()).decode()
\ No newline at end of file
+    if is_legacy_ciphertext(encrypted_data):
+        f = get_fernet(key_hex)
+        return f.decrypt(encrypted_data.encode()).decode()
+
+    envelope = bytes(encrypted_data)
+    if len(envelope) < 2 + NONCE_SIZE or envelope[0] != ENVELOPE_VERSION:
+        raise ValueError("Unknown encryption envelope")
+    header, nonce, body = envelope[:2], envelope[2:2 + NONCE_SIZE], envelope[2 + NONCE_SIZE:]
+    payload = get_aesgcm(key_hex).decrypt(nonce, body, header)
+    return _decompress(header[1], payload).decode()
+
+def ciphertext_preview(encrypted_data: Ciphertext) -> str:
+    """JSON-safe form of a ciphertext for "locked" previews (envelopes are base64-encoded)."""
+    if encrypted_data is None or isinstance(encrypted_data, str):
+        return encrypted_data
+    return base64.b64encode(bytes(encrypted_data)).decode()
+
+# --- BULK API ---
+_bulk_executor = ThreadPoolExecutor(max_workers=settings.ENCRYPTION_WORKERS, thread_name_prefix="crypto")
+
+def _bulk_apply(fn, items: Sequence[Tuple[str, str]], return_exceptions: bool) -> List:
+    def run(chunk):
+        results = []
+        for value, key_hex in chunk:
+            try:
+                results.append(fn(value, key_hex))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    items = list(items)
+    if len(items) < settings.ENCRYPTION_PARALLEL_THRESHOLD:
+        return run(items)
+
+    # Large lists: one chunk per worker thread
+    chunk_size = -(-len(items) // settings.ENCRYPTION_WORKERS)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    return [result for chunk_results in _bulk_executor.map(run, chunks) for result in chunk_results]
+
+def encrypt_many(items: Sequence[Tuple[str, str]], return_exceptions: bool = False) -> List[Union[Ciphertext, Exception]]:
+    """Encrypts (data, key_hex) pairs in one pass; results keep the input order."""
+    return _bulk_apply(encrypt_data, items, return_exceptions)
+
+def decrypt_many(items: Sequence[Tuple[Ciphertext, str]], return_exceptions: bool = False) -> List[Union[str, Exception]]:
+    """
+    Decrypts (encrypted_data, key_hex) pairs in one pass; results keep the input order.
+    With return_exceptions=True a failed item yields its exception instead of aborting the batch.
+    """
+    return _bulk_apply(decrypt_data, items, return_exceptions)
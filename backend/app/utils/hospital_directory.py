@@ -0,0 +1,107 @@
+# backend/app/utils/hospital_directory.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.utils.cache import TTLCache
+
+DIRECTORY_COLLECTION = "hospitals"
+HIDDEN_HOSPITALS = {None, "", "Unknown"}
+
+
+class HospitalDirectory:
+    """
+    Materialized list of hospitals with per-role user counts, kept in the
+    `hospitals` collection ({name, doctor_count, user_count, ...}).
+
+    register() bumps the counts as users sign up, so listing hospitals never
+    scans `users`. The listing is cached per process; record_user() invalidates
+    the local copy and the TTL bounds how stale other workers can be.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.cache = TTLCache(maxsize=16, ttl=ttl)
+
+    # --- 1. WRITES ---
+    async def record_user(self, db, user: dict):
+        """Counts a newly registered user towards their hospital's entry."""
+        name = user.get("hospital")
+        if name in HIDDEN_HOSPITALS:
+            return
+        update = {
+            "$inc": {"user_count": 1, "doctor_count": 1 if user.get("role") == "doctor" else 0},
+            "$set": {"updated_at": datetime.utcnow()},
+            "$setOnInsert": {"created_at": datetime.utcnow()},
+        }
+        try:
+            await db[DIRECTORY_COLLECTION].update_one({"name": name}, update, upsert=True)
+        except DuplicateKeyError:
+            # Lost an upsert race with another registration: the entry exists now
+            await db[DIRECTORY_COLLECTION].update_one({"name": name}, update)
+        self.invalidate()
+
+    def invalidate(self):
+        self.cache.clear()
+
+    # --- 2. READS ---
+    async def hospitals(self, db) -> List[Dict[str, Any]]:
+        """All hospitals as [{name, doctor_count}], sorted by name."""
+        entries = self.cache.get("all")
+        if entries is None:
+            entries = await db[DIRECTORY_COLLECTION].find(
+                {}, {"_id": 0, "name": 1, "doctor_count": 1}
+            ).sort("name", 1).to_list(None)
+            self.cache.set("all", entries)
+        return entries
+
+    async def has_hospital(self, db, name: str) -> bool:
+        """Whether `name` is a registered hospital. A miss is re-checked in Mongo, so a hospital
+        registered through another worker is found before this process's cache expires."""
+        if name in HIDDEN_HOSPITALS:
+            return False
+        if any(entry["name"] == name for entry in await self.hospitals(db)):
+            return True
+        return await db[DIRECTORY_COLLECTION].find_one({"name": name}, {"_id": 1}) is not None
+
+    async def doctors(self, db, hospital: str, limit: int,
+                      after: Optional[ObjectId] = None) -> Tuple[List[dict], Optional[ObjectId]]:
+        """One page of a hospital's doctors in sign-up order, plus the _id to continue after."""
+        query = {"role": "doctor", "hospital": hospital}
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        doctors = await db["users"].find(
+            query, {"full_name": 1, "email": 1, "specialization": 1, "hospital": 1}
+        ).sort("_id", 1).limit(limit).to_list(limit)
+        next_after = doctors[-1]["_id"] if len(doctors) == limit else None
+        return doctors, next_after
+
+    # --- 3. REBUILD (first start / manual repair) ---
+    async def rebuild(self, db) -> int:
+        """Recomputes every entry from `users` in one aggregation."""
+        now = datetime.utcnow()
+        rebuilt = 0
+        async for row in db["users"].aggregate([
+            {"$match": {"hospital": {"$nin": list(HIDDEN_HOSPITALS)}}},
+            {"$group": {
+                "_id": "$hospital",
+                "user_count": {"$sum": 1},
+                "doctor_count": {"$sum": {"$cond": [{"$eq": ["$role", "doctor"]}, 1, 0]}},
+            }},
+        ]):
+            await db[DIRECTORY_COLLECTION].update_one({"name": row["_id"]}, {
+                "$set": {"user_count": row["user_count"], "doctor_count": row["doctor_count"], "updated_at": now},
+                "$setOnInsert": {"created_at": now},
+            }, upsert=True)
+            rebuilt += 1
+        self.invalidate()
+        return rebuilt
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+# Shared directory used by auth (writes) and the doctors router (reads)
+hospital_directory = HospitalDirectory(ttl=settings.HOSPITAL_DIRECTORY_TTL)
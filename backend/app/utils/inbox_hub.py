@@ -0,0 +1,130 @@
+# backend/app/utils/inbox_hub.py
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Set
+
+from app.core.config import settings
+from app.db.mongodb import supports_transactions
+from app.utils.encryption import ciphertext_preview
+
+
+def format_inbox_item(packet: dict) -> dict:
+    """Client view of an inbox packet (binary ciphertexts are sent as base64)."""
+    return {
+        **packet,
+        "_id": str(packet["_id"]),
+        "encrypted_diagnosis": ciphertext_preview(packet.get("encrypted_diagnosis")),
+        "prescription": ciphertext_preview(packet.get("prescription")),
+        "wrapped_key": ciphertext_preview(packet.get("wrapped_key")),
+    }
+
+
+class InboxHub:
+    """
+    In-process pub/sub for inbox deltas, keyed by inbox target_key.
+
+    Events: {"type": "added", "item": {...}} and {"type": "removed", "ids": [...]}.
+    On a replica set the hub tails inserts on transfer_inbox, so packets written by
+    any app instance reach every subscriber; otherwise the transfer code publishes
+    them directly (single instance / tests). Removals are always published by the
+    accept path on the instance that accepted: delete events only carry the _id, not
+    the target_key needed to route them.
+    A subscriber that falls behind gets one {"type": "resync"} instead of its backlog.
+    """
+
+    def __init__(self, queue_size: int = 100, use_change_streams: bool = True):
+        self.queue_size = queue_size
+        self.use_change_streams = use_change_streams
+        self.mode = "memory"
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._watcher: Optional[asyncio.Task] = None
+        self._published = 0
+        self._resyncs = 0
+
+    # --- 1. SUBSCRIBERS ---
+    def subscribe(self, target_key: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[target_key].add(queue)
+        return queue
+
+    def unsubscribe(self, target_key: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(target_key)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[target_key]
+
+    def _deliver(self, queues: Iterable[asyncio.Queue], event: Dict[str, Any]):
+        for queue in list(queues):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog, it re-reads the inbox instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+                self._resyncs += 1
+        self._published += 1
+
+    # --- 2. PUBLISHERS ---
+    def publish(self, target_key: str, event: Dict[str, Any]):
+        """Called by the transfer/accept code; a no-op when the change stream feeds the hub."""
+        if self.mode == "memory":
+            self._deliver(self._subscribers.get(target_key, ()), event)
+
+    def publish_added(self, packets: Iterable[dict]):
+        for packet in packets:
+            self.publish(packet["target_key"], {"type": "added", "item": format_inbox_item(packet)})
+
+    def publish_removed(self, target_key: str, ids: Iterable):
+        """Delivered in every mode (the change stream does not carry deletes)."""
+        ids = [str(i) for i in ids]
+        if ids:
+            self._deliver(self._subscribers.get(target_key, ()), {"type": "removed", "ids": ids})
+
+    # --- 3. 🌊 CHANGE STREAM (replica sets only) ---
+    async def _watch(self, collection):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        resume_token = None
+        while True:
+            try:
+                async with collection.watch(pipeline, resume_after=resume_token) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        packet = change["fullDocument"]
+                        self._deliver(self._subscribers.get(packet["target_key"], ()),
+                                      {"type": "added", "item": format_inbox_item(packet)})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Inbox change stream interrupted, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+    # --- 4. LIFECYCLE (called from main.lifespan) ---
+    async def start(self, collection):
+        """collection: the transfer_inbox collection."""
+        # Change streams have the same replica set / mongos requirement as transactions
+        if self.use_change_streams and await supports_transactions(collection.database):
+            self.mode = "change_stream"
+            self._watcher = asyncio.create_task(self._watch(collection))
+        print(f"📡 Inbox hub started ({self.mode})")
+
+    async def stop(self):
+        if self._watcher:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        self.mode = "memory"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "inboxes": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self._published,
+            "resyncs": self._resyncs,
+        }
+
+
+# Shared hub: transfer/accept publish to it, the inbox WebSocket subscribes
+inbox_hub = InboxHub(queue_size=settings.INBOX_HUB_QUEUE_SIZE, use_change_streams=settings.INBOX_CHANGE_STREAMS)
@@ -0,0 +1,140 @@
+# backend/app/utils/key_pool.py
+import asyncio
+from collections import deque
+from typing import Dict, Any, List
+
+from app.core.config import settings
+from app.utils.quantum import simulate_qkd_exchange_async, simulate_qkd_batch_async
+from app.utils.qkd_executor import QKDExecutorSaturated
+
+
+class QKDKeyPool:
+    """
+    Bounded buffer of ready-to-use QKD keys (final_key_hash values).
+
+    A background worker keeps the buffer topped up between the low and high
+    watermarks, so request handlers only have to dequeue a key instead of
+    running a full BB84 simulation while the client waits. Each refill produces
+    the whole deficit with one batched simulation.
+    """
+
+    def __init__(self, low_watermark: int = 32, high_watermark: int = 256):
+        if low_watermark > high_watermark:
+            raise ValueError("low_watermark must not exceed high_watermark")
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+
+        self._keys: deque = deque(maxlen=high_watermark)
+        self._refill_needed = asyncio.Event()
+        self._task: asyncio.Task = None
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.refill_errors = 0
+
+    # --- 1. LIFECYCLE (called from main.lifespan) ---
+    async def start(self):
+        if self._task is None:
+            self._refill_needed.set()
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # --- 2. BACKGROUND REFILL ---
+    async def _generate_key(self) -> str:
+        qkd_result = await simulate_qkd_exchange_async()
+        return qkd_result["final_key_hash"]
+
+    async def _refill_loop(self):
+        while True:
+            await self._refill_needed.wait()
+            self._refill_needed.clear()
+
+            while len(self._keys) < self.high_watermark:
+                # The whole deficit in one executor call (one simulator run for Aer)
+                deficit = self.high_watermark - len(self._keys)
+                try:
+                    batch = await simulate_qkd_batch_async(deficit)
+                except QKDExecutorSaturated:
+                    # Request-path misses have priority; back off briefly
+                    await asyncio.sleep(0.1)
+                    continue
+                except Exception as e:
+                    self.refill_errors += 1
+                    print(f"❌ QKD Key Pool refill failed: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                self._keys.extend(qkd_result["final_key_hash"] for qkd_result in batch)
+                self.generated += len(batch)
+
+    # --- 3. REQUEST PATH ---
+    async def acquire_key(self) -> str:
+        """
+        Dequeue a ready key, falling back to an on-demand exchange if the pool is empty.
+        Raises QKDExecutorSaturated when the fallback cannot be scheduled.
+        """
+        try:
+            key = self._keys.popleft()
+            self.hits += 1
+        except IndexError:
+            self.misses += 1
+            key = await self._generate_key()
+
+        if len(self._keys) < self.low_watermark:
+            self._refill_needed.set()
+        return key
+
+    async def acquire_keys(self, count: int) -> List[str]:
+        """
+        Dequeue `count` keys at once. Whatever the pool cannot cover is produced
+        by a single batched simulation rather than one exchange per key.
+        """
+        keys = []
+        while len(keys) < count and self._keys:
+            keys.append(self._keys.popleft())
+
+        shortfall = count - len(keys)
+        if shortfall:
+            try:
+                batch = await simulate_qkd_batch_async(shortfall)
+            except BaseException:
+                # Nothing was handed out: return the pooled keys in their original order
+                self._keys.extendleft(reversed(keys))
+                raise
+            self.misses += shortfall
+            keys.extend(qkd_result["final_key_hash"] for qkd_result in batch)
+        self.hits += count - shortfall
+
+        if len(self._keys) < self.low_watermark:
+            self._refill_needed.set()
+        return keys
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "available": len(self._keys),
+            "low_watermark": self.low_watermark,
+            "high_watermark": self.high_watermark,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "generated": self.generated,
+            "refill_errors": self.refill_errors,
+            "running": self._task is not None and not self._task.done(),
+        }
+
+
+# Shared pool used by the API routers
+key_pool = QKDKeyPool(
+    low_watermark=settings.QKD_POOL_LOW_WATERMARK,
+    high_watermark=settings.QKD_POOL_HIGH_WATERMARK,
+)
@@ -0,0 +1,157 @@
+# backend/app/utils/key_rotation.py
+import asyncio
+from datetime import datetime
+from typing import Any, Dict
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.utils.keystore import keystore
+from app.utils.transfer_engine import INBOX_COLLECTION, inbox_key
+
+
+class KeyRotationManager:
+    """
+    Rotates a hospital's KEK and re-wraps its data keys in the background.
+
+    Only the 32-byte wrapped keys are rewritten; ciphertexts never change.
+    Records still holding a plain `quantum_key` are moved onto the new KEK too.
+    Job state lives in `key_rotations`; the scan is idempotent, so jobs
+    interrupted by a restart simply run again.
+    """
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    # --- 1. SUBMIT ---
+    async def submit(self, db, hospital: str, requested_by: str) -> Dict[str, Any]:
+        _, kek_id = await keystore.rotate(db, hospital)
+        now = datetime.utcnow()
+        job = {
+            "hospital": hospital,
+            "kek_id": kek_id,
+            "status": "running",
+            "rewrapped": 0,
+            "failed": 0,
+            "error": None,
+            "requested_by": requested_by,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None,
+        }
+        result = await db["key_rotations"].insert_one(job)
+        self._spawn(db, result.inserted_id)
+        return {"job_id": str(result.inserted_id), "status": "running", "kek_id": kek_id}
+
+    def _spawn(self, db, job_id: ObjectId):
+        key = str(job_id)
+        if key in self._tasks:
+            return
+        task = asyncio.create_task(self._run(db, job_id))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+
+    # --- 2. WORKER ---
+    async def _rewrap(self, db, job_id: ObjectId, collection_name: str, query: dict, kek_id: str):
+        failed_ids = []
+        while True:
+            docs = await db[collection_name].find(
+                {**query, "_id": {"$nin": failed_ids}},
+                {"wrapped_key": 1, "kek_id": 1, "quantum_key": 1}
+            ).limit(self.batch_size).to_list(self.batch_size)
+            if not docs:
+                return
+
+            await keystore.ensure_loaded(db, [doc.get("kek_id") for doc in docs])
+            updates = []
+            for doc in docs:
+                try:
+                    wrapped_key = keystore.wrap(kek_id, keystore.data_key(doc))
+                except Exception as e:
+                    print(f"⚠️ Could not re-wrap {collection_name} {doc['_id']}: {e!r}")
+                    failed_ids.append(doc["_id"])
+                    continue
+                # Guarded on the old key so a concurrent write is never clobbered
+                guard = {"kek_id": doc["kek_id"]} if doc.get("kek_id") else {"quantum_key": doc["quantum_key"]}
+                updates.append(UpdateOne(
+                    {"_id": doc["_id"], **guard},
+                    {"$set": {"wrapped_key": wrapped_key, "kek_id": kek_id}, "$unset": {"quantum_key": ""}}
+                ))
+
+            rewrapped = 0
+            if updates:
+                result = await db[collection_name].bulk_write(updates, ordered=False)
+                rewrapped = result.modified_count
+            await db["key_rotations"].update_one({"_id": job_id}, {
+                "$inc": {"rewrapped": rewrapped, "failed": len(docs) - len(updates)},
+                "$set": {"updated_at": datetime.utcnow()},
+            })
+
+    async def _run(self, db, job_id: ObjectId):
+        job = await db["key_rotations"].find_one({"_id": job_id})
+        if not job or job["status"] != "running":
+            return
+
+        hospital, kek_id = job["hospital"], job["kek_id"]
+        try:
+            await self._rewrap(db, job_id, "records", {"hospital": hospital, "$or": [
+                {"kek_id": {"$exists": True, "$ne": kek_id}},
+                {"quantum_key": {"$exists": True}},
+            ]}, kek_id)
+            # Packets waiting in the inbox were wrapped for this hospital's old KEK
+            await self._rewrap(db, job_id, INBOX_COLLECTION,
+                               {"target_key": inbox_key(hospital), "kek_id": {"$exists": True, "$ne": kek_id}}, kek_id)
+
+            now = datetime.utcnow()
+            await db["key_rotations"].update_one({"_id": job_id}, {"$set": {
+                "status": "completed", "updated_at": now, "finished_at": now
+            }})
+        except asyncio.CancelledError:
+            # App shutting down: leave the job "running" so it resumes on the next start
+            raise
+        except Exception as e:
+            print(f"❌ Key rotation {job_id} failed: {e}")
+            now = datetime.utcnow()
+            await db["key_rotations"].update_one({"_id": job_id}, {"$set": {
+                "status": "failed", "error": str(e), "updated_at": now, "finished_at": now
+            }})
+
+    # --- 3. LIFECYCLE (called from main.lifespan) ---
+    async def resume_incomplete(self, db) -> int:
+        resumed = 0
+        async for job in db["key_rotations"].find({"status": "running"}, {"_id": 1}):
+            self._spawn(db, job["_id"])
+            resumed += 1
+        if resumed:
+            print(f"🔁 Resuming {resumed} key rotation(s)")
+        return resumed
+
+    async def shutdown(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active": len(self._tasks), "batch_size": self.batch_size}
+
+
+def rotation_progress(job: dict) -> Dict[str, Any]:
+    """Formats a key_rotations document for the status endpoint."""
+    return {
+        "job_id": str(job["_id"]),
+        "hospital": job["hospital"],
+        "kek_id": job["kek_id"],
+        "status": job["status"],
+        "rewrapped": job["rewrapped"],
+        "failed": job["failed"],
+        "error": job.get("error"),
+        "created_at": job["created_at"],
+        "finished_at": job.get("finished_at"),
+    }
+
+
+# Shared manager used by the keys router
+key_rotations = KeyRotationManager(batch_size=settings.KEY_ROTATION_BATCH_SIZE)
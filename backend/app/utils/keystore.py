@@ -0,0 +1,143 @@
+# backend/app/utils/keystore.py
+import asyncio
+import hashlib
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from bson import Binary, ObjectId
+from cryptography.hazmat.primitives.keywrap import aes_key_wrap, aes_key_unwrap
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.utils.key_pool import key_pool
+
+# ---------------------------------------------------------
+# 🗝️ KEY HIERARCHY
+# ---------------------------------------------------------
+# SECRET_KEY -> master key -> per-hospital KEK (QKD-derived, rotating)
+#                                -> per-record data key (QKD-derived)
+# Records store `wrapped_key` (RFC 3394 AES key wrap) and `kek_id`. Moving a
+# record between hospitals re-wraps the 32-byte data key; the ciphertext is untouched.
+# Older records keep their data key in plain `quantum_key` and are still readable.
+
+def _master_key() -> bytes:
+    return hashlib.sha256(settings.SECRET_KEY.encode()).digest()
+
+
+class HospitalKeyStore:
+    """
+    In-process cache of hospital key-encryption keys (KEKs).
+
+    KEKs are persisted in `hospital_keys`, wrapped under the master key, and loaded
+    at startup. Retired KEKs stay loadable so records wrapped under them still open
+    until the rotation job has re-wrapped them. Which KEK is active is re-read after
+    `active_ttl` seconds, so a rotation in another worker reaches this one too.
+    """
+
+    def __init__(self, active_ttl: float = 30.0):
+        self.active_ttl = active_ttl
+        self._keks: Dict[str, bytes] = {}    # kek_id -> raw KEK
+        self._active: Dict[str, str] = {}    # hospital -> active kek_id
+        self._checked: Dict[str, float] = {} # hospital -> when _active was last confirmed
+        self._lock = asyncio.Lock()
+
+    # --- 1. LIFECYCLE (called from main.lifespan) ---
+    async def load(self, db) -> int:
+        async for doc in db["hospital_keys"].find():
+            self._remember(doc)
+        print(f"🗝️ Loaded {len(self._keks)} hospital key(s)")
+        return len(self._keks)
+
+    def _remember(self, doc: dict):
+        kek_id = str(doc["_id"])
+        self._keks[kek_id] = aes_key_unwrap(_master_key(), bytes(doc["wrapped_kek"]))
+        if doc["status"] == "active":
+            self._active[doc["hospital"]] = kek_id
+            self._checked[doc["hospital"]] = time.monotonic()
+
+    async def ensure_loaded(self, db, kek_ids: Iterable[str]):
+        """Fetches KEKs created by other processes since startup."""
+        missing = [ObjectId(k) for k in set(kek_ids) if k and k not in self._keks]
+        if missing:
+            async for doc in db["hospital_keys"].find({"_id": {"$in": missing}}):
+                self._remember(doc)
+
+    # --- 2. KEKs ---
+    async def _create_kek(self, db, hospital: str) -> str:
+        kek = bytes.fromhex((await key_pool.acquire_key())[:64])
+        doc = {
+            "_id": ObjectId(),
+            "hospital": hospital,
+            "wrapped_kek": Binary(aes_key_wrap(_master_key(), kek)),
+            "status": "active",
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            await db["hospital_keys"].insert_one(doc)
+        except DuplicateKeyError:
+            # Another process activated a KEK for this hospital first; use theirs
+            existing = await db["hospital_keys"].find_one({"hospital": hospital, "status": "active"})
+            self._remember(existing)
+            return str(existing["_id"])
+        self._remember(doc)
+        return str(doc["_id"])
+
+    def _is_fresh(self, hospital: str) -> bool:
+        return hospital in self._active and time.monotonic() - self._checked[hospital] < self.active_ttl
+
+    async def active_kek_id(self, db, hospital: str) -> str:
+        """The hospital's current KEK, created on first use. Callers must validate `hospital`."""
+        if self._is_fresh(hospital):
+            return self._active[hospital]
+        async with self._lock:
+            if not self._is_fresh(hospital):
+                existing = await db["hospital_keys"].find_one({"hospital": hospital, "status": "active"})
+                if existing:
+                    self._remember(existing)
+                else:
+                    # Not cached, or retired by another worker's rotation that has not created its successor yet
+                    self._active.pop(hospital, None)
+                    await self._create_kek(db, hospital)
+            return self._active[hospital]
+
+    async def rotate(self, db, hospital: str) -> Tuple[Optional[str], str]:
+        """Retires the active KEK and creates a new one. Returns (old_kek_id, new_kek_id)."""
+        async with self._lock:
+            old_kek_id = self._active.pop(hospital, None)
+            self._checked.pop(hospital, None)
+            await db["hospital_keys"].update_many(
+                {"hospital": hospital, "status": "active"},
+                {"$set": {"status": "retired", "retired_at": datetime.utcnow()}}
+            )
+            new_kek_id = await self._create_kek(db, hospital)
+        print(f"🔄 Rotated KEK for {hospital}: {old_kek_id} -> {new_kek_id}")
+        return old_kek_id, new_kek_id
+
+    # --- 3. DATA KEYS ---
+    def wrap(self, kek_id: str, data_key_hex: str) -> Binary:
+        return Binary(aes_key_wrap(self._keks[kek_id], bytes.fromhex(data_key_hex[:64])))
+
+    def unwrap(self, kek_id: str, wrapped_key: bytes) -> str:
+        return aes_key_unwrap(self._keks[kek_id], bytes(wrapped_key)).hex()
+
+    def data_key(self, doc: dict) -> Optional[str]:
+        """
+        The hex data key for a record or inbox packet: unwraps `wrapped_key`, or
+        falls back to the legacy plain `quantum_key` / `decryption_key` fields.
+        Call ensure_loaded() first for KEKs that may come from another process.
+        """
+        if doc.get("wrapped_key") is not None:
+            return self.unwrap(doc["kek_id"], doc["wrapped_key"])
+        return doc.get("quantum_key") or doc.get("decryption_key")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"keks_loaded": len(self._keks), "hospitals": len(self._active)}
+
+
+def has_data_key(doc: dict) -> bool:
+    return any(doc.get(field) is not None for field in ("wrapped_key", "quantum_key", "decryption_key"))
+
+
+# Shared store used by the API routers and transfer engine
+keystore = HospitalKeyStore(active_ttl=settings.KEK_ACTIVE_TTL)
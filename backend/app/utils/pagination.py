@@ -0,0 +1,35 @@
+# backend/app/utils/pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# ---------------------------------------------------------
+# 📄 KEYSET PAGINATION
+# ---------------------------------------------------------
+# Pages are ordered by (sort_field desc, _id desc). The cursor is the
+# position of the last document served, encoded so clients treat it as opaque.
+
+def encode_cursor(sort_value: datetime, doc_id: ObjectId) -> str:
+    raw = json.dumps({"t": sort_value.isoformat(), "id": str(doc_id)})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Raises ValueError for anything that isn't a cursor we issued."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["t"]), ObjectId(data["id"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError("Invalid pagination cursor") from e
+
+def after_cursor(sort_field: str, cursor: str) -> Dict[str, Any]:
+    """Filter matching documents that come after `cursor` in (sort_field, _id) descending order."""
+    sort_value, doc_id = decode_cursor(cursor)
+    return {"$or": [
+        {sort_field: {"$lt": sort_value}},
+        {sort_field: sort_value, "_id": {"$lt": doc_id}},
+    ]}
@@ -0,0 +1,85 @@
+# backend/app/utils/qkd_executor.py
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+
+class QKDExecutorSaturated(Exception):
+    """Raised when too many QKD simulations are already queued (mapped to HTTP 503)."""
+
+
+class QKDExecutor:
+    """
+    Runs CPU-bound QKD simulations off the asyncio event loop.
+
+    Work is dispatched to a process pool (default) or a thread pool. The number
+    of in-flight + queued jobs is bounded by `max_pending`; once it is reached,
+    new submissions are rejected immediately instead of piling up behind the
+    simulator and stalling unrelated requests. `initializer` runs once in each
+    worker process (app.utils.quantum registers one that reseeds its RNGs).
+    """
+
+    def __init__(self, kind: str = "process", max_workers: int = 2, max_pending: int = 32,
+                 initializer: Optional[Callable[[], None]] = None):
+        if kind not in ("process", "thread"):
+            raise ValueError("QKD executor kind must be 'process' or 'thread'")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.initializer = initializer
+
+        self._pool: Executor = None
+        self._pending = 0
+
+        # Counters
+        self.completed = 0
+        self.rejected = 0
+
+    # --- 1. LIFECYCLE (called from main.lifespan) ---
+    def start(self):
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=self.initializer)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="qkd")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # --- 2. DISPATCH ---
+    async def run(self, fn: Callable, *args) -> Any:
+        """Await `fn(*args)` on the pool, or raise QKDExecutorSaturated if the queue is full."""
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise QKDExecutorSaturated(f"{self._pending} QKD jobs already pending")
+
+        self.start()
+        self._pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self._pending -= 1
+        self.completed += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+# Shared executor used by the QKD helpers
+qkd_executor = QKDExecutor(
+    kind=settings.QKD_EXECUTOR,
+    max_workers=settings.QKD_EXECUTOR_WORKERS,
+    max_pending=settings.QKD_EXECUTOR_MAX_PENDING,
+)
@@ -1,70 +1,414 @@
 # backend/app/utils/quantum.py
 import numpy as np
 import hashlib
-from typing import Dict, Any
+import math
+import os
+import time
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Union
 
 # --- QISKIT IMPORTS (The Real Physics) ---
 from qiskit import QuantumCircuit
 from qiskit_aer import AerSimulator
+from qiskit_aer.noise import NoiseModel, depolarizing_error
 
-class QKDProtocol:
-    def __init__(self, num_bits: int = 128):
-        self.num_bits = num_bits 
+from app.core.config import settings
+from app.utils.qkd_executor import qkd_executor
+
+_rng = np.random.default_rng()
+
+def random_bits(shape) -> np.ndarray:
+    """Uniform 0/1 array from os.urandom, so forked QKD workers never share a bit stream."""
+    count = int(np.prod(shape))
+    packed = np.frombuffer(os.urandom(-(-count // 8)), dtype=np.uint8)
+    return np.unpackbits(packed)[:count].reshape(shape)
+
+def reseed_worker():
+    """
+    Process-pool initializer: a forked worker starts with a copy of the parent's
+    generator states, so every worker would otherwise draw the same numbers.
+    """
+    np.random.seed()
+    _rng.bit_generator.state = np.random.PCG64().state  # In place: functions hold _rng as a default
+    get_engine.cache_clear()
+
+class QKDSecurityError(Exception):
+    """Raised when a QKD session must be aborted (QBER too high, no secret key left, EC failed)."""
+
+# ==========================================
+# 1. QUANTUM CHANNEL MODEL (Noise + Eve)
+# ==========================================
+class ChannelModel:
+    """
+    Depolarizing noise on Bob's side plus an intercept-resend eavesdropper.
+
+    Eve intercepts a fraction of the qubits, measures each in a random basis and
+    resends her result in that basis, so what reaches Bob is her state, not Alice's.
+    """
+
+    def __init__(self, depolarizing_prob: float = 0.0, eve_intercept_rate: float = 0.0):
+        self.depolarizing_prob = depolarizing_prob
+        self.eve_intercept_rate = eve_intercept_rate
+
+    @property
+    def is_ideal(self) -> bool:
+        return self.depolarizing_prob <= 0 and self.eve_intercept_rate <= 0
+
+    def intercept(self, alice_bits: np.ndarray, alice_bases: np.ndarray, rng=_rng):
+        """Returns the (bits, bases) actually sent to Bob after Eve's intercept-resend attack."""
+        if self.eve_intercept_rate <= 0:
+            return alice_bits, alice_bases
+
+        intercepted = rng.random(alice_bits.shape) < self.eve_intercept_rate
+        eve_bases = rng.integers(0, 2, size=alice_bits.shape, dtype=np.uint8)
+        coin_flips = rng.integers(0, 2, size=alice_bits.shape, dtype=np.uint8)
+        eve_bits = np.where(eve_bases == alice_bases, alice_bits, coin_flips)
+
+        sent_bits = np.where(intercepted, eve_bits, alice_bits).astype(np.uint8)
+        sent_bases = np.where(intercepted, eve_bases, alice_bases).astype(np.uint8)
+        return sent_bits, sent_bases
+
+    def aer_noise_model(self) -> Optional[NoiseModel]:
+        if self.depolarizing_prob <= 0:
+            return None
+        noise_model = NoiseModel()
+        noise_model.add_all_qubit_quantum_error(depolarizing_error(self.depolarizing_prob, 1), ["measure"])
+        return noise_model
+
+IDEAL_CHANNEL = ChannelModel()
+
+# ==========================================
+# 2. MEASUREMENT ENGINES
+# ==========================================
+# An engine receives the prepared bits/bases and Bob's bases as (keys, num_bits)
+# arrays and returns Bob's measured bits with the same shape.
+
+class QKDEngine:
+    name = "base"
+
+    def measure(self, alice_bits: np.ndarray, alice_bases: np.ndarray, bob_bases: np.ndarray,
+                channel: ChannelModel = IDEAL_CHANNEL) -> np.ndarray:
+        raise NotImplementedError
+
+
+class AerEngine(QKDEngine):
+    """Runs the BB84 circuit on the Qiskit Aer simulator (the reference engine)."""
+    name = "aer"
+
+    def __init__(self):
         self.simulator = AerSimulator()
 
-    def execute_bb84_protocol(self) -> Dict[str, Any]:
+    def build_circuit(self, alice_bits: np.ndarray, alice_bases: np.ndarray, bob_bases: np.ndarray) -> QuantumCircuit:
+        n = len(alice_bits)
+        qc = QuantumCircuit(n, n)
+
+        # Encode bits, apply Alice's basis, then Bob's measurement basis (Hadamard = Diagonal)
+        encoded = np.flatnonzero(alice_bits).tolist()
+        alice_diagonal = np.flatnonzero(alice_bases).tolist()
+        bob_diagonal = np.flatnonzero(bob_bases).tolist()
+        if encoded:
+            qc.x(encoded)
+        if alice_diagonal:
+            qc.h(alice_diagonal)
+        if bob_diagonal:
+            qc.h(bob_diagonal)
+
+        qc.measure(range(n), range(n))
+        return qc
+
+    def measure(self, alice_bits, alice_bases, bob_bases, channel=IDEAL_CHANNEL):
+        # One circuit per key, all submitted to the simulator in a single run
+        circuits = [
+            self.build_circuit(alice_bits[k], alice_bases[k], bob_bases[k])
+            for k in range(alice_bits.shape[0])
+        ]
+
+        # Run Simulation (Shot noise included!)
+        run_options = {"shots": 1, "memory": True}
+        noise_model = channel.aer_noise_model()
+        if noise_model is not None:
+            run_options["noise_model"] = noise_model
+        result = self.simulator.run(circuits, **run_options).result()
+
+        bob_results = np.empty_like(alice_bits)
+        for k in range(len(circuits)):
+            measured_str = result.get_memory(k)[0]
+            # Reverse because Qiskit is Little Endian
+            bob_results[k] = np.frombuffer(measured_str[::-1].encode(), dtype=np.uint8) - ord("0")
+        return bob_results
+
+
+class NumpyEngine(QKDEngine):
+    """
+    Exact vectorized model of the same circuit: every qubit is independent, so a
+    matching basis yields Alice's bit and a mismatched basis yields a fair coin.
+    """
+    name = "numpy"
+
+    def __init__(self, rng: Optional[np.random.Generator] = None):
+        self.rng = rng or np.random.default_rng()
+
+    def measure(self, alice_bits, alice_bases, bob_bases, channel=IDEAL_CHANNEL):
+        coin_flips = self.rng.integers(0, 2, size=alice_bits.shape, dtype=np.uint8)
+        measured = alice_bases == bob_bases
+        if channel.depolarizing_prob > 0:
+            # Depolarized qubits are maximally mixed: the outcome is a fair coin in any basis
+            measured &= self.rng.random(alice_bits.shape) >= channel.depolarizing_prob
+        return np.where(measured, alice_bits, coin_flips).astype(np.uint8)
+
+
+ENGINES = {
+    AerEngine.name: AerEngine,
+    NumpyEngine.name: NumpyEngine,
+}
+
+@lru_cache(maxsize=None)
+def get_engine(name: str) -> QKDEngine:
+    """Returns a shared engine instance (one per process) for the given name."""
+    if name not in ENGINES:
+        raise ValueError(f"Unknown QKD engine '{name}'. Must be one of {list(ENGINES)}")
+    return ENGINES[name]()
+
+# ==========================================
+# 3. CLASSICAL POST-PROCESSING (vectorized over bit arrays)
+# ==========================================
+def binary_entropy(p: float) -> float:
+    if p <= 0 or p >= 1:
+        return 0.0
+    return -p * math.log2(p) - (1 - p) * math.log2(1 - p)
+
+def estimate_qber(alice_key: np.ndarray, bob_key: np.ndarray, sample_fraction: float, rng=_rng):
+    """
+    Publicly compares a random sample of the sifted key.
+    Returns (qber, keep_mask); sampled bits are disclosed and must be discarded.
+    """
+    n = len(alice_key)
+    sample_size = min(n, max(1, int(round(n * sample_fraction)))) if n else 0
+    sampled = np.zeros(n, dtype=bool)
+    sampled[rng.choice(n, size=sample_size, replace=False)] = True
+
+    qber = float(np.mean(alice_key[sampled] != bob_key[sampled])) if sample_size else 0.0
+    return qber, ~sampled
+
+def _binary_search_errors(alice_blocks: np.ndarray, bob_blocks: np.ndarray):
+    """
+    BINARY step of Cascade, run for all odd-parity blocks at once.
+    Returns (error_positions_within_block, parity_bits_leaked).
+    """
+    num_blocks, block_size = alice_blocks.shape
+    # Prefix parities: parity(lo, hi) = prefix[hi] ^ prefix[lo]
+    alice_prefix = np.zeros((num_blocks, block_size + 1), dtype=np.uint8)
+    bob_prefix = np.zeros((num_blocks, block_size + 1), dtype=np.uint8)
+    np.bitwise_xor.accumulate(alice_blocks, axis=1, out=alice_prefix[:, 1:])
+    np.bitwise_xor.accumulate(bob_blocks, axis=1, out=bob_prefix[:, 1:])
+
+    rows = np.arange(num_blocks)
+    lo = np.zeros(num_blocks, dtype=np.int64)
+    hi = np.full(num_blocks, block_size, dtype=np.int64)
+    leaked = 0
+    while np.any(hi - lo > 1):
+        active = hi - lo > 1
+        mid = (lo + hi) // 2
+        alice_parity = alice_prefix[rows, mid] ^ alice_prefix[rows, lo]
+        bob_parity = bob_prefix[rows, mid] ^ bob_prefix[rows, lo]
+        error_in_left = alice_parity != bob_parity
+
+        hi = np.where(active & error_in_left, mid, hi)
+        lo = np.where(active & ~error_in_left, mid, lo)
+        leaked += int(active.sum())
+    return lo, leaked
+
+def cascade_correct(alice_key: np.ndarray, bob_key: np.ndarray, qber: float,
+                    max_passes: int = 16, rng=_rng):
+    """
+    Cascade-style error correction: block parities over a fresh random permutation
+    each pass, each odd-parity block fixed by a vectorized binary search. Without
+    Cascade's backtracking the block size stays at 0.73/QBER so leftover error pairs
+    get split up by the next permutation instead of merged into larger blocks.
+    Stops once the keys agree (verification). Returns (corrected_bob_key, leaked_bits).
+    """
+    n = len(bob_key)
+    bob_key = bob_key.copy()
+    if n == 0:
+        return bob_key, 0
+
+    # Keep at least ~8 blocks so a zero-error sample on a short key still splits it up
+    block_size = max(4, min(int(0.73 / max(qber, 1e-3)), n // 8))
+    leaked = 0
+    for pass_num in range(max_passes):
+        perm = np.arange(n) if pass_num == 0 else rng.permutation(n)
+        k = min(block_size, n)
+        num_blocks = -(-n // k)
+        padded = num_blocks * k
+
+        alice_blocks = np.zeros(padded, dtype=np.uint8)
+        bob_blocks = np.zeros(padded, dtype=np.uint8)
+        alice_blocks[:n] = alice_key[perm]
+        bob_blocks[:n] = bob_key[perm]
+        alice_blocks = alice_blocks.reshape(num_blocks, k)
+        bob_blocks = bob_blocks.reshape(num_blocks, k)
+
+        # Compare block parities (each disclosed parity leaks one bit)
+        odd_blocks = np.flatnonzero(
+            np.bitwise_xor.reduce(alice_blocks, axis=1) != np.bitwise_xor.reduce(bob_blocks, axis=1)
+        )
+        leaked += num_blocks
+
+        if len(odd_blocks):
+            offsets, search_leak = _binary_search_errors(alice_blocks[odd_blocks], bob_blocks[odd_blocks])
+            leaked += search_leak
+            flip_positions = perm[odd_blocks * k + offsets]
+            bob_key[flip_positions] ^= 1
+
+        # Verification stands in for a public hash comparison of both keys
+        if np.array_equal(alice_key, bob_key):
+            return bob_key, leaked
+
+    raise QKDSecurityError("Error correction did not converge")
+
+def privacy_amplification(key_bits: np.ndarray, output_length: int, rng=_rng) -> np.ndarray:
+    """
+    Toeplitz hashing: y = T @ x (mod 2) with T defined by n + m - 1 random seed bits.
+    The matrix-vector product is a convolution, computed with an FFT in O(n log n).
+    """
+    n = len(key_bits)
+    if output_length <= 0 or n == 0:
+        return np.zeros(0, dtype=np.uint8)
+
+    seed = rng.integers(0, 2, size=n + output_length - 1, dtype=np.uint8)
+    conv_length = len(seed) + n - 1
+    fft_size = 1 << (conv_length - 1).bit_length()
+    product = np.fft.irfft(
+        np.fft.rfft(seed.astype(np.float64), fft_size) * np.fft.rfft(key_bits.astype(np.float64), fft_size),
+        fft_size,
+    )
+    # T[i, j] = seed[i - j + n - 1]  =>  y_i = (seed * x)[i + n - 1]
+    window = product[n - 1 : n - 1 + output_length]
+    return (np.rint(window).astype(np.int64) & 1).astype(np.uint8)
+
+# ==========================================
+# 4. BB84 PROTOCOL
+# ==========================================
+class QKDProtocol:
+    def __init__(self, num_bits: int = 128, engine: Optional[Union[str, QKDEngine]] = None,
+                 channel: Optional[ChannelModel] = None, postprocess: Optional[bool] = None):
+        self.num_bits = num_bits
+        if engine is None:
+            engine = settings.QKD_ENGINE
+        self.engine = get_engine(engine) if isinstance(engine, str) else engine
+
+        if channel is None:
+            channel = ChannelModel(
+                depolarizing_prob=settings.QKD_DEPOLARIZING_PROB,
+                eve_intercept_rate=settings.QKD_EVE_INTERCEPT_RATE,
+            )
+        self.channel = channel
+        self.postprocess = settings.QKD_POSTPROCESS if postprocess is None else postprocess
+
+    def _run_rounds(self, count: int):
         n = self.num_bits
-        
-        # 1. Alice's Random Bits & Bases (0=Rectilinear, 1=Diagonal)
-        alice_bits = np.random.randint(2, size=n)
-        alice_bases = np.random.randint(2, size=n)
-        
+
+        # 1. Alice's Random Bits & Bases (0=Rectilinear, 1=Diagonal), from the OS CSPRNG
+        alice_bits = random_bits((count, n))
+        alice_bases = random_bits((count, n))
+
         # 2. Bob's Random Bases
-        bob_bases = np.random.randint(2, size=n)
+        bob_bases = random_bits((count, n))
+
+        # 3. Quantum Channel (Eve may intercept and resend)
+        sent_bits, sent_bases = self.channel.intercept(alice_bits, alice_bases)
+
+        # 4. Bob Measures (engine-specific, with channel noise)
+        bob_results = self.engine.measure(sent_bits, sent_bases, bob_bases, self.channel)
+        return alice_bits, alice_bases == bob_bases, bob_results
+
+    def _derive_key(self, key_bits: np.ndarray) -> Dict[str, Any]:
+        # Key string is the final bits as '0'/'1' characters
+        key_string = (key_bits + ord("0")).astype(np.uint8).tobytes()
 
-        # 3. Build Quantum Circuit
-        qc = QuantumCircuit(n, n)
-        for i in range(n):
-            # Encode bit
-            if alice_bits[i] == 1: 
-                qc.x(i) 
-            # Apply Basis (Hadamard Gate)
-            if alice_bases[i] == 1: 
-                qc.h(i)
-            
-            # Bob Measures (Apply Hadamard if his basis is Diagonal)
-            if bob_bases[i] == 1: 
-                qc.h(i)
-            
-            qc.measure(i, i)
-
-        # 4. Run Simulation (Shot noise included!)
-        job = self.simulator.run(qc, shots=1, memory=True)
-        measured_str = job.result().get_memory()[0] 
-        # Reverse because Qiskit is Little Endian
-        bob_results = [int(bit) for bit in measured_str[::-1]]
-
-        # 5. Sifting (The "Handshake")
-        sifted_key = []
-        for i in range(n):
-            if alice_bases[i] == bob_bases[i]:
-                sifted_key.append(bob_results[i])
-
-        # 6. Final Key Generation
-        key_string = "".join(map(str, sifted_key))
-        
         # Hash it for AES-256 compatibility
-        final_key_hash = hashlib.sha256(key_string.encode()).hexdigest()
-        shared_key_bytes = hashlib.sha256(key_string.encode()).digest()
+        digest = hashlib.sha256(key_string)
 
         return {
-            "shared_key": shared_key_bytes,
-            "final_key_hash": final_key_hash,
-            "raw_bits_length": n,
-            "sifted_bits_count": len(sifted_key)
+            "shared_key": digest.digest(),
+            "final_key_hash": digest.hexdigest(),
+            "raw_bits_length": self.num_bits,
+        }
+
+    def _postprocess_key(self, alice_sifted: np.ndarray, bob_sifted: np.ndarray) -> Dict[str, Any]:
+        # 1. QBER estimation on a disclosed sample
+        qber, keep = estimate_qber(alice_sifted, bob_sifted, settings.QKD_QBER_SAMPLE_FRACTION)
+        if qber > settings.QKD_QBER_THRESHOLD:
+            raise QKDSecurityError(f"QBER {qber:.2%} exceeds threshold {settings.QKD_QBER_THRESHOLD:.2%}")
+        alice_key, bob_key = alice_sifted[keep], bob_sifted[keep]
+
+        # 2. Error correction (Bob reconciles to Alice's key)
+        bob_key, leaked = cascade_correct(alice_key, bob_key, qber)
+
+        # 3. Privacy amplification: remove Eve's information and the EC leakage
+        n = len(bob_key)
+        secret_length = int(n * (1 - binary_entropy(qber))) - leaked - settings.QKD_PA_SECURITY_BITS
+        if secret_length <= 0:
+            raise QKDSecurityError("No secret key left after privacy amplification")
+        secret_key = privacy_amplification(bob_key, secret_length)
+
+        result = self._derive_key(secret_key)
+        result.update({
+            "qber": round(qber, 5),
+            "error_correction_leak": leaked,
+            "secret_bits_count": secret_length,
+        })
+        return result
+
+    def generate_keys(self, count: int) -> List[Dict[str, Any]]:
+        """Runs `count` independent BB84 exchanges in one engine call (one simulator run for Aer)."""
+        if count <= 0:
+            return []
+        started = time.perf_counter()
+        alice_bits, matching_bases, bob_results = self._run_rounds(count)
+
+        keys = []
+        for k in range(count):
+            # Sifting (The "Handshake"): keep only positions where the bases agree
+            bob_sifted = bob_results[k][matching_bases[k]]
+            if self.postprocess:
+                key = self._postprocess_key(alice_bits[k][matching_bases[k]], bob_sifted)
+            else:
+                key = self._derive_key(bob_sifted)
+                key["secret_bits_count"] = len(bob_sifted)
+            key["sifted_bits_count"] = len(bob_sifted)
+            keys.append(key)
+
+        # Throughput is measured over the whole batch and reported on every key
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        throughput = {
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "raw_bits_per_sec": round(count * self.num_bits / elapsed, 1),
+            "secret_bits_per_sec": round(sum(key["secret_bits_count"] for key in keys) / elapsed, 1),
         }
+        for key in keys:
+            key["throughput"] = throughput
+        return keys
+
+    def execute_bb84_protocol(self) -> Dict[str, Any]:
+        return self.generate_keys(1)[0]
 
 # This is the function your API calls
 def simulate_qkd_exchange():
-    qkd = QKDProtocol(num_bits=128)
-    return qkd.execute_bb84_protocol()
\ No newline at end of file
+    qkd = QKDProtocol(num_bits=settings.QKD_NUM_BITS)
+    return qkd.execute_bb84_protocol()
+
+# Batch version: one simulation producing `count` independent keys
+def simulate_qkd_batch(count: int) -> List[Dict[str, Any]]:
+    qkd = QKDProtocol(num_bits=settings.QKD_NUM_BITS)
+    return qkd.generate_keys(count)
+
+# Awaitable versions: run on the QKD executor instead of the event loop
+async def simulate_qkd_exchange_async() -> Dict[str, Any]:
+    return await qkd_executor.run(simulate_qkd_exchange)
+
+async def simulate_qkd_batch_async(count: int) -> List[Dict[str, Any]]:
+    return await qkd_executor.run(simulate_qkd_batch, count)
+
+# Reseed each worker process as the pool starts it
+qkd_executor.initializer = reseed_worker
@@ -0,0 +1,69 @@
+# backend/app/utils/search.py
+import re
+from typing import Any, Dict, List, Optional
+
+# ---------------------------------------------------------
+# 🔎 PATIENT SEARCH FIELDS
+# ---------------------------------------------------------
+# Records carry normalized copies of the patient's identifiers, written at insert
+# (and backfilled by app.db.migrations). Searches then become equality or anchored
+# prefix matches on indexed fields instead of case-insensitive regex scans.
+
+_backfilled = False     # Set once this process has seen the backfill finish
+
+def mark_backfilled():
+    global _backfilled
+    _backfilled = True
+
+def normalize_abha(abha: Optional[str]) -> Optional[str]:
+    """ABHA numbers without dashes/spaces, the form users.abha_number is stored in."""
+    return abha.replace("-", "").replace(" ", "") if abha else abha
+
+def normalize_text(value: Optional[str]) -> Optional[str]:
+    return " ".join(value.lower().split()) if value else None
+
+def name_terms(name: Optional[str]) -> List[str]:
+    """The name from each word onwards, so a prefix search finds surnames too ("ann lee" -> ["ann lee", "lee"])."""
+    words = (normalize_text(name) or "").split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+def search_fields(patient_email: Optional[str], patient_name: Optional[str]) -> Dict[str, Any]:
+    return {
+        "patient_email_lc": normalize_text(patient_email),
+        "patient_name_terms": name_terms(patient_name),    # Multikey index
+    }
+
+def prefix_match(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Anchored, case-sensitive regex on an already-lowercased field: MongoDB turns
+    it into an index range scan. None for input that normalizes to nothing.
+    """
+    needle = normalize_text(text)
+    if not needle:
+        return None
+    return {"$regex": f"^{re.escape(needle)}"}
+
+# ---------------------------------------------------------
+# ⏳ QUERIES (tolerate records the backfill has not reached yet)
+# ---------------------------------------------------------
+def abha_match(abha: str) -> Any:
+    """Normalized equality; until the backfill is done, older records may still hold the ABHA as typed."""
+    normalized = normalize_abha(abha)
+    if _backfilled or normalized == abha:
+        return normalized
+    return {"$in": [normalized, abha]}
+
+def prefix_clause(field: str, text: Optional[str], legacy_field: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Prefix search on a normalized field. Until the backfill is done, records missing
+    the field are matched on `legacy_field` with a case-insensitive regex instead.
+    """
+    match = prefix_match(text) if text else None
+    if match is None:
+        return None
+    if _backfilled or legacy_field is None:
+        return {field: match}
+    return {"$or": [
+        {field: match},
+        {field: {"$exists": False}, legacy_field: {**match, "$options": "i"}},
+    ]}
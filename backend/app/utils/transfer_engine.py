@@ -0,0 +1,397 @@
+# backend/app/utils/transfer_engine.py
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.core.config import settings
+from app.db.mongodb import supports_transactions
+from app.utils.audit import audit_sink
+from app.utils.encryption import encrypt_many, decrypt_many
+from app.utils.hospital_directory import hospital_directory
+from app.utils.inbox_hub import inbox_hub
+from app.utils.key_pool import key_pool
+from app.utils.keystore import keystore
+from app.utils.search import normalize_abha, search_fields
+
+logger = logging.getLogger(__name__)
+
+# All hospitals share one inbox collection, partitioned by target_key
+INBOX_COLLECTION = "transfer_inbox"
+DUPLICATE_KEY = 11000
+
+def inbox_key(hospital_name: str) -> str:
+    """Normalized hospital name used as the inbox partition key."""
+    return hospital_name.lower().strip().replace(" ", "_")
+
+def _failed_indexes(error: BulkWriteError) -> Dict[int, dict]:
+    return {e["index"]: e for e in error.details.get("writeErrors", [])}
+
+# ==========================================
+# BATCH TRANSFER ENGINE
+# ==========================================
+async def transfer_records(db, record_ids: List[str], sender_name: str, target_hospital_name: str) -> Dict[str, list]:
+    """
+    Sends records to another hospital's inbox in a fixed number of round-trips:
+    one $in fetch, one $in duplicate check, one bulk upsert for the inbox packets,
+    then the audit log. Records already in the inbox are skipped before any key is
+    drawn; a concurrent duplicate is still rejected atomically by the inbox's unique
+    (target_key, original_record_id, data_signature) index. Envelope records only have their data key re-wrapped for the target; legacy
+    records are decrypted and re-encrypted under a fresh key with bulk crypto on worker
+    threads. Returns the success/skipped/failed summary, plus "audit_error" if the
+    audit entries for delivered records could not be written.
+    """
+    summary = {"success": [], "skipped": [], "failed": []}
+    target_key = inbox_key(target_hospital_name)
+
+    # Never mint a KEK (or fill an inbox) for a hospital nobody is registered at
+    if not await hospital_directory.has_hospital(db, target_hospital_name):
+        summary["failed"].extend({"id": rid, "reason": "Unknown Target Hospital"} for rid in record_ids)
+        return summary
+
+    # A. Parse IDs (order of record_ids is kept for the summary)
+    candidates = []
+    for rid in record_ids:
+        try:
+            candidates.append((rid, ObjectId(rid)))
+        except (InvalidId, TypeError) as e:
+            summary["failed"].append({"id": rid, "reason": str(e)})
+
+    # B. Fetch all Source Records in one query
+    object_ids = list({oid for _, oid in candidates})
+    records = {}
+    if object_ids:
+        async for record in db["records"].find({"_id": {"$in": object_ids}}):
+            records[record["_id"]] = record
+
+    found = []
+    for rid, oid in candidates:
+        if oid not in records:
+            summary["failed"].append({"id": rid, "reason": "Not Found"})
+        else:
+            found.append((rid, records[oid]))
+
+    # C. 🗝️ ENVELOPE RECORDS: no decryption, the data key is re-wrapped for the target
+    target_kek_id = await keystore.active_kek_id(db, target_hospital_name)
+    await keystore.ensure_loaded(db, [record.get("kek_id") for _, record in found])
+
+    signed, legacy = [], []
+    for rid, record in found:
+        if record.get("wrapped_key") is None:
+            legacy.append((rid, record))
+            continue
+        try:
+            wrapped_key = keystore.wrap(target_kek_id, keystore.data_key(record))
+        except Exception as e:
+            print(f"❌ Key Unwrap Failed for {rid}: {e!r}")
+            summary["failed"].append({"id": rid, "reason": "Source Key Unavailable"})
+            continue
+        # Ciphertexts don't change when a record moves, so they identify its content
+        ciphertext = record["diagnosis"]
+        raw_data = f"{record.get('patient_id')}-".encode() + (ciphertext.encode() if isinstance(ciphertext, str) else bytes(ciphertext))
+        data_signature = hashlib.sha256(raw_data).hexdigest()
+        signed.append((rid, record, data_signature, (record["diagnosis"], record.get("prescription"), wrapped_key)))
+
+    # D. 🔓 LEGACY RECORDS (plain quantum_key): decrypt locally before sending
+    # We must unlock the data locally so we don't send "Double Encrypted" garbage
+    locked = []
+    for _, record in legacy:
+        if "quantum_key" in record:
+            locked += [(record.get("diagnosis"), record["quantum_key"]),
+                       (record.get("prescription"), record["quantum_key"])]
+    plaintexts = iter(await asyncio.to_thread(decrypt_many, locked, True))
+
+    for rid, record in legacy:
+        if "quantum_key" in record:
+            plain_diagnosis, plain_prescription = next(plaintexts), next(plaintexts)
+        else:
+            plain_diagnosis, plain_prescription = record.get("diagnosis"), record.get("prescription")
+        if isinstance(plain_diagnosis, Exception) or plain_diagnosis is None:
+            print(f"❌ Source Decryption Failed for {rid}: {plain_diagnosis!r}")
+            summary["failed"].append({"id": rid, "reason": "Source Data Corrupt"})
+            continue
+        if isinstance(plain_prescription, Exception):
+            # Older accepted transfers kept the sender's prescription ciphertext; pass it on as-is
+            plain_prescription = None
+        raw_data_string = f"{record.get('patient_id')}-{plain_diagnosis}"
+        data_signature = hashlib.sha256(raw_data_string.encode()).hexdigest()
+        signed.append((rid, record, data_signature, (plain_diagnosis, plain_prescription)))
+
+    # E. Drop repeats: one $in lookup for earlier batches (the upsert still guards against races),
+    # plus repeats within this batch
+    already_sent = set()
+    if signed:
+        async for packet in db[INBOX_COLLECTION].find(
+            {"target_key": target_key, "original_record_id": {"$in": list({rid for rid, *_ in signed})}},
+            {"_id": 0, "original_record_id": 1, "data_signature": 1}
+        ):
+            already_sent.add((packet["original_record_id"], packet["data_signature"]))
+    # Request order is kept for the summary
+    order = {rid: index for index, (rid, _) in reversed(list(enumerate(candidates)))}
+    to_send = []
+    for rid, record, data_signature, payload in sorted(signed, key=lambda item: order[item[0]]):
+        if (rid, data_signature) in already_sent:
+            summary["skipped"].append(rid)
+            continue
+        already_sent.add((rid, data_signature))
+        to_send.append([rid, record, data_signature, payload])
+
+    # F. ⚛️ RE-ENCRYPT LEGACY RECORDS under fresh QKD data keys (fetched up front)
+    opened = [item for item in to_send if item[1].get("wrapped_key") is None]
+    if opened:
+        transmission_keys = await key_pool.acquire_keys(len(opened))
+        ciphertexts = iter(await asyncio.to_thread(encrypt_many, [
+            (plain, key) for item, key in zip(opened, transmission_keys) for plain in item[3] if plain is not None
+        ], True))
+        for item, key in zip(opened, transmission_keys):
+            secure_diagnosis = next(ciphertexts)
+            secure_prescription = item[1].get("prescription") if item[3][1] is None else next(ciphertexts)
+            error = next((c for c in (secure_diagnosis, secure_prescription) if isinstance(c, Exception)), None)
+            item[3] = error or (secure_diagnosis, secure_prescription, keystore.wrap(target_kek_id, key))
+
+    # G. Build Inbox Packets
+    packets, packet_rids = [], []
+    for rid, record, data_signature, payload in to_send:
+        if isinstance(payload, Exception):
+            summary["failed"].append({"id": rid, "reason": str(payload)})
+            continue
+        secure_diagnosis, secure_prescription, wrapped_key = payload
+        packets.append({
+            "target_key": target_key,
+            "original_record_id": rid,
+            "sender_hospital": sender_name,
+            "target_hospital": target_hospital_name,
+            "patient_id": record.get("patient_id"),
+            "patient_email": record.get("patient_email"),
+            "patient_abha": record.get("patient_abha"),
+            "encrypted_diagnosis": secure_diagnosis,
+            "prescription": secure_prescription,
+            "wrapped_key": wrapped_key,     # ✅ Data key wrapped for the target hospital only
+            "kek_id": target_kek_id,
+            "data_signature": data_signature,
+            "received_at": datetime.now(),
+            "status": "LOCKED"
+        })
+        packet_rids.append(rid)
+
+    # H. Send to Inbox: insert-if-absent per (target, record, signature), unordered
+    write_errors, inserted, upserted_ids = {}, set(), {}
+    if packets:
+        upserts = [UpdateOne(
+            {key: packet[key] for key in ("target_key", "original_record_id", "data_signature")},
+            {"$setOnInsert": packet},
+            upsert=True
+        ) for packet in packets]
+        try:
+            result = await db[INBOX_COLLECTION].bulk_write(upserts, ordered=False)
+            upserted_ids = result.upserted_ids
+        except BulkWriteError as e:
+            write_errors = _failed_indexes(e)
+            upserted_ids = {upsert["index"]: upsert["_id"] for upsert in e.details.get("upserted", [])}
+        inserted = set(upserted_ids)
+
+    delivered = []
+    for index, rid in enumerate(packet_rids):
+        error = write_errors.get(index)
+        if index in inserted:
+            delivered.append(rid)
+            packets[index]["_id"] = upserted_ids[index]
+        elif error is None or error.get("code") == DUPLICATE_KEY:
+            # Matched an existing packet (or lost an insert race to one): already sent
+            summary["skipped"].append(rid)
+        else:
+            logger.error(f"Error processing {rid}: {error.get('errmsg')}")
+            summary["failed"].append({"id": rid, "reason": error.get("errmsg", "Write Failed")})
+
+    # I. Audit Log (buffered; the sink also keeps the hourly/daily rollups)
+    if delivered:
+        now = datetime.now()
+        entries = [{
+            "sender_hospital": sender_name,
+            "receiver_hospital": target_hospital_name,
+            "record_id": rid,
+            "qkd_key_id": target_kek_id,    # KEK the transferred data key is wrapped under
+            "status": "SECURE TRANSFER",
+            "timestamp": now
+        } for rid in delivered]
+        try:
+            await audit_sink.emit(db, entries)
+        except PyMongoError as e:
+            # The packets are already in the inbox: report the gap instead of failing the transfer
+            logger.error(f"Audit write failed for {len(entries)} delivered transfer(s): {e}")
+            summary["audit_error"] = str(e)
+    summary["success"].extend(delivered)
+
+    # J. 📡 Push the new packets to the target's open inboxes
+    inbox_hub.publish_added(packets[index] for index in sorted(inserted))
+
+    return summary
+
+# ==========================================
+# BATCH ACCEPT ENGINE
+# ==========================================
+async def packet_patients(db, packets: List[dict]) -> Dict[str, dict]:
+    """
+    The packets' patients by patient_id, in one $in. Names never travel in the inbox;
+    the receiving side looks them up to build the record's search fields.
+    """
+    patient_ids = list({ObjectId(packet["patient_id"]) for packet in packets
+                        if ObjectId.is_valid(str(packet.get("patient_id") or ""))})
+    if not patient_ids:
+        return {}
+    return {str(user["_id"]): user async for user in db["users"].find(
+        {"_id": {"$in": patient_ids}}, {"email": 1, "full_name": 1}
+    )}
+
+def accepted_record(packet: dict, current_user: dict, hospital: str, patient: Optional[dict] = None) -> dict:
+    """The receiving hospital's copy of an inbox packet, minus the diagnosis/key fields."""
+    patient = patient or {}
+    return {
+        "doctor_id": str(current_user["_id"]),
+        "doctor_name": current_user["full_name"],
+        "hospital": hospital,
+        "patient_id": packet.get("patient_id"),
+        "patient_email": packet.get("patient_email"),
+        "patient_abha": normalize_abha(packet.get("patient_abha")),
+        "patient_name": patient.get("full_name"),
+        **search_fields(patient.get("email") or packet.get("patient_email"), patient.get("full_name")),
+        "created_at": datetime.now(),
+        "transfer_origin": packet.get("sender_hospital")
+    }
+
+async def _move_to_records(db, new_records: List[dict], target_key: str) -> Dict[str, str]:
+    """
+    Inserts the records and deletes their packets. Each record reuses its packet's _id,
+    so a retry after a partial move hits a duplicate key instead of creating a copy.
+    Returns {packet_id: error} for packets that were not moved.
+    """
+    if await supports_transactions(db):
+        packet_ids = [rec["_id"] for rec in new_records]
+        try:
+            async with await db.client.start_session() as session:
+                async with session.start_transaction():
+                    await db["records"].insert_many(new_records, session=session)
+                    await db[INBOX_COLLECTION].delete_many(
+                        {"_id": {"$in": packet_ids}, "target_key": target_key}, session=session
+                    )
+            return {}
+        except PyMongoError as e:
+            # e.g. a concurrent accept of the same packets (duplicate key / write conflict).
+            # The transaction rolled back, so sort it out packet by packet below.
+            print(f"⚠️ Transactional accept aborted, retrying unordered: {e}")
+
+    return await _move_unordered(db, new_records, target_key)
+
+async def _move_unordered(db, new_records: List[dict], target_key: str) -> Dict[str, str]:
+    """Standalone path: insert unordered, then delete whatever is now in records."""
+    packet_ids = [rec["_id"] for rec in new_records]
+    errors = {}
+    try:
+        await db["records"].insert_many(new_records, ordered=False)
+    except BulkWriteError as e:
+        for index, error in _failed_indexes(e).items():
+            if error.get("code") != DUPLICATE_KEY:  # duplicate = already moved (earlier attempt or concurrent accept)
+                errors[str(packet_ids[index])] = error.get("errmsg", "Write Failed")
+    except PyMongoError as e:
+        print(f"❌ Accept insert failed: {e}")
+        return {str(oid): "Write Failed" for oid in packet_ids}
+
+    moved = [oid for oid in packet_ids if str(oid) not in errors]
+    if moved:
+        try:
+            await db[INBOX_COLLECTION].delete_many({"_id": {"$in": moved}, "target_key": target_key})
+        except PyMongoError as e:
+            # Records are saved; the leftover packets are caught as duplicates on the next accept
+            print(f"⚠️ Could not clear accepted packets from the inbox: {e}")
+    return errors
+
+async def accept_packets(db, packets: List[dict], current_user: dict, hospital: str) -> Dict[str, list]:
+    """
+    Moves inbox packets into the receiving hospital's records.
+    Envelope packets are stored as they arrived (their data key is already wrapped for
+    this hospital); legacy packets are decrypted and re-encrypted under fresh QKD keys
+    with bulk crypto on worker threads. Returns the success/failed summary.
+    """
+    summary = {"success": [], "failed": []}
+    target_key = inbox_key(hospital)
+    new_records = []
+
+    patients = await packet_patients(db, packets)
+
+    # A. 🗝️ ENVELOPE PACKETS: no crypto
+    await keystore.ensure_loaded(db, [packet.get("kek_id") for packet in packets])
+    legacy = []
+    for packet in packets:
+        if packet.get("wrapped_key") is None:
+            legacy.append(packet)
+            continue
+        try:
+            data_key = keystore.data_key(packet)
+        except Exception as e:
+            print(f"❌ Key Unwrap Failed for {packet['_id']}: {e!r}")
+            summary["failed"].append({"id": str(packet["_id"]), "reason": "Transfer key could not be unwrapped"})
+            continue
+        record = accepted_record(packet, current_user, hospital, patients.get(str(packet.get("patient_id"))))
+        record.update({
+            "_id": packet["_id"],
+            "diagnosis": packet["encrypted_diagnosis"],
+            "prescription": packet.get("prescription"),
+        })
+        if settings.ENVELOPE_ENCRYPTION:
+            record.update({"wrapped_key": packet["wrapped_key"], "kek_id": packet["kek_id"]})
+        else:
+            record["quantum_key"] = data_key
+        new_records.append(record)
+
+    # B. 🔓 LEGACY PACKETS: decrypt with the plain transmission key, re-encrypt for storage
+    if legacy:
+        plaintexts = await asyncio.to_thread(
+            decrypt_many, [(p.get("encrypted_diagnosis"), p.get("decryption_key")) for p in legacy], True
+        )
+        opened = []
+        for packet, plain in zip(legacy, plaintexts):
+            if isinstance(plain, Exception):
+                print(f"❌ Decryption Failed for {packet['_id']}: {plain!r}")
+                summary["failed"].append({"id": str(packet["_id"]), "reason": "Decryption Failed"})
+            else:
+                opened.append((packet, plain))
+
+        local_keys = await key_pool.acquire_keys(len(opened)) if opened else []
+        ciphertexts = await asyncio.to_thread(
+            encrypt_many, [(plain, key) for (_, plain), key in zip(opened, local_keys)], True
+        )
+        kek_id = await keystore.active_kek_id(db, hospital) if settings.ENVELOPE_ENCRYPTION and opened else None
+        for (packet, _), key, ciphertext in zip(opened, local_keys, ciphertexts):
+            if isinstance(ciphertext, Exception):
+                summary["failed"].append({"id": str(packet["_id"]), "reason": str(ciphertext)})
+                continue
+            record = accepted_record(packet, current_user, hospital, patients.get(str(packet.get("patient_id"))))
+            record.update({
+                "_id": packet["_id"],
+                "diagnosis": ciphertext,
+                "prescription": packet.get("prescription"),
+            })
+            if kek_id:
+                record.update({"wrapped_key": keystore.wrap(kek_id, key), "kek_id": kek_id})
+            else:
+                record["quantum_key"] = key
+            new_records.append(record)
+
+    # C. MOVE (transaction when the server supports it)
+    if new_records:
+        errors = await _move_to_records(db, new_records, target_key)
+        for record in new_records:
+            packet_id = str(record["_id"])
+            if packet_id in errors:
+                summary["failed"].append({"id": packet_id, "reason": errors[packet_id]})
+            else:
+                summary["success"].append(packet_id)
+        inbox_hub.publish_removed(target_key, summary["success"])
+
+    return summary
@@ -0,0 +1,195 @@
+# backend/app/utils/transfer_jobs.py
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+from app.core.config import settings
+from app.utils.qkd_executor import QKDExecutorSaturated
+from app.utils.transfer_engine import transfer_records
+
+ACTIVE_STATUSES = ["queued", "running"]
+RESULTS_COLLECTION = "transfer_job_results"
+OUTCOMES = ("success", "skipped", "failed")
+
+
+class TransferJobManager:
+    """
+    Runs large batch transfers in the background.
+
+    Job state lives in the `transfer_jobs` collection and is updated after every
+    chunk, so a restarted app picks incomplete jobs up from the last finished
+    chunk. Chunks re-sent after a crash are caught by the engine's duplicate check.
+
+    The job document only keeps per-outcome counts and the first `failure_sample`
+    failures; each chunk's per-record outcomes go to `transfer_job_results`.
+    """
+
+    def __init__(self, chunk_size: int = 200, max_workers: int = 2, failure_sample: int = 50):
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.failure_sample = failure_sample
+        self._slots = asyncio.Semaphore(max_workers)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    # --- 1. SUBMIT ---
+    async def submit(self, db, record_ids: List[str], sender_name: str,
+                     target_hospital_name: str, submitted_by: str) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        job = {
+            "status": "queued",
+            "record_ids": record_ids,
+            "sender_hospital": sender_name,
+            "target_hospital": target_hospital_name,
+            "submitted_by": submitted_by,
+            "total": len(record_ids),
+            "processed": 0,
+            "counts": {outcome: 0 for outcome in OUTCOMES},
+            "failed_sample": [],
+            "audit_errors": 0,
+            "error": None,
+            "created_at": now,
+            "started_at": None,
+            "updated_at": now,
+            "finished_at": None,
+        }
+        result = await db["transfer_jobs"].insert_one(job)
+        self._spawn(db, result.inserted_id)
+        return {"job_id": str(result.inserted_id), "status": "queued", "total": job["total"]}
+
+    def _spawn(self, db, job_id: ObjectId):
+        key = str(job_id)
+        if key in self._tasks:
+            return
+        task = asyncio.create_task(self._run(db, job_id))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+
+    # --- 2. WORKER ---
+    async def _run(self, db, job_id: ObjectId):
+        async with self._slots:
+            job = await db["transfer_jobs"].find_one({"_id": job_id})
+            if not job or job["status"] not in ACTIVE_STATUSES:
+                return
+
+            now = datetime.utcnow()
+            await db["transfer_jobs"].update_one({"_id": job_id}, {"$set": {
+                "status": "running",
+                "started_at": job["started_at"] or now,
+                "updated_at": now,
+            }})
+
+            offset = job["processed"]
+            try:
+                while offset < job["total"]:
+                    chunk = job["record_ids"][offset:offset + self.chunk_size]
+                    try:
+                        summary = await transfer_records(db, chunk, job["sender_hospital"], job["target_hospital"])
+                    except QKDExecutorSaturated:
+                        # QKD is busy with interactive requests; retry this chunk shortly
+                        await asyncio.sleep(1)
+                        continue
+
+                    # Results first: a crash before the job update re-runs the chunk and overwrites them
+                    await db[RESULTS_COLLECTION].update_one(
+                        {"job_id": job_id, "offset": offset},
+                        {"$set": {outcome: summary[outcome] for outcome in OUTCOMES}},
+                        upsert=True
+                    )
+                    offset += len(chunk)
+                    await db["transfer_jobs"].update_one({"_id": job_id}, {
+                        "$inc": {
+                            **{f"counts.{outcome}": len(summary[outcome]) for outcome in OUTCOMES},
+                            "audit_errors": 1 if summary.get("audit_error") else 0,
+                        },
+                        "$push": {"failed_sample": {"$each": summary["failed"], "$slice": self.failure_sample}},
+                        "$set": {"processed": offset, "updated_at": datetime.utcnow()},
+                    })
+
+                now = datetime.utcnow()
+                await db["transfer_jobs"].update_one({"_id": job_id}, {"$set": {
+                    "status": "completed", "updated_at": now, "finished_at": now
+                }})
+            except asyncio.CancelledError:
+                # App shutting down: leave the job "running" so it resumes on the next start
+                raise
+            except Exception as e:
+                print(f"❌ Transfer job {job_id} failed: {e}")
+                now = datetime.utcnow()
+                await db["transfer_jobs"].update_one({"_id": job_id}, {"$set": {
+                    "status": "failed", "error": str(e), "updated_at": now, "finished_at": now
+                }})
+
+    # --- 3. LIFECYCLE (called from main.lifespan) ---
+    async def resume_incomplete(self, db) -> int:
+        resumed = 0
+        async for job in db["transfer_jobs"].find({"status": {"$in": ACTIVE_STATUSES}}, {"_id": 1}):
+            self._spawn(db, job["_id"])
+            resumed += 1
+        if resumed:
+            print(f"🔁 Resuming {resumed} transfer job(s)")
+        return resumed
+
+    async def shutdown(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self._tasks),
+            "max_workers": self.max_workers,
+            "chunk_size": self.chunk_size,
+        }
+
+    # --- 4. RESULTS ---
+    async def results(self, db, job_id: ObjectId, after: int = -1, limit: int = 10) -> Dict[str, Any]:
+        """Per-record outcomes for up to `limit` chunks starting after offset `after`."""
+        chunks = await db[RESULTS_COLLECTION].find(
+            {"job_id": job_id, "offset": {"$gt": after}}, {"_id": 0}
+        ).sort("offset", 1).limit(limit).to_list(limit)
+        return {
+            **{outcome: [item for chunk in chunks for item in chunk.get(outcome, [])] for outcome in OUTCOMES},
+            "next_after": chunks[-1]["offset"] if len(chunks) == limit else None,
+        }
+
+
+def job_progress(job: dict) -> Dict[str, Any]:
+    """Formats a transfer_jobs document for the progress endpoint."""
+    total, processed = job["total"], job["processed"]
+
+    throughput: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    if job.get("started_at") and processed:
+        elapsed = ((job.get("finished_at") or datetime.utcnow()) - job["started_at"]).total_seconds()
+        if elapsed > 0:
+            throughput = round(processed / elapsed, 2)
+            eta_seconds = round((total - processed) / throughput, 1)
+
+    return {
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "target_hospital": job["target_hospital"],
+        "total": total,
+        "processed": processed,
+        "progress": round(100 * processed / total, 1) if total else 100.0,
+        "records_per_sec": throughput,
+        "eta_seconds": eta_seconds if job["status"] in ACTIVE_STATUSES else 0,
+        # Jobs from before per-chunk results kept full outcome lists on the document
+        "counts": job.get("counts") or {outcome: len(job.get(outcome, [])) for outcome in OUTCOMES},
+        "failed_sample": job.get("failed_sample", job.get("failed", [])),
+        "audit_errors": job.get("audit_errors", 0),
+        "error": job.get("error"),
+        "created_at": job["created_at"],
+        "finished_at": job.get("finished_at"),
+    }
+
+
+# Shared manager used by the transfer router
+transfer_jobs = TransferJobManager(
+    chunk_size=settings.TRANSFER_JOB_CHUNK_SIZE,
+    max_workers=settings.TRANSFER_JOB_WORKERS,
+    failure_sample=settings.TRANSFER_JOB_FAILURE_SAMPLE,
+)
@@ -0,0 +1,189 @@
+# backend/app/utils/triage.py
+import asyncio
+import re
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.core.config import settings
+from app.utils.ai_client import triage_client, TriageUnavailable
+
+CANDIDATE_LABELS = ["Cardiology", "Neurology", "Orthopedics", "General Medicine", "Pediatrics", "Dermatology", "Psychiatry"]
+
+Prediction = Dict[str, List]  # {"labels": [...], "scores": [...]}, best first
+
+
+class TriageBackend:
+    """
+    Maps diagnosis text to a ranked list of CANDIDATE_LABELS.
+    Subclasses implement predict_batch; load() runs once from main.lifespan.
+    """
+    name = "base"
+
+    async def load(self):
+        pass
+
+    async def predict_batch(self, texts: Sequence[str], return_exceptions: bool = False) -> List[Union[Prediction, Exception]]:
+        raise NotImplementedError
+
+    async def predict(self, text: str) -> Prediction:
+        return (await self.predict_batch([text]))[0]
+
+    def stats(self) -> Dict:
+        return {"backend": self.name}
+
+
+# ---------------------------------------------------------
+# 🌐 REMOTE: Hugging Face zero-shot (facebook/bart-large-mnli)
+# ---------------------------------------------------------
+class HFTriageBackend(TriageBackend):
+    name = "hf"
+
+    def __init__(self, concurrency: int = 4):
+        self.concurrency = concurrency
+
+    async def predict_batch(self, texts, return_exceptions=False):
+        if not settings.HF_TOKEN and settings.AI_URL == settings.HF_DEFAULT_URL:
+            raise TriageUnavailable("Error: HF_TOKEN missing in .env")
+
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def classify(text):
+            async with slots:
+                return await triage_client.classify(text, CANDIDATE_LABELS)
+
+        return await asyncio.gather(*(classify(t) for t in texts), return_exceptions=return_exceptions)
+
+    def stats(self):
+        return {"backend": self.name, "concurrency": self.concurrency, **triage_client.stats()}
+
+
+# ---------------------------------------------------------
+# 💻 LOCAL: TF-IDF over department keyword profiles (CPU only)
+# ---------------------------------------------------------
+# Plain keywords match whole words (plus a plural "s"/"es"); a trailing "*" marks a
+# stem that matches any word starting with it ("cardi*" -> cardiac). Stems are at
+# least MIN_STEM_LENGTH letters so they cannot swallow unrelated words ("kid" -> kidney).
+DEPARTMENT_KEYWORDS = {
+    "Cardiology": "cardi* heart chest angina arrhythm* palpitat* hypertens* blood pressure coronar* myocard* infarct* "
+                  "atrial fibrillat* valve murmur tachycard* bradycard* cholesterol stent bypass aort*",
+    "Neurology": "neuro* brain migraine headache seizure epilep* stroke paralys* numb numbness tingl* dizz* vertigo "
+                 "parkinson* alzheimer* dementia memory tremor nerve spinal cord concuss* multiple sclerosis",
+    "Orthopedics": "fractur* bone joint knee hip shoulder spine back sprain ligament tendon arthrit* "
+                   "osteo* cartilage dislocat* musculoskel* wrist ankle elbow scoliosis sciatica",
+    "General Medicine": "fever cold cough flu influenza infect* viral bacteri* fatigue diabet* thyroid* anemi* "
+                        "nausea vomit* diarrh* stomach gastr* abdomen abdominal pain weight general checkup vitamin "
+                        "dehydrat* kidney renal colitis",
+    "Pediatrics": "child* infant baby babies newborn toddler pediatr* kid boy girl vaccin* immuniz* growth "
+                  "teeth colic measles chickenpox mumps adolescen* school",
+    "Dermatology": "skin rash eczema acne psoriasis itch* derma* mole lesion hives allerg* blister "
+                   "wart fungal melanoma hair nail sunburn pigment* ulcer",
+    "Psychiatry": "depress* anxi* panic stress mood bipolar schizophren* psych* suicid* insomnia sleep "
+                  "hallucinat* ptsd trauma adhd ocd obsess* addict* alcohol* substance eating mental",
+}
+MIN_STEM_LENGTH = 4
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+
+class LocalTriageBackend(TriageBackend):
+    """
+    Keyword TF-IDF classifier: each department is a profile document, inputs are
+    scored by cosine similarity and softmaxed into HF-style scores. Text that
+    matches no keyword falls back to General Medicine.
+    """
+    name = "local"
+
+    def __init__(self, keywords: Dict[str, str] = None, temperature: float = 0.1):
+        self.keywords = keywords or DEPARTMENT_KEYWORDS
+        self.temperature = temperature
+        self.labels: List[str] = []
+        self._terms: List[str] = []                 # Feature names: keywords as written
+        self._words: Dict[str, int] = {}            # Whole-word forms -> feature
+        self._stems: List[Tuple[str, int]] = []     # (stem, feature), longest first
+        self._token_features: Dict[str, int] = {}
+        self._profiles: np.ndarray = None
+        self._idf: np.ndarray = None
+
+    async def load(self):
+        self.labels = list(self.keywords)
+        self._terms = sorted({term for words in self.keywords.values() for term in words.split()})
+        index = {term: i for i, term in enumerate(self._terms)}
+
+        self._words, self._stems = {}, []
+        for term, i in index.items():
+            if term.endswith("*"):
+                if len(term) - 1 < MIN_STEM_LENGTH:
+                    raise ValueError(f"Stem '{term}' is shorter than {MIN_STEM_LENGTH} letters")
+                self._stems.append((term[:-1], i))
+            else:
+                for form in (term, term + "s", term + "es"):
+                    self._words.setdefault(form, i)
+        self._stems.sort(key=lambda item: -len(item[0]))
+
+        counts = np.zeros((len(self.labels), len(self._terms)))
+        for row, label in enumerate(self.labels):
+            for term in self.keywords[label].split():
+                counts[row, index[term]] += 1
+
+        document_freq = (counts > 0).sum(axis=0)
+        self._idf = np.log((1 + len(self.labels)) / (1 + document_freq)) + 1
+        profiles = counts * self._idf
+        self._profiles = profiles / np.linalg.norm(profiles, axis=1, keepdims=True)
+        self._token_features = {}
+        print(f"💻 Local triage model loaded ({len(self._terms)} features, {len(self.labels)} labels)")
+
+    def _feature(self, token: str) -> int:
+        # Memoized lookup: whole word first, then the longest matching stem; -1 for no keyword
+        feature = self._token_features.get(token)
+        if feature is None:
+            feature = self._words.get(token)
+            if feature is None:
+                feature = next((i for stem, i in self._stems if token.startswith(stem)), -1)
+            self._token_features[token] = feature
+        return feature
+
+    def score(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), len(labels)) matrix of probabilities."""
+        features = np.zeros((len(texts), len(self._terms)))
+        for row, text in enumerate(texts):
+            for token in _TOKEN_RE.findall(text.lower()):
+                feature = self._feature(token)
+                if feature >= 0:
+                    features[row, feature] += 1
+
+        features *= self._idf
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        similarity = np.divide(features, norms, out=np.zeros_like(features), where=norms > 0) @ self._profiles.T
+        similarity[norms[:, 0] == 0, self.labels.index("General Medicine")] = 1.0
+
+        logits = similarity / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    async def predict_batch(self, texts, return_exceptions=False):
+        if self._profiles is None:
+            await self.load()
+        probs = self.score(texts)
+        order = np.argsort(-probs, axis=1)
+        return [{
+            "labels": [self.labels[i] for i in ranking],
+            "scores": [float(p) for p in row[ranking]],
+        } for row, ranking in zip(probs, order)]
+
+
+TRIAGE_BACKENDS = {
+    "hf": lambda: HFTriageBackend(concurrency=settings.TRIAGE_HF_CONCURRENCY),
+    "local": LocalTriageBackend,
+}
+
+def get_triage_backend(name: str) -> TriageBackend:
+    try:
+        return TRIAGE_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown triage backend '{name}'. Choose one of: {', '.join(TRIAGE_BACKENDS)}")
+
+
+# Shared backend used by the AI router
+triage_backend = get_triage_backend(settings.TRIAGE_BACKEND)
@@ -0,0 +1,119 @@
+"""
+Patient search benchmark: the old case-insensitive $regex on patient_email vs the
+indexed prefix search on the normalized fields. Needs a real MongoDB (MONGODB_URL);
+records go into a scratch database that is dropped afterwards.
+
+    python bench_search.py                    # 1,000,000 synthetic records
+    python bench_search.py --records 100000   # quicker run
+    python bench_search.py --keep             # keep the scratch database for re-runs
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.db.indexes import INDEXES, _create_indexes
+from app.utils.search import normalize_abha, prefix_match, search_fields
+
+HOSPITALS = [f"hospital{i}" for i in range(10)]
+FIRST_NAMES = ["aarav", "diya", "ishaan", "meera", "rohan", "sara", "vikram", "anaya", "kabir", "zoya"]
+LAST_NAMES = ["sharma", "iyer", "khan", "patel", "reddy", "das", "singh", "nair", "gupta", "bose"]
+SEED_BATCH = 10000
+RUNS = 20
+
+
+def synthetic_record(i: int, now: datetime) -> dict:
+    first, last = random.choice(FIRST_NAMES), random.choice(LAST_NAMES)
+    email = f"{first}.{last}{i}@example.com"
+    name = f"{first.title()} {last.title()}"
+    return {
+        "hospital": random.choice(HOSPITALS),
+        "patient_id": str(i),
+        "patient_email": email if i % 2 else email.upper(),    # Mixed case, as doctors typed it
+        "patient_abha": f"{i:014d}",
+        "patient_name": name,
+        **search_fields(email, name),
+        "diagnosis": "x" * 64,
+        "created_at": now - timedelta(seconds=i),
+    }
+
+
+async def seed(records, total: int):
+    existing = await records.estimated_document_count()
+    if existing >= total:
+        print(f"♻️ Reusing {existing:,} records")
+        return
+    await records.drop()
+    now = datetime.utcnow()
+    t0 = time.perf_counter()
+    for start in range(0, total, SEED_BATCH):
+        await records.insert_many([synthetic_record(i, now) for i in range(start, min(start + SEED_BATCH, total))],
+                                  ordered=False)
+    print(f"🌱 Seeded {total:,} records in {time.perf_counter() - t0:.1f} s")
+    t0 = time.perf_counter()
+    await _create_indexes(records, INDEXES["records"])
+    print(f"📇 Built indexes in {time.perf_counter() - t0:.1f} s")
+
+
+async def measure(records, label: str, query: dict):
+    cursor = lambda: records.find(query).sort([("created_at", -1), ("_id", -1)]).limit(100)
+    await cursor().to_list(100)  # Warm up
+    t0 = time.perf_counter()
+    for _ in range(RUNS):
+        hits = await cursor().to_list(100)
+    ms = (time.perf_counter() - t0) * 1000 / RUNS
+
+    explain = await records.database.command({
+        "explain": {"find": records.name, "filter": query, "sort": {"created_at": -1, "_id": -1}, "limit": 100},
+        "verbosity": "executionStats",
+    })
+    examined = explain["executionStats"]["totalDocsExamined"]
+    print(f"⏱️ {label:<34} {ms:8.2f} ms  | {len(hits):>3} hits | {examined:>9,} docs examined")
+    return ms
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    database = client[f"{settings.DB_NAME}_bench_search"]
+    records = database["records"]
+    try:
+        await seed(records, args.records)
+
+        sample = await records.find_one({"hospital": HOSPITALS[0]})
+        hospital = sample["hospital"]
+        email_prefix = sample["patient_email"].split("@")[0][:-1]   # e.g. "meera.iyer4" of meera.iyer42@
+        surname = sample["patient_name"].split()[-1]
+        abha = sample["patient_abha"]
+        print(f"🔍 Searching {hospital} for email '{email_prefix}', surname '{surname}', ABHA {abha}")
+
+        old_email = await measure(records, "email: $regex, case-insensitive",
+                                  {"hospital": hospital, "patient_email": {"$regex": email_prefix, "$options": "i"}})
+        new_email = await measure(records, "email: indexed prefix",
+                                  {"hospital": hospital, "patient_email_lc": prefix_match(email_prefix)})
+        await measure(records, "name: indexed prefix (surname)",
+                      {"hospital": hospital, "patient_name_terms": prefix_match(surname)})
+
+        dashed = f"{abha[:2]}-{abha[2:6]}-{abha[6:10]}-{abha[10:]}"
+        old_abha = await measure(records, "ABHA: $or raw/cleaned",
+                                 {"hospital": hospital, "$or": [{"patient_abha": dashed}, {"patient_abha": abha}]})
+        new_abha = await measure(records, "ABHA: normalized equality",
+                                 {"hospital": hospital, "patient_abha": normalize_abha(dashed)})
+
+        print(f"🚀 Email search {old_email / new_email:.0f}x faster, ABHA search {old_abha / new_abha:.1f}x faster")
+    finally:
+        if not args.keep:
+            await client.drop_database(database.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""
+Latency / accuracy benchmark for the local triage model.
+
+    python bench_triage.py            # accuracy vs. the bundled reference labels
+    python bench_triage.py --hf       # accuracy vs. live Hugging Face labels (needs HF_TOKEN or AI_URL)
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+
+from app.utils.ai_client import triage_client
+from app.utils.triage import HFTriageBackend, LocalTriageBackend
+
+# (diagnosis text, reference department)
+SAMPLES = [
+    ("Severe chest pain radiating to the left arm, suspected myocardial infarction", "Cardiology"),
+    ("Irregular heartbeat and palpitations, atrial fibrillation on ECG", "Cardiology"),
+    ("Uncontrolled hypertension with high blood pressure readings", "Cardiology"),
+    ("Shortness of breath on exertion, angina, coronary artery disease", "Cardiology"),
+    ("Recurring migraine headaches with aura", "Neurology"),
+    ("Generalized seizure, known epilepsy patient", "Neurology"),
+    ("Sudden weakness on one side of the body, possible stroke", "Neurology"),
+    ("Tremor and slow movement consistent with Parkinson disease", "Neurology"),
+    ("Fractured left wrist after a fall", "Orthopedics"),
+    ("Chronic knee pain due to osteoarthritis", "Orthopedics"),
+    ("Torn ligament in the ankle from a sports injury", "Orthopedics"),
+    ("Lower back pain radiating down the leg, sciatica", "Orthopedics"),
+    ("High fever, cough and body aches, likely influenza", "General Medicine"),
+    ("Type 2 diabetes follow-up, adjust metformin", "General Medicine"),
+    ("Fatigue and pallor, iron deficiency anemia", "General Medicine"),
+    ("Nausea, vomiting and diarrhea for two days, gastroenteritis", "General Medicine"),
+    ("Newborn with jaundice and poor feeding", "Pediatrics"),
+    ("Toddler with measles rash and fever, vaccination incomplete", "Pediatrics"),
+    ("Infant colic and crying at night", "Pediatrics"),
+    ("Child growth delay, school-age checkup", "Pediatrics"),
+    ("Itchy red rash on both forearms, eczema flare", "Dermatology"),
+    ("Severe acne on face and back", "Dermatology"),
+    ("Scaly plaques on elbows consistent with psoriasis", "Dermatology"),
+    ("Changing mole with irregular border, rule out melanoma", "Dermatology"),
+    ("Persistent low mood and loss of interest, major depression", "Psychiatry"),
+    ("Panic attacks and generalized anxiety", "Psychiatry"),
+    ("Auditory hallucinations, suspected schizophrenia", "Psychiatry"),
+    ("Insomnia and stress after trauma, PTSD symptoms", "Psychiatry"),
+    # Near misses: words that start like a keyword of another department
+    ("Kidney stones with flank pain", "General Medicine"),
+    ("Chronic kidney disease, stage 3", "General Medicine"),
+    ("Background of hypertension, on amlodipine", "Cardiology"),
+    ("Ulcerative colitis flare with bloody diarrhea", "General Medicine"),
+    ("Molecular test pending for infection", "General Medicine"),
+    ("Persistent cough, number of episodes increasing", "General Medicine"),
+    ("Heartburn after meals, gastric reflux", "General Medicine"),
+    # Negatives: nothing department-specific falls back to General Medicine
+    ("Routine follow-up, no complaints", "General Medicine"),
+    ("Molecular diagnostics requested", "General Medicine"),
+]
+
+
+def accuracy(predictions, references):
+    hits = sum(p["labels"][0] == ref for p, ref in zip(predictions, references))
+    return hits / len(references)
+
+
+async def main():
+    texts = [text for text, _ in SAMPLES]
+    references = [label for _, label in SAMPLES]
+
+    local = LocalTriageBackend()
+    t0 = time.perf_counter()
+    await local.load()
+    print(f"⏱️ Load: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    # Latency: one at a time vs one batch
+    t0 = time.perf_counter()
+    for text in texts:
+        await local.predict(text)
+    single_ms = (time.perf_counter() - t0) * 1000 / len(texts)
+
+    bulk = texts * 400
+    t0 = time.perf_counter()
+    predictions = await local.predict_batch(bulk)
+    batch_us = (time.perf_counter() - t0) * 1e6 / len(bulk)
+    print(f"⏱️ Local single: {single_ms:.3f} ms/text | batch of {len(bulk)}: {batch_us:.1f} µs/text")
+
+    local_predictions = predictions[:len(texts)]
+    print(f"🎯 Local accuracy vs reference labels: {accuracy(local_predictions, references):.1%}")
+
+    if "--hf" in sys.argv:
+        hf = HFTriageBackend()
+        await triage_client.start()
+        try:
+            t0 = time.perf_counter()
+            hf_predictions = await hf.predict_batch(texts, return_exceptions=True)
+            hf_ms = (time.perf_counter() - t0) * 1000 / len(texts)
+        finally:
+            await triage_client.close()
+
+        ok = [(p, l) for p, l in zip(hf_predictions, local_predictions) if not isinstance(p, Exception)]
+        if not ok:
+            print(f"❌ HF unavailable: {hf_predictions[0]}")
+            return
+        hf_labels = [p["labels"][0] for p, _ in ok]
+        print(f"⏱️ HF: {hf_ms:.1f} ms/text ({len(ok)}/{len(texts)} answered)")
+        print(f"🎯 HF accuracy vs reference labels: "
+              f"{accuracy([p for p, _ in ok], [r for r, p in zip(references, hf_predictions) if not isinstance(p, Exception)]):.1%}")
+        print(f"🎯 Local agreement with HF labels: {accuracy([l for _, l in ok], hf_labels):.1%}")
+
+    for (text, reference), prediction in zip(SAMPLES, local_predictions):
+        mark = "✅" if prediction["labels"][0] == reference else "❌"
+        print(f"{mark} {prediction['labels'][0]:<17} {prediction['scores'][0]:.2f}  {text}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,24 @@
+import os
+import sys
+
+# app.core.config requires a MongoDB URL; these tests never connect to it
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """In-memory Motor database; skips tests that need one where mongomock-motor is absent."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from mongomock.collection import BulkOperationBuilder
+
+    # Newer pymongo passes `sort` to UpdateOne bulk ops, which mongomock does not accept
+    add_update = BulkOperationBuilder.add_update
+    monkeypatch.setattr(BulkOperationBuilder, "add_update",
+                        lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs))
+    # mongomock-motor's with_options returns a synchronous collection; write concerns are moot in memory
+    monkeypatch.setattr(mongomock_motor.AsyncMongoMockCollection, "with_options", lambda self, **kwargs: self,
+                        raising=False)
+    return mongomock_motor.AsyncMongoMockClient()["quantum_test"]
@@ -0,0 +1,214 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils import ai_client
+from app.utils.ai_client import CircuitBreaker, TriageClient, TriageRequestError, TriageUnavailable
+from app.utils.cache import TTLCache
+
+LABELS = ["Cardiology", "Neurology"]
+OK = {"labels": LABELS, "scores": [0.9, 0.1]}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ai_client.time, "monotonic", lambda: now[0])
+    return now
+
+
+def client(handler, breaker=None, retries=0) -> TriageClient:
+    c = TriageClient(url="http://ai.test/classify", retries=retries, cache=TTLCache(),
+                     breaker=breaker or CircuitBreaker(threshold=2, reset_after=30.0))
+    c._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return c
+
+
+# --- BREAKER STATES ---
+def test_opens_after_threshold(clock):
+    breaker = CircuitBreaker(threshold=3, reset_after=30.0)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(threshold=1, reset_after=30.0)
+    breaker.record_failure()
+    clock[0] += 29.9
+    assert not breaker.allow()
+    clock[0] += 0.1
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()      # Only the one trial
+
+
+def test_trial_success_closes(clock):
+    breaker = CircuitBreaker(threshold=2, reset_after=30.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_trial_failure_reopens(clock):
+    breaker = CircuitBreaker(threshold=5, reset_after=30.0)
+    for _ in range(5):
+        breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    clock[0] += 30
+    assert breaker.allow()
+
+
+def test_release_frees_trial(clock):
+    breaker = CircuitBreaker(threshold=1, reset_after=30.0)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+
+
+# --- THROUGH THE CLIENT ---
+def test_client_trips_and_recovers(clock):
+    healthy = [False]
+
+    def handler(request):
+        return httpx.Response(200, json=OK) if healthy[0] else httpx.Response(503)
+
+    c = client(handler)
+
+    async def scenario():
+        for text in ("a", "b"):
+            with pytest.raises(TriageUnavailable, match="HTTP 503"):
+                await c.classify(text, LABELS)
+        requests = c.requests
+        with pytest.raises(TriageUnavailable, match="circuit open"):
+            await c.classify("c", LABELS)
+        assert c.requests == requests   # Rejected without calling the service
+
+        clock[0] += 30
+        healthy[0] = True
+        assert await c.classify("c", LABELS) == OK
+        assert c.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_calls_wait_out_the_trial(clock):
+    gate = asyncio.Event()
+
+    async def handler(request):
+        await gate.wait()
+        return httpx.Response(200, json=OK)
+
+    c = client(handler, breaker=CircuitBreaker(threshold=1, reset_after=30.0))
+    c.breaker.record_failure()
+    clock[0] += 30
+
+    async def scenario():
+        trial = asyncio.create_task(c.classify("trial", LABELS))
+        await asyncio.sleep(0)
+        with pytest.raises(TriageUnavailable, match="circuit open"):
+            await c.classify("other", LABELS)
+        gate.set()
+        assert await trial == OK
+
+    asyncio.run(scenario())
+    assert c.breaker.state == "closed"
+
+
+def test_cancelled_trial_releases(clock):
+    async def handler(request):
+        await asyncio.Event().wait()
+
+    c = client(handler, breaker=CircuitBreaker(threshold=1, reset_after=30.0))
+    c.breaker.record_failure()
+    clock[0] += 30
+
+    async def scenario():
+        trial = asyncio.create_task(c.classify("trial", LABELS))
+        await asyncio.sleep(0)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(scenario())
+    assert c.breaker.state == "half-open" and not c.breaker.trial_in_flight
+
+
+# --- CLIENT ERRORS ---
+@pytest.mark.parametrize("status", [400, 401, 404, 413, 422])
+def test_client_errors_do_not_trip_breaker(clock, status):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(status, json={"error": "bad input"})
+
+    c = client(handler, retries=2)
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(TriageRequestError) as info:
+                await c.classify("text", LABELS)
+            assert info.value.status_code == status and info.value.detail == "bad input"
+
+    asyncio.run(scenario())
+    assert len(calls) == 3      # Not retried
+    assert c.breaker.state == "closed" and c.breaker.failures == 0
+    assert c.failures == 0 and c.rejected == 3
+
+
+def test_client_error_releases_half_open_trial(clock):
+    c = client(lambda request: httpx.Response(400, text="too long"),
+               breaker=CircuitBreaker(threshold=1, reset_after=30.0))
+    c.breaker.record_failure()
+    clock[0] += 30
+
+    with pytest.raises(TriageRequestError, match="HTTP 400: too long"):
+        asyncio.run(c.classify("text", LABELS))
+    assert c.breaker.state == "half-open" and c.breaker.allow()
+
+
+@pytest.mark.parametrize("response", [
+    httpx.Response(429),
+    httpx.Response(500),
+    httpx.Response(503, json={"error": "Model is loading"}),
+])
+def test_server_errors_retry_and_count(clock, monkeypatch, response):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return response
+
+    async def no_backoff(delay):
+        pass
+    monkeypatch.setattr(ai_client.asyncio, "sleep", no_backoff)
+
+    c = client(handler, retries=2)
+    with pytest.raises(TriageUnavailable, match=f"HTTP {response.status_code}"):
+        asyncio.run(c.classify("text", LABELS))
+    assert len(calls) == 3
+    assert c.breaker.failures == 1 and c.failures == 1 and c.rejected == 0
+
+
+def test_timeouts_count(clock):
+    def handler(request):
+        raise httpx.ReadTimeout("slow", request=request)
+
+    c = client(handler)
+    with pytest.raises(TriageUnavailable, match="slow"):
+        asyncio.run(c.classify("text", LABELS))
+    assert c.breaker.failures == 1
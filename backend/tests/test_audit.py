@@ -0,0 +1,171 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from app.utils import audit
+from app.utils.audit import AUDIT_COLLECTION, ROLLUP_COLLECTION, AuditSink
+
+WHEN = datetime(2024, 5, 1, 9, 30)
+
+
+def entries(n: int, receiver: str = "hospitalB"):
+    return [{"timestamp": WHEN, "sender_hospital": "hospitalA", "receiver_hospital": receiver,
+             "record_id": str(i)} for i in range(n)]
+
+
+class FlakyCollection:
+    """Wraps a collection so the first `failures` insert_many calls fail after `written` documents."""
+
+    def __init__(self, collection, failures: int, written: int = 0):
+        self.collection = collection
+        self.failures = failures
+        self.written = written
+        self.calls = 0
+
+    async def insert_many(self, documents, ordered=True):
+        self.calls += 1
+        if self.calls <= self.failures:
+            if self.written:
+                # The server stored part of the batch before the connection dropped
+                await self.collection.insert_many(documents[:self.written], ordered=ordered)
+            raise AutoReconnect("connection reset")
+        return await self.collection.insert_many(documents, ordered=ordered)
+
+
+class RejectingCollection:
+    """Stores every entry except those at `rejected`, like a server-side validation failure."""
+
+    def __init__(self, collection, rejected):
+        self.collection = collection
+        self.rejected = set(rejected)
+
+    async def insert_many(self, documents, ordered=True):
+        kept = [doc for index, doc in enumerate(documents) if index not in self.rejected]
+        await self.collection.insert_many(kept, ordered=ordered)
+        raise BulkWriteError({"writeErrors": [
+            {"index": index, "code": 121, "errmsg": "Document failed validation"} for index in sorted(self.rejected)
+        ]})
+
+
+@pytest.fixture
+def wrap_audit(db, monkeypatch):
+    """Makes AuditSink write through `factory(audit_logs collection)`."""
+    async def no_backoff(delay):
+        pass
+    monkeypatch.setattr(audit.asyncio, "sleep", no_backoff)
+    collection_class = pytest.importorskip("mongomock_motor").AsyncMongoMockCollection
+
+    def install(factory):
+        wrapper = factory(db[AUDIT_COLLECTION])
+        monkeypatch.setattr(collection_class, "with_options", lambda self, **kwargs: wrapper, raising=False)
+        return wrapper
+    return install
+
+
+@pytest.fixture
+def flaky(wrap_audit):
+    return lambda failures, written=0: wrap_audit(lambda c: FlakyCollection(c, failures, written))
+
+
+async def count(db, collection=AUDIT_COLLECTION):
+    return await db[collection].count_documents({})
+
+
+async def rollup_counts(db):
+    docs = await db[ROLLUP_COLLECTION].find({}).to_list(None)
+    return {doc["granularity"]: doc["count"] for doc in docs}
+
+
+# --- SYNC WRITES ---
+def test_unstarted_sink_writes_immediately(db):
+    sink = AuditSink()
+
+    async def scenario():
+        await sink.emit(db, entries(3))
+        return await count(db), await rollup_counts(db)
+
+    assert asyncio.run(scenario()) == (3, {"hour": 3, "day": 3})
+    assert sink.stats()["written"] == 3 and sink.dropped == 0
+
+
+def test_retry_then_success(db, flaky):
+    wrapper = flaky(failures=2)
+    sink = AuditSink(retries=3)
+    asyncio.run(sink.emit(db, entries(4), critical=True))
+    assert wrapper.calls == 3
+    assert asyncio.run(count(db)) == 4
+    assert sink.written == 4 and sink.dropped == 0
+
+
+def test_raises_after_last_retry(db, flaky):
+    wrapper = flaky(failures=3)
+    sink = AuditSink(retries=3)
+    with pytest.raises(AutoReconnect):
+        asyncio.run(sink.emit(db, entries(4), critical=True))
+    assert wrapper.calls == 3
+    assert sink.written == 0 and sink.dropped == 4
+    assert asyncio.run(rollup_counts(db)) == {}
+
+
+def test_retry_after_partial_write_is_idempotent(db, flaky):
+    # Attempt 1 stores two entries then fails; attempt 2 reuses their _ids
+    flaky(failures=1, written=2)
+    sink = AuditSink(retries=3)
+    asyncio.run(sink.emit(db, entries(5), critical=True))
+
+    docs = asyncio.run(db[AUDIT_COLLECTION].find({}).to_list(None))
+    assert sorted(doc["record_id"] for doc in docs) == ["0", "1", "2", "3", "4"]
+    assert sink.written == 5 and sink.dropped == 0
+    assert asyncio.run(rollup_counts(db)) == {"hour": 5, "day": 5}
+
+
+def test_non_duplicate_write_errors_raise(db, wrap_audit):
+    wrap_audit(lambda c: RejectingCollection(c, rejected=[1]))
+    sink = AuditSink()
+    with pytest.raises(BulkWriteError):
+        asyncio.run(sink.emit(db, entries(3), critical=True))
+    assert sink.written == 2 and sink.dropped == 1
+    assert asyncio.run(rollup_counts(db)) == {"hour": 2, "day": 2}
+
+
+def test_rollup_failure_is_not_a_drop(db, monkeypatch):
+    async def broken_rollups(db, entries):
+        raise AutoReconnect("rollups down")
+    monkeypatch.setattr(audit, "record_rollups", broken_rollups)
+
+    sink = AuditSink()
+    asyncio.run(sink.emit(db, entries(3), critical=True))
+    assert asyncio.run(count(db)) == 3
+    assert sink.written == 3 and sink.dropped == 0
+
+
+# --- BUFFERED WRITES ---
+def test_buffered_entries_flush_in_batches(db):
+    sink = AuditSink(batch_size=4, flush_interval=60)
+
+    async def scenario():
+        sink.start(db)
+        await sink.emit(db, entries(10))
+        await sink.stop()
+        return await count(db)
+
+    assert asyncio.run(scenario()) == 10
+    assert sink.batches == 3 and sink.written == 10
+
+
+def test_drain_survives_failed_flush(db, flaky):
+    flaky(failures=3)
+    sink = AuditSink(batch_size=2, flush_interval=60, retries=3)
+
+    async def scenario():
+        sink.start(db)
+        await sink.emit(db, entries(2))     # First batch exhausts the retries
+        await sink.emit(db, entries(2, receiver="hospitalC"))
+        await sink.stop()
+        return await db[AUDIT_COLLECTION].find({}).to_list(None)
+
+    docs = asyncio.run(scenario())
+    assert [doc["receiver_hospital"] for doc in docs] == ["hospitalC", "hospitalC"]
+    assert sink.dropped == 2 and sink.written == 2
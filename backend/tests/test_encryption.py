@@ -0,0 +1,99 @@
+import os
+
+import pytest
+from bson import Binary
+from cryptography.exceptions import InvalidTag
+
+from app.core.config import settings
+from app.utils import encryption
+from app.utils.encryption import (
+    ENVELOPE_VERSION, FLAG_ZLIB, FLAG_ZSTD, NONCE_SIZE, ciphertext_preview, decrypt_data, decrypt_many,
+    encrypt_data, encrypt_many, is_legacy_ciphertext,
+)
+
+KEY = os.urandom(32).hex()
+OTHER_KEY = os.urandom(32).hex()
+LONG_TEXT = "Patient presents with recurring chest pain. " * 40
+
+
+def test_envelope_round_trip_and_layout():
+    envelope = encrypt_data("fever", KEY)
+    assert isinstance(envelope, Binary)
+    assert envelope[0] == ENVELOPE_VERSION and envelope[1] == 0     # Short text: not compressed
+    assert len(envelope) == 2 + NONCE_SIZE + len("fever") + 16
+    assert decrypt_data(envelope, KEY) == "fever"
+
+
+def test_nonces_are_fresh():
+    assert encrypt_data("same", KEY) != encrypt_data("same", KEY)
+
+
+def test_long_text_is_compressed():
+    envelope = encrypt_data(LONG_TEXT, KEY)
+    assert envelope[1] & (FLAG_ZLIB | FLAG_ZSTD)
+    assert len(envelope) < len(LONG_TEXT)
+    assert decrypt_data(envelope, KEY) == LONG_TEXT
+
+
+def test_zlib_fallback_without_zstandard(monkeypatch):
+    monkeypatch.setattr(encryption, "zstandard", None)
+    envelope = encrypt_data(LONG_TEXT, KEY)
+    assert envelope[1] == FLAG_ZLIB
+    assert decrypt_data(envelope, KEY) == LONG_TEXT
+
+
+def test_incompressible_payload_is_stored_as_is():
+    noise = os.urandom(4 * settings.ENCRYPTION_COMPRESS_THRESHOLD)
+    assert encryption._compress(noise) == (0, noise)
+
+
+def test_header_is_authenticated():
+    envelope = bytearray(encrypt_data(LONG_TEXT, KEY))
+    envelope[1] ^= FLAG_ZLIB | FLAG_ZSTD    # Flip the compression flag
+    with pytest.raises(InvalidTag):
+        decrypt_data(Binary(bytes(envelope)), KEY)
+
+
+def test_tampered_body_and_wrong_key_are_rejected():
+    envelope = bytearray(encrypt_data("fever", KEY))
+    envelope[-1] ^= 1
+    with pytest.raises(InvalidTag):
+        decrypt_data(Binary(bytes(envelope)), KEY)
+    with pytest.raises(InvalidTag):
+        decrypt_data(encrypt_data("fever", KEY), OTHER_KEY)
+
+
+def test_unknown_envelope_version():
+    with pytest.raises(ValueError):
+        decrypt_data(Binary(bytes([ENVELOPE_VERSION + 1, 0]) + os.urandom(40)), KEY)
+    with pytest.raises(ValueError):
+        decrypt_data(Binary(b"\x01"), KEY)
+
+
+def test_legacy_fernet_tokens_still_decrypt(monkeypatch):
+    monkeypatch.setattr(settings, "ENCRYPTION_FORMAT", "fernet")
+    token = encrypt_data("legacy diagnosis", KEY)
+    assert isinstance(token, str) and is_legacy_ciphertext(token)
+    monkeypatch.setattr(settings, "ENCRYPTION_FORMAT", "aesgcm")
+    assert decrypt_data(token, KEY) == "legacy diagnosis"
+
+
+def test_ciphertext_preview():
+    assert ciphertext_preview(None) is None
+    assert ciphertext_preview("gAAAA-token") == "gAAAA-token"
+    assert isinstance(ciphertext_preview(encrypt_data("x", KEY)), str)
+
+
+@pytest.mark.parametrize("count", [3, settings.ENCRYPTION_PARALLEL_THRESHOLD + 5])
+def test_bulk_apis_keep_order_and_isolate_failures(count):
+    plaintexts = [f"record {i}" for i in range(count)]
+    ciphertexts = encrypt_many([(text, KEY) for text in plaintexts])
+    assert decrypt_many([(c, KEY) for c in ciphertexts]) == plaintexts
+
+    pairs = [(c, KEY) for c in ciphertexts]
+    pairs[1] = (ciphertexts[1], OTHER_KEY)
+    results = decrypt_many(pairs, return_exceptions=True)
+    assert isinstance(results[1], InvalidTag)
+    assert results[:1] + results[2:] == plaintexts[:1] + plaintexts[2:]
+    with pytest.raises(InvalidTag):
+        decrypt_many(pairs)
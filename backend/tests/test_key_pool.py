@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.utils import key_pool as key_pool_module
+from app.utils.key_pool import QKDKeyPool
+from app.utils.qkd_executor import qkd_executor
+
+KEYS = 40
+
+
+@pytest.fixture(params=["numpy", "aer"])
+def engine(request, monkeypatch):
+    monkeypatch.setattr(settings, "QKD_ENGINE", request.param)
+    qkd_executor.shutdown()     # Fresh (forked) workers for each engine
+    yield request.param
+    qkd_executor.shutdown()
+
+
+def test_pool_keys_are_unique_across_workers(engine):
+    async def draw():
+        pool = QKDKeyPool(low_watermark=1, high_watermark=KEYS)
+        singles = await asyncio.gather(*(pool._generate_key() for _ in range(KEYS // 2)))
+        batched = await pool.acquire_keys(KEYS // 2)
+        return list(singles) + batched
+
+    keys = asyncio.run(draw())
+    assert len(keys) == KEYS
+    assert len(set(keys)) == KEYS
+
+
+def test_refill_runs_one_batch_per_deficit(monkeypatch):
+    batches = []
+
+    async def fake_batch(count):
+        batches.append(count)
+        return [{"final_key_hash": f"{len(batches)}-{i}"} for i in range(count)]
+    monkeypatch.setattr(key_pool_module, "simulate_qkd_batch_async", fake_batch)
+
+    async def scenario():
+        pool = QKDKeyPool(low_watermark=4, high_watermark=10)
+        await pool.start()
+        await asyncio.sleep(0)
+        assert batches == [10] and pool.stats()["available"] == 10
+
+        await pool.acquire_keys(7)      # 3 left, below the low watermark
+        await asyncio.sleep(0)
+        assert batches == [10, 7] and pool.generated == 17
+        await pool.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,121 @@
+import asyncio
+import os
+
+import pytest
+from bson import Binary
+from cryptography.hazmat.primitives.keywrap import InvalidUnwrap
+
+from app.utils.key_pool import key_pool
+from app.utils.key_rotation import KeyRotationManager
+from app.utils.keystore import HospitalKeyStore, has_data_key
+from app.utils.transfer_engine import INBOX_COLLECTION, inbox_key
+
+
+def data_key() -> str:
+    return os.urandom(32).hex()
+
+
+@pytest.fixture(autouse=True)
+def fake_qkd(monkeypatch):
+    """KEKs come from urandom instead of the simulator."""
+    async def acquire_key():
+        return data_key()
+    monkeypatch.setattr(key_pool, "acquire_key", acquire_key)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = HospitalKeyStore()
+    # The rotation job uses the shared store
+    monkeypatch.setattr("app.utils.key_rotation.keystore", store)
+    return store
+
+
+# --- WRAP / UNWRAP ---
+def test_wrap_round_trip(db, store):
+    kek_id = asyncio.run(store.active_kek_id(db, "hospitalA"))
+    key = data_key()
+    wrapped = store.wrap(kek_id, key)
+    assert isinstance(wrapped, Binary) and len(wrapped) == 40
+    assert store.unwrap(kek_id, wrapped) == key
+
+
+def test_unwrap_under_other_kek_fails(db, store):
+    kek_a = asyncio.run(store.active_kek_id(db, "hospitalA"))
+    kek_b = asyncio.run(store.active_kek_id(db, "hospitalB"))
+    assert kek_a != kek_b
+    with pytest.raises(InvalidUnwrap):
+        store.unwrap(kek_b, store.wrap(kek_a, data_key()))
+
+
+def test_data_key_sources(db, store):
+    kek_id = asyncio.run(store.active_kek_id(db, "hospitalA"))
+    key = data_key()
+    assert store.data_key({"wrapped_key": store.wrap(kek_id, key), "kek_id": kek_id}) == key
+    assert store.data_key({"quantum_key": key}) == key
+    assert store.data_key({"decryption_key": key}) == key
+    assert store.data_key({}) is None
+    assert not has_data_key({"diagnosis": "x"})
+
+
+def test_keks_persist_across_stores(db, store):
+    kek_id = asyncio.run(store.active_kek_id(db, "hospitalA"))
+    wrapped = store.wrap(kek_id, key := data_key())
+
+    other = HospitalKeyStore()
+    asyncio.run(other.ensure_loaded(db, [kek_id]))
+    assert other.unwrap(kek_id, wrapped) == key
+    assert asyncio.run(other.active_kek_id(db, "hospitalA")) == kek_id
+
+
+# --- ROTATION ---
+def test_rotate_retires_old_kek(db, store):
+    old_id = asyncio.run(store.active_kek_id(db, "hospitalA"))
+    wrapped = store.wrap(old_id, key := data_key())
+
+    returned_old, new_id = asyncio.run(store.rotate(db, "hospitalA"))
+    assert returned_old == old_id and new_id != old_id
+    assert asyncio.run(store.active_kek_id(db, "hospitalA")) == new_id
+    # Retired KEKs stay usable until every record has been re-wrapped
+    assert store.unwrap(old_id, wrapped) == key
+
+    docs = asyncio.run(db["hospital_keys"].find({"hospital": "hospitalA"}).to_list(None))
+    assert {str(d["_id"]): d["status"] for d in docs} == {old_id: "retired", new_id: "active"}
+
+
+def test_rotation_job_rewraps_records_and_inbox(db, store):
+    async def scenario():
+        old_id = await store.active_kek_id(db, "hospitalA")
+        other_id = await store.active_kek_id(db, "hospitalB")
+        wrapped, legacy, packet, foreign = data_key(), data_key(), data_key(), data_key()
+        await db["records"].insert_many([
+            {"hospital": "hospitalA", "wrapped_key": store.wrap(old_id, wrapped), "kek_id": old_id},
+            {"hospital": "hospitalA", "quantum_key": legacy},
+            {"hospital": "hospitalB", "wrapped_key": store.wrap(other_id, foreign), "kek_id": other_id},
+        ])
+        await db[INBOX_COLLECTION].insert_one(
+            {"target_key": inbox_key("hospitalA"), "wrapped_key": store.wrap(old_id, packet), "kek_id": old_id}
+        )
+
+        manager = KeyRotationManager(batch_size=1)
+        job = await manager.submit(db, "hospitalA", requested_by="admin")
+        await asyncio.gather(*manager._tasks.values())
+        return job, {"wrapped": wrapped, "legacy": legacy, "packet": packet, "foreign": foreign}, other_id
+
+    job, keys, other_id = asyncio.run(scenario())
+    new_id = job["kek_id"]
+
+    state = asyncio.run(db["key_rotations"].find_one({}))
+    assert state["status"] == "completed"
+    assert state["rewrapped"] == 3 and state["failed"] == 0
+
+    records = asyncio.run(db["records"].find().to_list(None))
+    mine = [r for r in records if r["hospital"] == "hospitalA"]
+    assert all(r["kek_id"] == new_id and "quantum_key" not in r for r in mine)
+    assert sorted(store.data_key(r) for r in mine) == sorted([keys["wrapped"], keys["legacy"]])
+
+    foreign = next(r for r in records if r["hospital"] == "hospitalB")
+    assert foreign["kek_id"] == other_id and store.data_key(foreign) == keys["foreign"]
+
+    inbox = asyncio.run(db[INBOX_COLLECTION].find_one({}))
+    assert inbox["kek_id"] == new_id and store.data_key(inbox) == keys["packet"]
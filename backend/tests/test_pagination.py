@@ -0,0 +1,66 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.utils.pagination import after_cursor, decode_cursor, encode_cursor
+
+
+def b64(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    when, doc_id = datetime(2024, 5, 1, 12, 30, 15, 123456), ObjectId()
+    cursor = encode_cursor(when, doc_id)
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == (when, doc_id)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor!",
+    b64("not json"),
+    b64("[1, 2]"),
+    b64("5"),
+    b64(json.dumps({"t": "2024-05-01T12:00:00"})),
+    b64(json.dumps({"t": "yesterday", "id": str(ObjectId())})),
+    b64(json.dumps({"t": "2024-05-01T12:00:00", "id": "abc"})),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        decode_cursor(cursor)
+
+
+def test_after_cursor_filter():
+    when, doc_id = datetime(2024, 5, 1), ObjectId()
+    assert after_cursor("timestamp", encode_cursor(when, doc_id)) == {"$or": [
+        {"timestamp": {"$lt": when}},
+        {"timestamp": when, "_id": {"$lt": doc_id}},
+    ]}
+
+
+def test_pages_cover_ties_without_gaps(db):
+    # Several documents share each timestamp, so ordering must fall back to _id
+    base = datetime(2024, 5, 1)
+    docs = [{"_id": ObjectId(), "created_at": base + timedelta(minutes=i // 3)} for i in range(10)]
+
+    async def walk(page_size: int):
+        await db["records"].insert_many(docs)
+        seen, query = [], {}
+        while True:
+            page = await db["records"].find(query).sort(
+                [("created_at", -1), ("_id", -1)]
+            ).limit(page_size).to_list(page_size)
+            seen += [d["_id"] for d in page]
+            if len(page) < page_size:
+                return seen
+            query = after_cursor("created_at", encode_cursor(page[-1]["created_at"], page[-1]["_id"]))
+
+    seen = asyncio.run(walk(page_size=4))
+    expected = [d["_id"] for d in sorted(docs, key=lambda d: (d["created_at"], d["_id"]), reverse=True)]
+    assert seen == expected
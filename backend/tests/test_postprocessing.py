@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from app.utils.quantum import (
+    ChannelModel, QKDProtocol, QKDSecurityError, binary_entropy, cascade_correct, estimate_qber,
+    privacy_amplification,
+)
+
+
+def noisy_pair(rng, n, qber):
+    alice = rng.integers(0, 2, size=n, dtype=np.uint8)
+    bob = alice.copy()
+    bob[rng.random(n) < qber] ^= 1
+    return alice, bob
+
+
+# --- Cascade error correction ---
+@pytest.mark.parametrize("qber", [0.0, 0.01, 0.03, 0.08])
+def test_cascade_reconciles_bob_to_alice(qber):
+    rng = np.random.default_rng(1)
+    alice, bob = noisy_pair(rng, 4096, qber)
+    corrected, leaked = cascade_correct(alice, bob, max(qber, 0.01), rng=rng)
+    assert np.array_equal(corrected, alice)
+    assert leaked > 0
+
+
+def test_cascade_does_not_modify_its_input():
+    rng = np.random.default_rng(2)
+    alice, bob = noisy_pair(rng, 1024, 0.05)
+    before = bob.copy()
+    cascade_correct(alice, bob, 0.05, rng=rng)
+    assert np.array_equal(bob, before)
+
+
+def test_cascade_leak_grows_with_error_rate():
+    rng = np.random.default_rng(3)
+    leaks = [cascade_correct(*noisy_pair(rng, 4096, qber), qber, rng=rng)[1] for qber in (0.01, 0.08)]
+    assert leaks[0] < leaks[1]
+
+
+def test_cascade_gives_up_when_it_cannot_converge():
+    rng = np.random.default_rng(4)
+    alice, bob = noisy_pair(rng, 2048, 0.3)
+    with pytest.raises(QKDSecurityError):
+        cascade_correct(alice, bob, 0.01, max_passes=1, rng=rng)
+
+
+# --- QBER estimation ---
+def test_estimate_qber_discloses_and_drops_the_sample():
+    rng = np.random.default_rng(5)
+    alice, bob = noisy_pair(rng, 10000, 0.05)
+    qber, keep = estimate_qber(alice, bob, 0.2, rng=rng)
+    assert abs(qber - 0.05) < 0.02
+    assert keep.sum() == 8000
+
+
+# --- Toeplitz privacy amplification ---
+def toeplitz_reference(key_bits, output_length, seed):
+    n = len(key_bits)
+    matrix = np.array([[seed[i - j + n - 1] for j in range(n)] for i in range(output_length)], dtype=np.int64)
+    return (matrix @ key_bits.astype(np.int64) % 2).astype(np.uint8)
+
+
+@pytest.mark.parametrize("n, m", [(1, 1), (17, 5), (256, 100), (1000, 333)])
+def test_privacy_amplification_matches_the_toeplitz_product(n, m):
+    key = np.random.default_rng(n).integers(0, 2, size=n, dtype=np.uint8)
+    seed = np.random.default_rng(42).integers(0, 2, size=n + m - 1, dtype=np.uint8)
+    result = privacy_amplification(key, m, rng=np.random.default_rng(42))
+    assert result.dtype == np.uint8 and len(result) == m
+    assert np.array_equal(result, toeplitz_reference(key, m, seed))
+
+
+def test_privacy_amplification_empty_output():
+    assert len(privacy_amplification(np.ones(8, dtype=np.uint8), 0)) == 0
+    assert len(privacy_amplification(np.zeros(0, dtype=np.uint8), 8)) == 0
+
+
+def test_binary_entropy():
+    assert binary_entropy(0) == 0 and binary_entropy(1) == 0
+    assert binary_entropy(0.5) == pytest.approx(1.0)
+    assert binary_entropy(0.11) == pytest.approx(0.4999, abs=1e-3)
+
+
+# --- Full pipeline ---
+def test_postprocessed_key_on_a_noisy_channel():
+    qkd = QKDProtocol(num_bits=4096, engine="numpy",
+                      channel=ChannelModel(depolarizing_prob=0.04), postprocess=True)
+    key = qkd.execute_bb84_protocol()
+    assert 0 < key["qber"] < 0.11
+    assert 0 < key["secret_bits_count"] < key["sifted_bits_count"]
+    assert len(key["shared_key"]) == 32
+
+
+def test_eavesdropper_aborts_the_session():
+    # Full intercept-resend pushes the QBER to ~25%, past any sane threshold
+    qkd = QKDProtocol(num_bits=4096, engine="numpy",
+                      channel=ChannelModel(eve_intercept_rate=1.0), postprocess=True)
+    with pytest.raises(QKDSecurityError):
+        qkd.execute_bb84_protocol()
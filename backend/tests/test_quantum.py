@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from app.utils.quantum import ENGINES, IDEAL_CHANNEL, QKDProtocol, get_engine
+
+KEYS = 16
+NUM_BITS = 256
+TOLERANCE = 0.05    # ~6 standard deviations at 4096 qubits
+
+
+@pytest.fixture(params=sorted(ENGINES))
+def rounds(request):
+    """One batch of BB84 rounds on an ideal channel: (alice_bits, matching_bases, bob_results)."""
+    qkd = QKDProtocol(num_bits=NUM_BITS, engine=get_engine(request.param),
+                      channel=IDEAL_CHANNEL, postprocess=False)
+    return qkd._run_rounds(KEYS)
+
+
+def test_matching_bases_reproduce_alice_bits(rounds):
+    alice_bits, matching, bob_results = rounds
+    assert bob_results.shape == alice_bits.shape
+    assert np.array_equal(bob_results[matching], alice_bits[matching])
+
+
+def test_sift_rate_is_one_half(rounds):
+    _, matching, _ = rounds
+    assert abs(matching.mean() - 0.5) < TOLERANCE
+
+
+def test_mismatched_bases_give_fair_coin(rounds):
+    _, matching, bob_results = rounds
+    assert abs(bob_results[~matching].mean() - 0.5) < TOLERANCE
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from app.utils.triage import LocalTriageBackend
+
+
+@pytest.fixture(scope="module")
+def backend():
+    backend = LocalTriageBackend()
+    asyncio.run(backend.load())
+    return backend
+
+
+def top_label(backend, text):
+    return asyncio.run(backend.predict(text))["labels"][0]
+
+
+@pytest.mark.parametrize("text, department", [
+    # Short keywords must not match as prefixes of unrelated words
+    ("kidney stones", "General Medicine"),
+    ("chronic kidney disease", "General Medicine"),
+    ("background of hypertension", "Cardiology"),
+    ("molecular test", "General Medicine"),
+    ("ulcerative colitis", "General Medicine"),
+    # Whole words, plurals and stems still match
+    ("sick kids at school", "Pediatrics"),
+    ("lower back pain", "Orthopedics"),
+    ("suspicious moles on the arm", "Dermatology"),
+    ("cardiac arrhythmia", "Cardiology"),
+])
+def test_keyword_matching(backend, text, department):
+    assert top_label(backend, text) == department
+
+
+def test_stems_have_a_minimum_length():
+    with pytest.raises(ValueError):
+        asyncio.run(LocalTriageBackend({"Pediatrics": "kid*", "General Medicine": "fever"}).load())
@@ -5,19 +5,26 @@ const API_BASE_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
 
 const GovernmentView = () => {
   const [logs, setLogs] = useState([]);
+  const [summary, setSummary] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     fetchLogs();
   }, []);
 
+  const authHeaders = () => ({ Authorization: `Bearer ${localStorage.getItem("token")}` });
+
+  // First page + per-route totals (pre-aggregated server side)
   const fetchLogs = async () => {
     try {
-      const token = localStorage.getItem("token");
-      const res = await axios.get(`${API_BASE_URL}/api/transfer/audit-logs`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
+      const [res, summaryRes] = await Promise.all([
+        axios.get(`${API_BASE_URL}/api/transfer/audit-logs`, { headers: authHeaders() }),
+        axios.get(`${API_BASE_URL}/api/transfer/audit-logs/summary`, { headers: authHeaders() })
+      ]);
       setLogs(res.data);
+      setNextCursor(res.headers["x-next-cursor"] || null);
+      setSummary(summaryRes.data.totals);
     } catch (err) {
       console.error("Audit Fetch Error:", err);
     } finally {
@@ -25,6 +32,19 @@ const GovernmentView = () => {
     }
   };
 
+  const loadMore = async () => {
+    try {
+      const res = await axios.get(`${API_BASE_URL}/api/transfer/audit-logs`, {
+        headers: authHeaders(),
+        params: { cursor: nextCursor }
+      });
+      setLogs((prev) => [...prev, ...res.data]);
+      setNextCursor(res.headers["x-next-cursor"] || null);
+    } catch (err) {
+      console.error("Audit Fetch Error:", err);
+    }
+  };
+
   return (
     <div className="p-5 bg-white shadow rounded-lg">
       <h3 className="text-xl font-bold text-gray-800 mb-4 flex items-center gap-2">
@@ -36,6 +56,15 @@ const GovernmentView = () => {
         <p>Loading classified data...</p>
       ) : (
         <div className="overflow-x-auto">
+          {summary.length > 0 && (
+            <div className="mb-4 flex flex-wrap gap-2">
+              {summary.map((route) => (
+                <span key={`${route.sender_hospital}-${route.receiver_hospital}`} className="text-xs bg-indigo-50 text-indigo-700 border border-indigo-100 px-2 py-1 rounded">
+                  {route.sender_hospital} → {route.receiver_hospital}: <b>{route.count}</b> (30 days)
+                </span>
+              ))}
+            </div>
+          )}
           <table className="min-w-full text-sm text-left text-gray-500">
             <thead className="text-xs text-gray-700 uppercase bg-gray-50">
               <tr>
@@ -59,6 +88,9 @@ const GovernmentView = () => {
             </tbody>
           </table>
           {logs.length === 0 && <p className="p-4 text-center">No transfers recorded yet.</p>}
+          {nextCursor && (
+            <button onClick={loadMore} className="mt-3 text-sm bg-gray-200 px-3 py-1 rounded hover:bg-gray-300">Load more</button>
+          )}
         </div>
       )}
     </div>
@@ -1,35 +1,15 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState } from 'react';
 import axios from 'axios';
 import { Download, CheckCircle, ArrowDownCircle, Loader, AlertCircle } from 'lucide-react';
+import useInboxStream from './useInboxStream';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
 
 const Inbox = () => {
-  const [incomingRecords, setIncomingRecords] = useState([]);
-  const [loading, setLoading] = useState(false);
+  // Pushed over a WebSocket instead of polling /my-inbox
+  const { items: incomingRecords, loading, removeItem } = useInboxStream();
   const [processingId, setProcessingId] = useState(null);
 
-  useEffect(() => {
-    fetchInbox();
-    const interval = setInterval(fetchInbox, 15000); // Poll every 15s
-    return () => clearInterval(interval);
-  }, []);
-
-  const fetchInbox = async () => {
-    if (incomingRecords.length === 0) setLoading(true);
-    try {
-      const token = localStorage.getItem('token');
-      const res = await axios.get(`${API_BASE_URL}/api/transfer/my-inbox`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      setIncomingRecords(res.data);
-    } catch (err) {
-      console.error("Error fetching inbox:", err);
-    } finally {
-      setLoading(false);
-    }
-  };
-
   const handleAccept = async (id) => {
     setProcessingId(id);
     try {
@@ -51,8 +31,7 @@ const Inbox = () => {
         alert("Record Accepted! Check your main dashboard.");
       }
 
-      // Refresh Inbox
-      fetchInbox();
+      removeItem(id);
 
     } catch (err) {
       console.error("Accept Error:", err);
@@ -115,7 +94,7 @@ const Inbox = () => {
               </div>
               
               <div className="text-[11px] text-gray-500">
-                From: <span className="font-bold text-indigo-600">{rec.sender || rec.hospital || "Unknown"}</span>
+                From: <span className="font-bold text-indigo-600">{rec.sender_hospital || rec.sender || "Unknown"}</span>
               </div>
             </div>
           );
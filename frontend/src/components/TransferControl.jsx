@@ -3,6 +3,9 @@ import axios from 'axios';
 import { ShieldCheck, Lock, AlertTriangle } from 'lucide-react'; // Optional icons
 
 const API_BASE_URL = "http://127.0.0.1:8000";
+const POLL_INTERVAL_MS = 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
 
 const TransferControl = ({ recordId }) => {
   const [loading, setLoading] = useState(false);
@@ -10,6 +13,7 @@ const TransferControl = ({ recordId }) => {
   const [hospitals, setHospitals] = useState([]); 
   const [target, setTarget] = useState(""); 
   const [error, setError] = useState("");
+  const [progress, setProgress] = useState(null);
 
   // 1. Load Target Hospitals
   useEffect(() => {
@@ -36,9 +40,11 @@ const TransferControl = ({ recordId }) => {
     setLoading(true);
     setResult(null);
     setError("");
+    setProgress(null);
 
     try {
       const token = localStorage.getItem('token');
+      const headers = { Authorization: `Bearer ${token}` };
       
       // Payload matches 'BatchTransferRequest' in transfer.py
       const payload = {
@@ -46,12 +52,26 @@ const TransferControl = ({ recordId }) => {
           target_hospital_name: target
       };
 
-      const res = await axios.post(`${API_BASE_URL}/api/transfer/execute-batch`, payload, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
+      // Submit as a background job, then poll until it finishes
+      const submit = await axios.post(`${API_BASE_URL}/api/transfer/jobs`, payload, { headers });
+      const jobId = submit.data.job_id;
+
+      let job = null;
+      do {
+        await sleep(POLL_INTERVAL_MS);
+        const res = await axios.get(`${API_BASE_URL}/api/transfer/jobs/${jobId}`, { headers });
+        job = res.data;
+        setProgress(job.progress);
+      } while (job.status === "queued" || job.status === "running");
+
+      if (job.status === "failed") {
+        setError(job.error || "Transfer job failed");
+        return;
+      }
 
-      // 3. Save the result (success/skipped/failed)
-      setResult(res.data);
+      // 3. Save the result (per-record success/skipped/failed lists)
+      const results = await axios.get(`${API_BASE_URL}/api/transfer/jobs/${jobId}/results`, { headers });
+      setResult(results.data);
       
     } catch (err) {
       console.error("Transfer error:", err);
@@ -86,7 +106,7 @@ const TransferControl = ({ recordId }) => {
             className={`px-3 py-1.5 rounded text-sm font-medium text-white transition-all 
               ${loading ? "bg-gray-400 cursor-not-allowed" : "bg-indigo-600 hover:bg-indigo-700 shadow-sm"}`}
           >
-            {loading ? "Encrypting..." : "Send"}
+            {loading ? (progress ? `Encrypting... ${Math.round(progress)}%` : "Encrypting...") : "Send"}
           </button>
         </div>
       ) : (
@@ -0,0 +1,66 @@
+import { useState, useEffect } from 'react';
+
+const API_BASE_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
+const WS_URL = API_BASE_URL.replace(/^http/, "ws") + "/api/transfer/inbox/ws";
+
+// Live view of the logged-in hospital's inbox.
+// The server sends a snapshot on connect, then only "added"/"removed" deltas.
+const useInboxStream = () => {
+  const [items, setItems] = useState([]);
+  const [connected, setConnected] = useState(false);
+  const [loading, setLoading] = useState(true);
+
+  useEffect(() => {
+    let socket = null;
+    let retryTimer = null;
+    let retryDelay = 1000;
+    let closed = false;
+
+    const connect = () => {
+      const token = localStorage.getItem('token');
+      socket = new WebSocket(`${WS_URL}?token=${encodeURIComponent(token || "")}`);
+
+      socket.onopen = () => {
+        setConnected(true);
+        retryDelay = 1000;
+      };
+
+      socket.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        if (event.type === "snapshot") {
+          setItems(event.items);
+          setLoading(false);
+        } else if (event.type === "added") {
+          setItems((prev) => [event.item, ...prev.filter((i) => i._id !== event.item._id)]);
+        } else if (event.type === "removed") {
+          const gone = new Set(event.ids);
+          setItems((prev) => prev.filter((i) => !gone.has(i._id)));
+        } else if (event.type === "resync") {
+          socket.close(); // Reconnecting sends a fresh snapshot
+        }
+      };
+
+      socket.onclose = () => {
+        setConnected(false);
+        setLoading(false);
+        if (closed) return;
+        retryTimer = setTimeout(connect, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, 30000);
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (socket) socket.close();
+    };
+  }, []);
+
+  // Optimistic removal after an accept (the server's "removed" event is then a no-op)
+  const removeItem = (id) => setItems((prev) => prev.filter((i) => i._id !== id));
+
+  return { items, connected, loading, removeItem };
+};
+
+export default useInboxStream;